@@ -1,12 +1,30 @@
 import os
 import re
+import sys
 import json
-import shutil
+import zlib
+import time
+import socket
 import logging
+import argparse
+import threading
 from datetime import datetime
-from bs4 import BeautifulSoup
-import docx
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from dmc_output import OUTPUT_MODES, OutputNameIndex, materialize_output
+from dmc_cache import CACHE_MODES, DEFAULT_CACHE_DIRECTORY, ResultCache, TextCache, fingerprint_text, hash_file
+from dmc_catalogue import CatalogueCache, attach_compiled_catalogue, write_compiled_catalogue
+from dmc_queue import WorkQueue
+from dmc_scan import DEFAULT_SCAN_STATE_PATH, DocumentScanner, list_documents
+from dmc_log import LOG_FORMATS, StreamingLogWriter, convert_to_legacy
+from dmc_history import DEFAULT_HISTORY_PATH, RunHistory
+from dmc_llm import BATCH_KEEP_ALIVE, AdaptiveConcurrency, ModelWarmup, release_model
+from dmc_chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAP_TOKEN_BUDGET, condense_document, needs_map_reduce
+from dmc_schedule import SCHEDULE_POLICIES, DEFAULT_AGING_SECONDS, DocumentScheduler, estimate_cost
+from dmc_schema import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, batch_schema, dmc_parts_schema
+from dmc_batch import (DEFAULT_BATCH_MAX_DOCUMENTS, DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_DOCUMENT_TOKENS,
+                       XML_BYTES_PER_TEXT_CHAR, BatchDocument, pack_batches, parse_batch_response, render_documents,
+                       split_to_fit)
+from dmc_prompt import DEFAULT_CONTEXT_TOKENS, ESTIMATOR, PromptBuilder
 
 # --- CONFIGURATION ---
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
@@ -16,6 +34,66 @@ DOCS_DIRECTORY = "documents_to_process"
 DATA_DIRECTORY = "Lake"
 LOGS_DIRECTORY = "logs"
 OUTPUT_DIRECTORY = "output"
+# How renamed files are written: auto, copy, hardlink, reflink, symlink or manifest (see dmc_output.py)
+OUTPUT_MODE = "auto"
+# Documents classified in parallel (each one is an independent Ollama request)
+CONCURRENCY = 1
+# When enabled, CONCURRENCY is the upper bound and the number of in-flight Ollama requests
+# is adjusted from the observed latency (see AdaptiveConcurrency in dmc_llm.py)
+ADAPTIVE_CONCURRENCY = False
+# Processing order: sjf (small documents first) or fifo (file name order), see dmc_schedule.py.
+# PRIORITY_PATTERNS maps file name globs to a priority (higher runs earlier), e.g. {"*URGENT*": 5};
+# a "<document>.docx.priority" file with an integer overrides it for one document.
+SCHEDULE_POLICY = "sjf"
+AGING_SECONDS = DEFAULT_AGING_SECONDS
+PRIORITY_PATTERNS = {}
+# Map-reduce for long documents: chunks are summarized with small prompts and the
+# summaries replace the truncated excerpt in the classification prompt (see dmc_chunking.py).
+# MAP_TOKEN_BUDGET caps the document tokens sent to the chunk prompts. MAP_CONCURRENCY chunk
+# summaries are requested at once, counted over all documents in flight together.
+MAP_REDUCE = False
+CHUNK_TOKENS = DEFAULT_CHUNK_TOKENS
+MAP_TOKEN_BUDGET = DEFAULT_MAP_TOKEN_BUDGET
+MAP_CONCURRENCY = 2
+# Largest context window (num_ctx) requested from Ollama. Each classification prompt is filled up
+# to this token budget - headings, then body excerpt, then the catalogue entries most related to the
+# document - and sent with the smallest num_ctx that holds it (see dmc_prompt.py).
+CONTEXT_TOKENS = DEFAULT_CONTEXT_TOKENS
+# How answers are constrained: schema (JSON Schema with the loaded codes as enums, Ollama 0.5+)
+# or json (plain JSON mode, repaired and validated afterwards), see dmc_schema.py
+RESPONSE_FORMAT = DEFAULT_OUTPUT_FORMAT
+# Batching: documents under SMALL_DOCUMENT_TOKENS are classified several per request (up to
+# BATCH_TOKEN_BUDGET tokens of document text and BATCH_MAX_DOCUMENTS documents) so the catalogue
+# is sent once per batch instead of once per document (see dmc_batch.py)
+BATCH_SMALL_DOCUMENTS = False
+SMALL_DOCUMENT_TOKENS = DEFAULT_SMALL_DOCUMENT_TOKENS
+BATCH_TOKEN_BUDGET = DEFAULT_BATCH_TOKEN_BUDGET
+BATCH_MAX_DOCUMENTS = DEFAULT_BATCH_MAX_DOCUMENTS
+# The model is preloaded while the catalogue loads and kept in memory for this long after each
+# request, so it stays loaded for the whole batch ("-1" = until Ollama restarts). Reset to
+# Ollama's default when the batch ends.
+KEEP_ALIVE = BATCH_KEEP_ALIVE
+# Result cache: use, refresh or off (see dmc_cache.py). Extracted document text is cached in
+# <CACHE_DIRECTORY>/text independently of model and prompt, and used unless CACHE_MODE is off.
+CACHE_MODE = "use"
+CACHE_DIRECTORY = DEFAULT_CACHE_DIRECTORY
+# SQLite index of all runs and their results, also used to warm the result cache (see dmc_history.py).
+# Set to "" to disable.
+HISTORY_DATABASE = DEFAULT_HISTORY_PATH
+# Processing log: jsonl (one record per document, written as it completes) or json
+# (the same stream converted to the classic single JSON document at the end, see dmc_log.py)
+LOG_FORMAT = "jsonl"
+# Seconds between queue polls in coordinator/worker mode
+QUEUE_POLL_SECONDS = 5
+# The coordinator gives up on documents no worker has leased for this many seconds of no
+# progress (e.g. every worker died); 0 waits for workers indefinitely
+QUEUE_IDLE_TIMEOUT = 1800
+# Input scanning: RECURSIVE_SCAN includes documents in subfolders of the input folder; with
+# INCREMENTAL_SCAN only documents that are new or changed since they were last processed
+# successfully are picked up, tracked in SCAN_STATE_FILE (see dmc_scan.py)
+RECURSIVE_SCAN = False
+INCREMENTAL_SCAN = False
+SCAN_STATE_FILE = DEFAULT_SCAN_STATE_PATH
 
 # --- SNS JSON FILES TO LOAD ---
 SNS_JSON_FILES = [
@@ -37,10 +115,13 @@ USER_ITEM_LOCATION_CODE = "D"
 DEFAULT_SYSTEM_CODE = "00"
 DEFAULT_INFO_CODE = "000"
 
+# --- EXIT CODES ---
+EXIT_OK = 0
+EXIT_DOCUMENTS_FAILED = 1  # the run completed but at least one document could not be assigned a DMC
+EXIT_USAGE = 2             # bad arguments or configuration file
+EXIT_FATAL = 3             # no catalogue data or unreadable directories
+
 # --- SETUP LOGGING ---
-if not os.path.exists(LOGS_DIRECTORY):
-    os.makedirs(LOGS_DIRECTORY)
-log_filename = os.path.join(LOGS_DIRECTORY, f"dmc_processing_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
@@ -148,6 +229,7 @@ def parse_sns_xml(file_path):
     Handles files with or without a root <sns> tag.
     """
     try:
+        from bs4 import BeautifulSoup
         with open(file_path, 'r', encoding='utf-8') as f:
             soup = BeautifulSoup(f, 'xml')
         sns_data = {}
@@ -194,48 +276,29 @@ def parse_info_codes(file_path):
         logging.error(f"Error parsing info codes file {file_path}: {e}")
         return {}
 
-def prepare_context_for_llm(sns_data, info_codes):
-    """Creates a balanced string representation of the data for the LLM prompt, including subsystems."""
-    # Include ALL system codes with titles AND their subsystems
-    sns_lines = []
-    for code, data in sorted(sns_data.items()):
-        title = data.get('title', '')
-        if title:
-            sns_lines.append(f"{code}: {title}")
-            # Add subsystems
-            subsystems = data.get('subsystems', {})
-            for sub_code, sub_data in sorted(subsystems.items()):
-                sub_title = sub_data.get('title', '')
-                if sub_title and sub_code not in ['00', '0']:  # Skip general subsystems
-                    sns_lines.append(f"  {code}-{sub_code}: {sub_title}")
-    
-    sns_context = "VALID SYSTEM CODES AND SUBSYSTEMS:\n" + "\n".join(sns_lines)
-    
-    # Include key info codes - grouped by common types
-    info_by_type = {}
-    for code, data in sorted(info_codes.items()):
-        code_type = data.get('type', 'other')
-        desc = data.get('description', '')
-        if code_type not in info_by_type:
-            info_by_type[code_type] = []
-        if desc and len(info_by_type[code_type]) < 15:  # Limit per type
-            info_by_type[code_type].append(f"{code}: {desc}")
-    
-    info_lines = []
-    for code_type in ['proced', 'descript', 'fault', 'process', 'sched']:
-        if code_type in info_by_type:
-            info_lines.append(f"\n[{code_type.upper()}]")
-            info_lines.extend(info_by_type[code_type])
-    
-    info_context = "VALID INFO CODES (use one of these exactly):" + "\n".join(info_lines)
-    
-    return sns_context, info_context
-
 # --- DOCUMENT PROCESSING ---
 
+# Created by start_text_cache(), once CACHE_DIRECTORY and CACHE_MODE are configured
+TEXT_CACHE = None
+
+
+def start_text_cache():
+    """Opens the extracted-text cache for this run (disabled with CACHE_MODE off)."""
+    global TEXT_CACHE
+    TEXT_CACHE = TextCache(os.path.join(CACHE_DIRECTORY, "text"), CACHE_MODE != 'off')
+
+
+def extract_document_text(file_path, file_hash=None):
+    """extract_text_from_docx through the extracted-text cache, when one was started."""
+    if TEXT_CACHE is None:
+        return extract_text_from_docx(file_path)
+    return TEXT_CACHE.extract(file_path, extract_text_from_docx, file_hash)
+
+
 def extract_text_from_docx(file_path):
     """Extracts text from a .docx file, separating headings from body paragraphs."""
     try:
+        import docx
         doc = docx.Document(file_path)
         headings, body = [], []
         for para in doc.paragraphs:
@@ -253,24 +316,44 @@ def extract_text_from_docx(file_path):
 
 # --- CORE LOGIC: LLM AND FALLBACK ---
 
-def generate_dmc_with_llm(headings_text, body_text, sns_context, info_context, available_sns_codes, available_info_codes):
-    """Uses Ollama with an optimized compact prompt to determine the DMC."""
-    
-    # Truncate body text to reduce prompt size
-    body_preview = body_text[:1500] if body_text else "No content."
-    headings_preview = headings_text[:400] if headings_text else "No headings."
-    
-    prompt = f"""Analyze this document and select the best S1000D DMC codes.
+# Set by main() when ADAPTIVE_CONCURRENCY is enabled
+LLM_LIMITER = None
+# Shared by the chunk summaries of all documents (set again by start_concurrency_limiter()), so
+# summarizing chunks in parallel within documents that already run in parallel stays bounded
+MAP_SLOTS = threading.BoundedSemaphore(MAP_CONCURRENCY)
+# Set by start_model_warmup(); requests wait for the model load instead of queueing behind it
+MODEL_WARMUP = None
+
+
+def post_to_ollama(payload):
+    """Sends a generate request, through the adaptive concurrency limiter when enabled. Returns the decoded reply."""
+    import requests
+    if MODEL_WARMUP is not None:
+        MODEL_WARMUP.wait()
+    payload = dict(payload, keep_alive=KEEP_ALIVE)
+    if LLM_LIMITER is None:
+        response = requests.post(OLLAMA_API_URL, json=payload, timeout=180)
+        response.raise_for_status()
+        return response.json()
+    with LLM_LIMITER.request() as request:
+        response = requests.post(OLLAMA_API_URL, json=payload, timeout=180)
+        response.raise_for_status()
+        request.stats = response.json()
+    return request.stats
+
+
+CLASSIFY_PROMPT = """Analyze this document and select the best S1000D DMC codes.
 
 DOCUMENT TITLE/HEADINGS:
-{headings_preview}
+{headings}
 
 DOCUMENT EXCERPT:
-{body_preview[:800]}
+{body}
 
+VALID SYSTEM CODES AND SUBSYSTEMS:
 {sns_context}
 
-{info_context}
+VALID INFO CODES (use one of these exactly):{info_context}
 
 INSTRUCTIONS:
 - systemCode: Pick the 2-character system code (e.g., 20, 21, 24, 34)
@@ -280,34 +363,92 @@ INSTRUCTIONS:
 
 Return ONLY this JSON:
 {{"systemCode": "XX", "subSystemCode": "X", "subSubSystemCode": "0", "infoCode": "XXX", "disassyCode": "00", "disassyCodeVariant": "A"}}"""
+# num_predict per response format; a schema-constrained answer ends at its closing brace
+CLASSIFY_OUTPUT_TOKENS = {"schema": 100, "json": 200}
+
+
+def classification_prompt_builder():
+    return PromptBuilder(CLASSIFY_PROMPT, CONTEXT_TOKENS, CLASSIFY_OUTPUT_TOKENS[RESPONSE_FORMAT])
+
+
+def response_format(available_sns_codes, available_info_codes):
+    """The value of the request's "format" field for RESPONSE_FORMAT."""
+    if RESPONSE_FORMAT == "schema":
+        return dmc_parts_schema(available_sns_codes, available_info_codes)
+    return "json"
+
+
+def normalize_dmc_parts(dmc_parts, available_sns_codes, available_info_codes):
+    """Fills missing DMC parts with defaults and replaces codes that are not in the loaded data."""
+    final_parts = {
+        'systemCode': str(dmc_parts.get('systemCode', DEFAULT_SYSTEM_CODE)),
+        'infoCode': str(dmc_parts.get('infoCode', DEFAULT_INFO_CODE)),
+        'subSystemCode': str(dmc_parts.get('subSystemCode', '0')),
+        'subSubSystemCode': str(dmc_parts.get('subSubSystemCode', '0')),
+        'disassyCode': str(dmc_parts.get('disassyCode', '00')),
+        'disassyCodeVariant': str(dmc_parts.get('disassyCodeVariant', 'A'))
+    }
 
+    # VALIDATION: Check if codes exist in loaded data
+    if available_sns_codes and final_parts['systemCode'] not in available_sns_codes:
+        logging.warning(f"LLM systemCode '{final_parts['systemCode']}' not in loaded data. Using default.")
+        final_parts['systemCode'] = DEFAULT_SYSTEM_CODE
+
+    if available_info_codes and final_parts['infoCode'] not in available_info_codes:
+        logging.warning(f"LLM infoCode '{final_parts['infoCode']}' not in loaded data. Using default.")
+        final_parts['infoCode'] = DEFAULT_INFO_CODE
+    return final_parts
+
+
+def generate_dmc_with_llm(headings_text, body_text, sns_entries, info_entries, available_sns_codes, available_info_codes,
+                          prompt_stats=None):
+    """
+    Uses Ollama with a prompt filled up to the CONTEXT_TOKENS budget to determine the DMC.
+    The prompt's token breakdown is stored in prompt_stats when a dict is given.
+    """
+    prompt, report = classification_prompt_builder().build(headings_text, body_text, sns_entries, info_entries)
+    logging.info(f"Prompt: ~{report['prompt_tokens']} tokens (headings {report['headings_tokens']}, "
+                 f"body {report['body_tokens']}, catalogue {report['catalogue_tokens']}: "
+                 f"{report['sns_systems']} systems, {report['info_codes']} info codes), num_ctx {report['num_ctx']}")
+    if prompt_stats is not None:
+        prompt_stats.update(report)
+
+    import requests
     try:
         logging.info("Querying LLM...")
         payload = {
             "model": OLLAMA_MODEL, 
             "prompt": prompt, 
             "stream": False, 
-            "format": "json",
+            "format": response_format(available_sns_codes, available_info_codes),
             "options": {
                 "temperature": 0.1,
-                "num_predict": 200  # Increased to avoid truncation
+                "num_predict": CLASSIFY_OUTPUT_TOKENS[RESPONSE_FORMAT],
+                "num_ctx": report["num_ctx"]
             }
         }
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=180)
-        response.raise_for_status()
-        
-        raw_llm_response_text = response.json().get('response', '')
+        reply = post_to_ollama(payload)
+        # The exact count from the server keeps the token estimate calibrated to this model
+        ESTIMATOR.calibrate(prompt, reply.get('prompt_eval_count'))
+        if prompt_stats is not None and reply.get('prompt_eval_count'):
+            prompt_stats["prompt_eval_count"] = reply['prompt_eval_count']
+        if prompt_stats is not None and reply.get('load_duration'):
+            # Non-zero only if the model had to be (re)loaded for this request
+            prompt_stats["load_ms"] = round(reply['load_duration'] / 1e6, 1)
+        if prompt_stats is not None and reply.get('eval_count'):
+            prompt_stats["eval_count"] = reply['eval_count']
+        raw_llm_response_text = reply.get('response', '')
         logging.info(f"LLM response: {raw_llm_response_text[:300]}")
 
         if not raw_llm_response_text.strip():
             logging.error("LLM returned an empty response.")
             return None
 
-        # Try to parse JSON, with cleanup for common issues
+        # Try to parse JSON, with cleanup for common issues (a schema-constrained answer is always complete)
         json_text = raw_llm_response_text.strip()
         
         # Try to fix incomplete JSON
-        if not json_text.endswith('}'):
+        if RESPONSE_FORMAT == "json" and not json_text.endswith('}'):
             # Find last complete brace
             last_brace = json_text.rfind('}')
             if last_brace > 0:
@@ -315,31 +456,14 @@ Return ONLY this JSON:
                 logging.warning(f"Fixed truncated JSON response")
         
         # Try to extract JSON from response if there's extra text
-        if not json_text.startswith('{'):
+        if RESPONSE_FORMAT == "json" and not json_text.startswith('{'):
             start = json_text.find('{')
             if start >= 0:
                 json_text = json_text[start:]
         
         dmc_parts = json.loads(json_text)
         
-        final_parts = {
-            'systemCode': str(dmc_parts.get('systemCode', DEFAULT_SYSTEM_CODE)),
-            'infoCode': str(dmc_parts.get('infoCode', DEFAULT_INFO_CODE)),
-            'subSystemCode': str(dmc_parts.get('subSystemCode', '0')),
-            'subSubSystemCode': str(dmc_parts.get('subSubSystemCode', '0')),
-            'disassyCode': str(dmc_parts.get('disassyCode', '00')),
-            'disassyCodeVariant': str(dmc_parts.get('disassyCodeVariant', 'A'))
-        }
-        
-        # VALIDATION: Check if codes exist in loaded data
-        if available_sns_codes and final_parts['systemCode'] not in available_sns_codes:
-            logging.warning(f"LLM systemCode '{final_parts['systemCode']}' not in loaded data. Using default.")
-            final_parts['systemCode'] = DEFAULT_SYSTEM_CODE
-        
-        if available_info_codes and final_parts['infoCode'] not in available_info_codes:
-            logging.warning(f"LLM infoCode '{final_parts['infoCode']}' not in loaded data. Using default.")
-            final_parts['infoCode'] = DEFAULT_INFO_CODE
-
+        final_parts = normalize_dmc_parts(dmc_parts, available_sns_codes, available_info_codes)
         logging.info(f"LLM returned codes: {final_parts}")
         return final_parts
         
@@ -347,16 +471,88 @@ Return ONLY this JSON:
         logging.error(f"Failed to parse LLM JSON response: {e}")
         return None
     except requests.exceptions.Timeout:
-        logging.error("LLM request timed out after 120 seconds.")
+        logging.error("LLM request timed out after 180 seconds.")
         return None
     except Exception as e:
         logging.error(f"LLM processing failed: {e}")
         return None
 
+def summarize_with_llm(prompt):
+    """Map step of map-reduce: a short free-text completion. Returns '' on failure so one bad chunk is skipped."""
+    payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False,
+               "options": {"temperature": 0.1, "num_predict": 100}}
+    try:
+        with MAP_SLOTS:
+            return post_to_ollama(payload).get('response', '')
+    except Exception as e:
+        logging.warning(f"Chunk summary failed: {e}")
+        return ''
+
+BATCH_PROMPT = """Analyze each of these documents separately and select the best S1000D DMC codes for each one.
+
+{body}
+
+VALID SYSTEM CODES AND SUBSYSTEMS:
+{sns_context}
+
+VALID INFO CODES (use one of these exactly):{info_context}
+
+INSTRUCTIONS:
+- Return exactly one result per document, with its id (D1, D2, ...)
+- systemCode: Pick the 2-character system code (e.g., 20, 21, 24, 34)
+- subSystemCode: Pick the subsystem digit (e.g., if 24-10 matches, use subSystemCode="1")
+- subSubSystemCode: Usually "0" unless more specific
+- infoCode: Pick a 3-character code (e.g., 000, 040, 520, 720)
+
+Return ONLY this JSON:
+{{"results": [{{"id": "D1", "systemCode": "XX", "subSystemCode": "X", "subSubSystemCode": "0", "infoCode": "XXX", "disassyCode": "00", "disassyCodeVariant": "A"}}]}}"""
+BATCH_OUTPUT_TOKENS_PER_DOCUMENT = 80
+
+
+def batch_prompt_builder(batch):
+    return PromptBuilder(BATCH_PROMPT, CONTEXT_TOKENS, BATCH_OUTPUT_TOKENS_PER_DOCUMENT * len(batch))
+
+
+def batch_fits_prompt(batch):
+    """Whether all documents of batch fit the body share of its prompt, so none is cut off."""
+    return ESTIMATOR.count(render_documents(batch)) <= batch_prompt_builder(batch).body_budget()
+
+
+def generate_dmc_batch_with_llm(batch, sns_entries, info_entries, available_sns_codes, available_info_codes):
+    """
+    Classifies several small documents with one request, the catalogue included once.
+    Returns ({doc_id: dmc_parts}, prompt report); documents missing from the answer are not in the dict.
+    """
+    builder = batch_prompt_builder(batch)
+    output_tokens = builder.output_tokens
+    # All headings steer the catalogue shortlist; the template itself shows them per document
+    headings = '\n'.join(d.headings for d in batch if d.headings)
+    prompt, report = builder.build(headings, render_documents(batch), sns_entries, info_entries)
+    if report["body_truncated"]:
+        # Only when the token estimate was recalibrated after the batch was sized; the last documents lose text
+        logging.warning(f"Batch of {len(batch)} documents was cut to {report['body_chars']} characters")
+    logging.info(f"Batch of {len(batch)} documents: prompt ~{report['prompt_tokens']} tokens "
+                 f"({report['sns_systems']} systems, {report['info_codes']} info codes), num_ctx {report['num_ctx']}")
+    answer_format = response_format(available_sns_codes, available_info_codes)
+    if RESPONSE_FORMAT == "schema":
+        answer_format = batch_schema(answer_format, [d.doc_id for d in batch])
+    payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "format": answer_format,
+               "options": {"temperature": 0.1, "num_predict": output_tokens, "num_ctx": report["num_ctx"]}}
+    try:
+        reply = post_to_ollama(payload)
+    except Exception as e:
+        logging.error(f"Batch request failed: {e}")
+        return {}, report
+    ESTIMATOR.calibrate(prompt, reply.get('prompt_eval_count'))
+    results = parse_batch_response(reply.get('response', ''), [d.doc_id for d in batch])
+    return {doc_id: normalize_dmc_parts(parts, available_sns_codes, available_info_codes)
+            for doc_id, parts in results.items()}, report
+
 def generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes):
-    """A context-aware fallback that scores based on document category."""
+    """A context-aware fallback that scores based on document category. Takes the catalogue's compact records."""
     logging.warning("Executing context-aware fallback...")
     full_text_lower = (headings_text + " " + body_text).lower()
+    headings_lower, body_lower = headings_text.lower(), body_text.lower()
 
     CATEGORY_KEYWORDS = {
         'proced': ['procedure', 'step', 'task', 'perform', 'install', 'remove', 'assemble', 'disassemble', 'prepare', 'unpack', 'setup', 'execute', 'how to'],
@@ -375,7 +571,7 @@ def generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes):
     else:
         logging.warning("Fallback: Could not determine a strong document category.")
 
-    filtered_info_codes = {code: data for code, data in info_codes.items() if data['type'] == doc_category} if doc_category else info_codes
+    filtered_info_codes = {code: data for code, data in info_codes.items() if data.type == doc_category} if doc_category else info_codes
     if doc_category and not filtered_info_codes:
         logging.warning(f"No info codes of the detected category '{doc_category}' were found. Considering all info codes.")
         filtered_info_codes = info_codes
@@ -383,17 +579,17 @@ def generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes):
     info_scores = []
     if filtered_info_codes:
         for code, data in filtered_info_codes.items():
-            score = sum(1 for keyword in data['description'].lower().split() if keyword in full_text_lower)
+            score = sum(1 for keyword in data.description_words if keyword in full_text_lower)
             if score > 0:
-                info_scores.append((score, code, data.get('description')))
+                info_scores.append((score, code, data.description))
 
     sns_scores = []
     if sns_data:
         for code, data in sns_data.items():
-            score = sum(10 for keyword in data['title'].lower().split() if keyword in headings_text.lower())
-            score += sum(1 for keyword in data['title'].lower().split() if keyword in body_text.lower())
+            score = sum(10 for keyword in data.title_words if keyword in headings_lower)
+            score += sum(1 for keyword in data.title_words if keyword in body_lower)
             if score > 0:
-                sns_scores.append((score, code, data.get('title')))
+                sns_scores.append((score, code, data.title))
 
     logging.info("--- Fallback Scoring Report ---")
     if sns_scores:
@@ -420,6 +616,12 @@ def format_dmc(parts):
             f'{parts.get("disassyCode", "00")}{parts.get("disassyCodeVariant", "A")}-{parts.get("infoCode", DEFAULT_INFO_CODE)}A-{USER_ITEM_LOCATION_CODE}')
 
 
+def list_available_sns_files(data_dir=None):
+    """Returns the SNS JSON file names found in the data directory."""
+    data_dir = data_dir or DATA_DIRECTORY
+    return [f for f in os.listdir(data_dir) if f.endswith('.json') and f != 'info_codes.json']
+
+
 def select_sns_files():
     """Interactive menu to select which SNS JSON files to use."""
     print("\n" + "="*60)
@@ -427,10 +629,7 @@ def select_sns_files():
     print("="*60)
     
     # Find available SNS files in the Lake directory
-    available_files = []
-    for f in os.listdir(DATA_DIRECTORY):
-        if f.endswith('.json') and f != 'info_codes.json':
-            available_files.append(f)
+    available_files = list_available_sns_files()
     
     if not available_files:
         print("No SNS JSON files found in Lake directory!")
@@ -482,153 +681,846 @@ def select_sns_files():
             print("Invalid input. Enter number(s), 'A' for all, or 'Q' to quit.")
 
 
-def main():
+# --- COMMAND LINE / CONFIG FILE ---
+
+# Settings that can come from the command line or a JSON config file, mapped to the module constant they override
+SETTINGS = {
+    "input_dir": "DOCS_DIRECTORY",
+    "output_dir": "OUTPUT_DIRECTORY",
+    "data_dir": "DATA_DIRECTORY",
+    "logs_dir": "LOGS_DIRECTORY",
+    "log_format": "LOG_FORMAT",
+    "ollama_url": "OLLAMA_API_URL",
+    "model": "OLLAMA_MODEL",
+    "concurrency": "CONCURRENCY",
+    "adaptive_concurrency": "ADAPTIVE_CONCURRENCY",
+    "schedule": "SCHEDULE_POLICY",
+    "map_reduce": "MAP_REDUCE",
+    "chunk_tokens": "CHUNK_TOKENS",
+    "map_token_budget": "MAP_TOKEN_BUDGET",
+    "map_concurrency": "MAP_CONCURRENCY",
+    "context_tokens": "CONTEXT_TOKENS",
+    "batch_small": "BATCH_SMALL_DOCUMENTS",
+    "small_document_tokens": "SMALL_DOCUMENT_TOKENS",
+    "batch_token_budget": "BATCH_TOKEN_BUDGET",
+    "batch_max_documents": "BATCH_MAX_DOCUMENTS",
+    "keep_alive": "KEEP_ALIVE",
+    "response_format": "RESPONSE_FORMAT",
+    "aging_seconds": "AGING_SECONDS",
+    "priority_patterns": "PRIORITY_PATTERNS",
+    "cache_mode": "CACHE_MODE",
+    "cache_dir": "CACHE_DIRECTORY",
+    "history_db": "HISTORY_DATABASE",
+    "recursive": "RECURSIVE_SCAN",
+    "incremental": "INCREMENTAL_SCAN",
+    "scan_state": "SCAN_STATE_FILE",
+    "queue_idle_timeout": "QUEUE_IDLE_TIMEOUT",
+    "output_mode": "OUTPUT_MODE",
+    "model_ident": "USER_MODEL_IDENT_CODE",
+    "system_diff": "USER_SYSTEM_DIFF_CODE",
+    "assy_code": "USER_ASSY_CODE",
+    "item_location": "USER_ITEM_LOCATION_CODE",
+}
+# Config file keys that select what to process, or how, rather than override a constant
+SELECTION_KEYS = ("sns_files", "all_sns", "shard", "coordinator", "worker")
+
+
+class ConfigError(Exception):
+    """Raised for invalid command line arguments or config file contents."""
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Assign S1000D DMC codes to .docx documents using an Ollama LLM. "
+                    "Runs without prompts when SNS files are given with --sns or --all-sns.")
+    parser.add_argument("--config", metavar="JSON", help="JSON file with any of the long option names below as keys (command line wins)")
+
+    sns = parser.add_argument_group("SNS data")
+    sns.add_argument("--sns", dest="sns_files", action="append", metavar="FILE", help="SNS JSON file in the data dir (repeatable)")
+    sns.add_argument("--all-sns", action="store_true", default=None, help="use every SNS JSON file in the data dir")
+    sns.add_argument("--list-sns", action="store_true", help="list the SNS files in the data dir and exit")
+
+    dirs = parser.add_argument_group("directories")
+    dirs.add_argument("--input-dir", help=f"documents to process (default: {DOCS_DIRECTORY})")
+    dirs.add_argument("--output-dir", help=f"where DMC-named files are written (default: {OUTPUT_DIRECTORY})")
+    dirs.add_argument("--data-dir", help=f"SNS and info code files (default: {DATA_DIRECTORY})")
+    dirs.add_argument("--logs-dir", help=f"processing logs (default: {LOGS_DIRECTORY})")
+    dirs.add_argument("--log-format", choices=LOG_FORMATS, help=f"processing log format (default: {LOG_FORMAT})")
+    dirs.add_argument("--recursive", action="store_true", default=None, help="include documents in subfolders of the input dir")
+    dirs.add_argument("--incremental", action="store_true", default=None,
+                      help="process only documents that are new or changed since they were last processed successfully")
+    dirs.add_argument("--scan-state", metavar="FILE", help=f"where --incremental keeps what was processed (default: {SCAN_STATE_FILE})")
+
+    llm = parser.add_argument_group("LLM and processing")
+    llm.add_argument("--model", help=f"Ollama model (default: {OLLAMA_MODEL})")
+    llm.add_argument("--ollama-url", help=f"Ollama generate endpoint (default: {OLLAMA_API_URL})")
+    llm.add_argument("--concurrency", type=int, help=f"documents classified in parallel (default: {CONCURRENCY})")
+    llm.add_argument("--adaptive-concurrency", action="store_true", default=None,
+                     help="adjust in-flight requests from Ollama latency, up to --concurrency")
+    llm.add_argument("--map-reduce", action="store_true", default=None,
+                     help="classify long documents from concurrent chunk summaries instead of a truncated excerpt")
+    llm.add_argument("--chunk-tokens", type=int, help=f"map-reduce chunk size in tokens (default: {CHUNK_TOKENS})")
+    llm.add_argument("--map-token-budget", type=int, help=f"max document tokens summarized per document (default: {MAP_TOKEN_BUDGET})")
+    llm.add_argument("--map-concurrency", type=int,
+                     help=f"chunk summaries requested at once, over all documents (default: {MAP_CONCURRENCY})")
+    llm.add_argument("--context-tokens", type=int, help=f"largest num_ctx requested; prompts are filled up to it (default: {CONTEXT_TOKENS})")
+    llm.add_argument("--batch-small", action="store_true", default=None,
+                     help="classify short documents several per request, sending the catalogue once per batch")
+    llm.add_argument("--small-document-tokens", type=int,
+                     help=f"documents up to this many tokens are batched (default: {SMALL_DOCUMENT_TOKENS})")
+    llm.add_argument("--batch-token-budget", type=int, help=f"document tokens per batch request (default: {BATCH_TOKEN_BUDGET})")
+    llm.add_argument("--batch-max-documents", type=int, help=f"documents per batch request (default: {BATCH_MAX_DOCUMENTS})")
+    llm.add_argument("--response-format", choices=OUTPUT_FORMATS,
+                     help=f"schema: constrain answers to the loaded codes; json: plain JSON mode (default: {RESPONSE_FORMAT})")
+    llm.add_argument("--keep-alive", metavar="DURATION",
+                     help=f"how long Ollama keeps the model loaded between requests of a batch (default: {KEEP_ALIVE})")
+    llm.add_argument("--schedule", choices=SCHEDULE_POLICIES, help=f"processing order (default: {SCHEDULE_POLICY})")
+    llm.add_argument("--aging-seconds", type=float, help=f"waiting time worth one priority level (default: {AGING_SECONDS:g})")
+    llm.add_argument("--cache-mode", choices=CACHE_MODES, help=f"result cache behaviour (default: {CACHE_MODE})")
+    llm.add_argument("--cache-dir", help=f"result cache location (default: {CACHE_DIRECTORY})")
+    llm.add_argument("--history-db", metavar="DB", help=f"run history database, '' to disable (default: {HISTORY_DATABASE})")
+    llm.add_argument("--output-mode", choices=OUTPUT_MODES, help=f"how renamed files are written (default: {OUTPUT_MODE})")
+    llm.add_argument("--shard", metavar="K/N", help="process only shard K of N (0-based), for splitting a corpus across processes or machines")
+
+    queue = parser.add_argument_group("multi-machine runs (shared SQLite work queue)")
+    queue_role = queue.add_mutually_exclusive_group()
+    queue_role.add_argument("--coordinator", metavar="QUEUE_DB", help="enqueue the input folder, wait for workers, then write outputs and the log")
+    queue_role.add_argument("--worker", metavar="QUEUE_DB", help="classify documents leased from the queue (SNS files and model come from the coordinator)")
+    queue.add_argument("--queue-idle-timeout", type=float, metavar="SECONDS",
+                       help=f"coordinator fails documents after this long without any worker progress, 0 = wait forever (default: {QUEUE_IDLE_TIMEOUT})")
+
+    dmc = parser.add_argument_group("DMC components")
+    dmc.add_argument("--model-ident", help=f"model ident code (default: {USER_MODEL_IDENT_CODE})")
+    dmc.add_argument("--system-diff", help=f"system difference code (default: {USER_SYSTEM_DIFF_CODE})")
+    dmc.add_argument("--assy-code", help=f"assembly code (default: {USER_ASSY_CODE})")
+    dmc.add_argument("--item-location", help=f"item location code (default: {USER_ITEM_LOCATION_CODE})")
+    return parser
+
+
+def load_config_file(path):
+    """Reads a JSON config file and validates its keys."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"Could not read config file '{path}': {e}")
+    if not isinstance(config, dict):
+        raise ConfigError(f"Config file '{path}' must contain a JSON object")
+    unknown = set(config) - set(SETTINGS) - set(SELECTION_KEYS)
+    if unknown:
+        raise ConfigError(f"Unknown key(s) in config file '{path}': {', '.join(sorted(unknown))}")
+    return config
+
+
+def resolve_options(args):
+    """Merges config file values under the command line arguments. Returns a dict keyed by option name."""
+    options = load_config_file(args.config) if args.config else {}
+    for key in list(SETTINGS) + list(SELECTION_KEYS):
+        value = getattr(args, key, None)
+        if value is not None:
+            options[key] = value
+
+    if "concurrency" in options and (not isinstance(options["concurrency"], int) or options["concurrency"] < 1):
+        raise ConfigError("concurrency must be a positive integer")
+    if "cache_mode" in options and options["cache_mode"] not in CACHE_MODES:
+        raise ConfigError(f"cache_mode must be one of: {', '.join(CACHE_MODES)}")
+    if "output_mode" in options and options["output_mode"] not in OUTPUT_MODES:
+        raise ConfigError(f"output_mode must be one of: {', '.join(OUTPUT_MODES)}")
+    for key in ("chunk_tokens", "map_token_budget", "map_concurrency", "small_document_tokens", "batch_token_budget", "batch_max_documents"):
+        if key in options and (not isinstance(options[key], int) or options[key] < 1):
+            raise ConfigError(f"{key} must be a positive integer")
+    if "context_tokens" in options and (not isinstance(options["context_tokens"], int) or options["context_tokens"] < 2048):
+        raise ConfigError("context_tokens must be an integer >= 2048")
+    if "keep_alive" in options:
+        # Ollama takes seconds as a number or a Go duration string; a negative value keeps the model loaded
+        keep_alive = options["keep_alive"]
+        if isinstance(keep_alive, str) and re.fullmatch(r'-?\d+', keep_alive.strip()):
+            keep_alive = options["keep_alive"] = int(keep_alive)
+        if not (isinstance(keep_alive, int) or re.fullmatch(r'-?(\d+(\.\d+)?(ms|s|m|h))+', str(keep_alive))):
+            raise ConfigError(f"keep_alive must be seconds or a duration like '30m' or '1h', got '{keep_alive}'")
+    if "response_format" in options and options["response_format"] not in OUTPUT_FORMATS:
+        raise ConfigError(f"response_format must be one of: {', '.join(OUTPUT_FORMATS)}")
+    if "schedule" in options and options["schedule"] not in SCHEDULE_POLICIES:
+        raise ConfigError(f"schedule must be one of: {', '.join(SCHEDULE_POLICIES)}")
+    if "queue_idle_timeout" in options and (not isinstance(options["queue_idle_timeout"], (int, float)) or options["queue_idle_timeout"] < 0):
+        raise ConfigError("queue_idle_timeout must be a number >= 0")
+    if "aging_seconds" in options and (not isinstance(options["aging_seconds"], (int, float)) or options["aging_seconds"] < 0):
+        raise ConfigError("aging_seconds must be a number >= 0")
+    patterns = options.get("priority_patterns", {})
+    if not isinstance(patterns, dict) or not all(isinstance(v, int) for v in patterns.values()):
+        raise ConfigError('priority_patterns must map file name patterns to integers, e.g. {"*URGENT*": 5}')
+    if "log_format" in options and options["log_format"] not in LOG_FORMATS:
+        raise ConfigError(f"log_format must be one of: {', '.join(LOG_FORMATS)}")
+    if options.get("shard"):
+        options["shard"] = parse_shard(options["shard"])
+    if options.get("coordinator") and options.get("worker"):
+        raise ConfigError("a process is either a coordinator or a worker, not both")
+    return options
+
+
+def parse_shard(value):
+    """Parses 'K/N' into (K, N)."""
+    try:
+        index, count = (int(x) for x in str(value).split('/'))
+    except ValueError:
+        raise ConfigError(f"shard must look like K/N, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise ConfigError(f"shard index must be between 0 and {count - 1}, got '{value}'")
+    return index, count
+
+
+def apply_settings(options):
+    """Overrides the module configuration constants with the resolved options."""
+    for key, constant in SETTINGS.items():
+        if key in options:
+            globals()[constant] = options[key]
+
+
+def in_shard(filename, shard):
+    """Stable assignment of a file to one of N shards, identical on every machine."""
+    if not shard:
+        return True
+    index, count = shard
+    return zlib.crc32(filename.encode('utf-8')) % count == index
+
+
+# --- PIPELINE ---
+
+# Created by the first load_catalogue() call, once CACHE_DIRECTORY and CACHE_MODE are configured
+CATALOGUE_CACHE = None
+
+
+def load_catalogue(selected_sns_files):
+    """
+    Loads info codes and the selected SNS files and prepares the LLM catalogue entries once for the whole run.
+    Parsed files and rendered entries come from the catalogue cache when the file contents are unchanged.
+    """
+    global CATALOGUE_CACHE
+    if CATALOGUE_CACHE is None:
+        CATALOGUE_CACHE = CatalogueCache(parse_sns_json, parse_info_codes_json, parse_info_codes,
+                                         os.path.join(CACHE_DIRECTORY, "catalogue"), CACHE_MODE)
+    catalogue = CATALOGUE_CACHE.load(DATA_DIRECTORY, selected_sns_files)
+    sns_data, info_codes = catalogue["sns_data"], catalogue["info_codes"]
+    info_codes_file, loaded_sns_files = catalogue["info_codes_file"], catalogue["sns_files_loaded"]
+    sources = catalogue["sources"]
+
+    print("\n[INFO CODES] Loading automatically...")
+    if info_codes_file:
+        name = os.path.basename(info_codes_file)
+        logging.info(f"Loaded info codes from {name} ({sources[name]}): {info_codes_file}")
+        print(f"  ✓ Loaded {len(info_codes)} info codes from: {name}")
+    else:
+        logging.warning("No info_codes.json or info_codes.txt found.")
+        print("  ✗ No info codes file found!")
+
+    print("\n[SNS FILES] Loading selected files...")
+    for sns_file in selected_sns_files:
+        if sns_file not in sources:
+            print(f"  ✗ SNS file not found: {sns_file}")
+            logging.debug(f"  ✗ SNS file not found (skipping): {sns_file}")
+        elif sns_file in loaded_sns_files:
+            systems = catalogue["system_counts"][sns_file]
+            print(f"  ✓ Loaded {systems} systems from: {sns_file} ({sources[sns_file]})")
+            logging.info(f"  ✓ Loaded {systems} systems from: {sns_file} ({sources[sns_file]})")
+
+    # Summary of loaded files
+    print(f"\n{'='*50}")
+    print(f"DATA SOURCES LOADED:")
+    print(f"  Info Codes: {len(info_codes)} codes")
+    print(f"  SNS Files: {len(loaded_sns_files)} file(s)")
+    print(f"  Total SNS systems: {len(sns_data)}")
+    print(f"{'='*50}")
+
+    logging.info(f"\n{'='*50}")
+    logging.info(f"DATA SOURCES LOADED:")
+    logging.info(f"  Info Codes: {info_codes_file}")
+    logging.info(f"  SNS Files ({len(loaded_sns_files)}):")
+    for f in loaded_sns_files:
+        logging.info(f"    - {f}")
+    logging.info(f"  Total SNS systems: {len(sns_data)}")
+    logging.info(f"  Total Info codes: {len(info_codes)}")
+    logging.info(f"{'='*50}\n")
+
+    if not sns_data:
+        logging.warning(f"CRITICAL: No SNS systems were loaded.")
+    if not info_codes:
+        logging.warning(f"CRITICAL: No Info Codes were loaded.")
+
+    logging.info(f"Context prepared - SNS context size: {len(catalogue['sns_context'])} chars "
+                 f"({len(catalogue['sns_entries'])} systems), Info context size: {len(catalogue['info_context'])} chars "
+                 f"({len(catalogue['info_entries'])} codes)")
+    return catalogue
+
+
+def results_fingerprint(catalogue):
+    """Fingerprint of what shapes an LLM answer besides the model and the document: the catalogue and the prompt mode."""
+    if MAP_REDUCE:
+        return fingerprint_text(catalogue["fingerprint"], CONTEXT_TOKENS, RESPONSE_FORMAT, "map-reduce", CHUNK_TOKENS, MAP_TOKEN_BUDGET)
+    return fingerprint_text(catalogue["fingerprint"], CONTEXT_TOKENS, RESPONSE_FORMAT)
+
+
+def classify_document(filepath, catalogue, cache, file_hash=None, history=None, details=None):
+    """
+    Determines the DMC parts for one document: result cache, run history, then LLM, then keyword fallback.
+    Returns (dmc_parts, issue, classified_by); dmc_parts is None when the document could not be classified.
+    Prompt and map-reduce statistics are added to details when a dict is given.
+    """
+    cache_key = None
+    if cache.mode != 'off':
+        file_hash = file_hash or hash_file(filepath)
+        cache_key = ResultCache.make_key(file_hash, OLLAMA_MODEL, results_fingerprint(catalogue))
+        cached_parts = cache.get(cache_key)
+        if cached_parts:
+            logging.info(f"Using cached result for {os.path.basename(filepath)}")
+            return cached_parts, None, "cache"
+        # An earlier run with the same model and catalogue already classified this document body
+        if cache.mode == 'use' and history is not None:
+            cached_parts = history.cached_parts(file_hash, OLLAMA_MODEL, results_fingerprint(catalogue))
+            if cached_parts:
+                logging.info(f"Using result from run history for {os.path.basename(filepath)}")
+                cache.put(cache_key, cached_parts)
+                return cached_parts, None, "history"
+
+    headings_text, body_text = extract_document_text(filepath, file_hash)
+    if not headings_text and not body_text:
+        return None, "Could not read or extract content.", None
+
+    details = {} if details is None else details
+    llm_body = body_text
+    if MAP_REDUCE and needs_map_reduce(body_text, classification_prompt_builder().body_limit_chars(headings_text)):
+        # MAP_SLOTS keeps the chunk requests of all documents in flight at MAP_CONCURRENCY together
+        condensed, stats = condense_document(headings_text, body_text, summarize_with_llm, CHUNK_TOKENS,
+                                             MAP_TOKEN_BUDGET, concurrency=MAP_CONCURRENCY)
+        details["map_reduce"] = stats
+        if stats['chunks_summarized']:
+            logging.info(f"Map-reduce: summarized {stats['chunks_summarized']}/{stats['chunks_total']} chunks "
+                         f"(~{stats['map_tokens']} tokens) in {stats['map_ms']:.0f} ms")
+        if condensed:
+            llm_body = condensed
+
+    details["prompt"] = {}
+    dmc_parts = generate_dmc_with_llm(headings_text, llm_body, catalogue["sns_entries"], catalogue["info_entries"],
+                                      catalogue["available_sns_codes"], catalogue["available_info_codes"], details["prompt"])
+    classified_by = "llm"
+    if dmc_parts:
+        if cache_key:
+            cache.put(cache_key, dmc_parts)
+    else:
+        # Fallback results are not cached - the next run should retry the LLM
+        logging.warning("LLM failed, attempting context-aware fallback.")
+        dmc_parts = generate_dmc_with_fallback(headings_text or "", body_text or "", catalogue["sns_data"], catalogue["info_codes"])
+        classified_by = "fallback"
+
+    if not dmc_parts:
+        return None, "Failed to determine DMC using all methods.", None
+    return dmc_parts, None, classified_by
+
+
+def classify_small_documents(filenames, catalogue, cache, history=None):
+    """
+    Batching pre-pass: classifies the short documents among filenames several per request.
+    Returns {filename: (dmc_parts, details)}. Documents that are cached, too long, alone in
+    their batch or missing from the batch answer are left out and classified individually.
+    """
+    fingerprint = results_fingerprint(catalogue)
+    max_xml_bytes = ESTIMATOR.chars_for(SMALL_DOCUMENT_TOKENS) * XML_BYTES_PER_TEXT_CHAR
+    small, hashes = [], {}
+    for filename in filenames:
+        filepath = os.path.join(DOCS_DIRECTORY, filename)
+        # The size of the document XML rules out long documents without extracting them
+        if estimate_cost(filepath) > max_xml_bytes:
+            continue
+        file_hash = hash_file(filepath)
+        if ResultCache.make_key(file_hash, OLLAMA_MODEL, fingerprint) in cache or (
+                cache.mode == 'use' and history is not None and history.cached_parts(file_hash, OLLAMA_MODEL, fingerprint)):
+            continue
+        headings_text, body_text = extract_document_text(filepath, file_hash)
+        if not headings_text and not body_text:
+            continue
+        tokens = ESTIMATOR.count(headings_text or '') + ESTIMATOR.count(body_text or '')
+        if tokens <= SMALL_DOCUMENT_TOKENS:
+            small.append(BatchDocument(None, filename, headings_text, body_text, tokens))
+            hashes[filename] = file_hash
+
+    # The token budget is a target; a batch whose rendered documents would be truncated in the prompt is split
+    batches = [part for batch in pack_batches(small, BATCH_TOKEN_BUDGET, BATCH_MAX_DOCUMENTS)
+               for part in split_to_fit(batch, batch_fits_prompt) if len(part) > 1]
+    if not batches:
+        return {}
+
+    def run(batch):
+        return batch, generate_dmc_batch_with_llm(batch, catalogue["sns_entries"], catalogue["info_entries"],
+                                                  catalogue["available_sns_codes"], catalogue["available_info_codes"])
+
+    prepared = {}
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        for batch, (results, report) in executor.map(run, batches):
+            for document in batch:
+                dmc_parts = results.get(document.doc_id)
+                if dmc_parts:
+                    cache.put(ResultCache.make_key(hashes[document.filename], OLLAMA_MODEL, fingerprint), dmc_parts)
+                    prepared[document.filename] = (dmc_parts, {"batch": {"documents": len(batch), "prompt": report}})
+    batched = sum(len(batch) for batch in batches)
+    logging.info(f"Batching: {len(prepared)}/{batched} small documents classified in {len(batches)} request(s); "
+                 f"{batched - len(prepared)} will be retried individually")
+    return prepared
+
+
+def process_file(filename, catalogue, cache, output_index, history=None, prepared=None):
+    """
+    Classifies one document and writes its DMC-named output. Returns (status, log_entry).
+    prepared is a (dmc_parts, details) result from classify_small_documents, if the document was batched.
+    """
+    logging.info(f"--- Processing file: {filename} ---")
+    filepath = os.path.join(DOCS_DIRECTORY, filename)
+    file_hash, details = None, {}
+    try:
+        file_hash = hash_file(filepath)
+        if prepared:
+            (dmc_parts, details), issue, classified_by = prepared, None, "llm-batch"
+        else:
+            dmc_parts, issue, classified_by = classify_document(filepath, catalogue, cache, file_hash, history, details)
+    except Exception as e:
+        dmc_parts, issue = None, f"Unexpected error: {e}"
+    if not dmc_parts:
+        logging.error(f"Could not assign DMC for file: {filename} ({issue})")
+        return "failed", {"file": filename, "file_hash": file_hash, "issue": issue}
+    try:
+        status, entry = write_output(filename, dmc_parts, output_index)
+    except Exception as e:
+        # e.g. the output folder became unwritable or full while reserving the name
+        logging.error(f"Could not write output for file: {filename} ({e})")
+        return "failed", {"file": filename, "file_hash": file_hash, "issue": f"Could not write output: {e}",
+                          "dmc_parts": dmc_parts}
+    entry.update(file_hash=file_hash, classified_by=classified_by, fallback=classified_by == "fallback", **details)
+    return status, entry
+
+
+def write_output(filename, dmc_parts, output_index):
+    """Writes the DMC-named output for a classified document. Returns (status, log_entry); failed if nothing was saved."""
+    filepath = os.path.join(DOCS_DIRECTORY, filename)
+    final_dmc = format_dmc(dmc_parts)
+
+    # Save file to output directory with new DMC filename, never overwriting an earlier output
+    new_filename, output_path, counter = output_index.reserve(final_dmc, create=OUTPUT_MODE != 'manifest')
+    if counter:
+        logging.warning(f"Duplicate DMC detected, appending counter: __{counter:03d}")
+    entry = {
+        "file": filename,
+        "source_path": os.path.abspath(filepath),
+        "assigned_dmc": final_dmc,
+        "output_file": new_filename,
+        "output_mode": None,
+        "dmc_parts": dmc_parts
+    }
+    try:
+        entry["output_mode"] = materialize_output(filepath, output_path, OUTPUT_MODE)
+        logging.info(f"Saved ({entry['output_mode']}): {new_filename} -> {OUTPUT_DIRECTORY}/")
+    except Exception as e:
+        output_index.release(output_path)
+        logging.error(f"Failed to save file {new_filename}: {e}")
+        entry.update(output_file=None, issue=f"Could not write output: {e}")
+        return "failed", entry
+
+    logging.info(f"Successfully assigned DMC: {final_dmc}")
+    return "successful", entry
+
+
+def start_model_warmup():
+    """Starts loading OLLAMA_MODEL in the background; the first request waits for it."""
+    global MODEL_WARMUP
+    MODEL_WARMUP = ModelWarmup(OLLAMA_API_URL, OLLAMA_MODEL, KEEP_ALIVE).start()
+
+
+def finish_model_warmup():
+    """Returns the warm-up stats and unpins the model now that the batch is done. Safe to call again."""
+    global MODEL_WARMUP
+    warmup, MODEL_WARMUP = MODEL_WARMUP, None
+    if warmup is None:
+        return None
+    stats = warmup.wait()
+    if warmup.succeeded:
+        release_model(OLLAMA_API_URL, OLLAMA_MODEL)
+    return stats
+
+
+def start_concurrency_limiter():
+    """Sets the shared chunk-summary limit and enables the adaptive in-flight request limit for this run if configured."""
+    global LLM_LIMITER, MAP_SLOTS
+    MAP_SLOTS = threading.BoundedSemaphore(MAP_CONCURRENCY)
+    if ADAPTIVE_CONCURRENCY and CONCURRENCY > 1:
+        LLM_LIMITER = AdaptiveConcurrency(max_limit=CONCURRENCY)
+        logging.info(f"Adaptive concurrency: starting at 1 in-flight request, up to {CONCURRENCY}")
+
+
+# --- COORDINATOR / WORKER MODE ---
+
+def run_coordinator(queue_path, catalogue, files_to_process, selected_sns_files):
+    """
+    Enqueues the input documents into the shared work queue and waits until workers
+    have classified all of them. Returns the queue for merging the results.
+    """
+    queue = WorkQueue(queue_path)
+    # Workers map this file instead of each loading the catalogue themselves
+    catalogue_file = f"{queue_path}.catalogue"
+    try:
+        size = write_compiled_catalogue(catalogue, catalogue_file)
+        logging.info(f"Compiled catalogue for workers: {catalogue_file} ({size / 1024:.0f} KiB)")
+    except OSError as e:
+        logging.warning(f"Could not write the compiled catalogue, workers will load their own: {e}")
+        catalogue_file = None
+    queue.set_meta("run", {
+        "model": OLLAMA_MODEL,
+        "input_dir": os.path.abspath(DOCS_DIRECTORY),
+        "sns_files": selected_sns_files,
+        "catalogue_fingerprint": catalogue["fingerprint"],
+        "catalogue_file": catalogue_file,
+        "map_reduce": {"enabled": MAP_REDUCE, "chunk_tokens": CHUNK_TOKENS, "token_budget": MAP_TOKEN_BUDGET},
+        "context_tokens": CONTEXT_TOKENS,
+        "response_format": RESPONSE_FORMAT,
+    })
+
+    logging.info(f"Hashing {len(files_to_process)} documents for the work queue...")
+    hashed = [(f, hash_file(os.path.join(DOCS_DIRECTORY, f))) for f in files_to_process]
+    # Units finished under this model and prompt configuration are kept when the coordinator is restarted
+    to_classify = queue.enqueue(hashed, fingerprint_text(OLLAMA_MODEL, results_fingerprint(catalogue)))
+    logging.info(f"Queue '{queue_path}': {to_classify} work unit(s) to classify for {len(hashed)} document(s)")
+
+    last_counts, last_progress = None, time.monotonic()
+    while not queue.is_finished():
+        counts = queue.counts()
+        if counts != last_counts:
+            logging.info(f"Queue progress - pending: {counts['pending']}, leased: {counts['leased']}, "
+                         f"done: {counts['done']}, failed: {counts['failed']}")
+            last_counts, last_progress = counts, time.monotonic()
+        elif QUEUE_IDLE_TIMEOUT and not counts['leased'] and time.monotonic() - last_progress > QUEUE_IDLE_TIMEOUT:
+            # Expired leases are back in the pool by now; nobody is taking them
+            abandoned = queue.abandon_pending(f"No worker took the document within {QUEUE_IDLE_TIMEOUT:g}s.")
+            logging.error(f"Queue '{queue_path}': no worker progress for {QUEUE_IDLE_TIMEOUT:g}s, "
+                          f"giving up on {abandoned} work unit(s)")
+            break
+        time.sleep(QUEUE_POLL_SECONDS)
+    return queue
+
+
+def attach_worker_catalogue(queue_path, run):
+    """
+    Maps the catalogue the coordinator compiled next to the work queue (shared by all workers on
+    this machine through the page cache). Returns None when there is none for this run or it
+    cannot be read, and the worker loads the catalogue itself.
+    """
+    catalogue_file = f"{queue_path}.catalogue"
+    if not run.get("catalogue_file") or not os.path.exists(catalogue_file):
+        return None
+    try:
+        catalogue = attach_compiled_catalogue(catalogue_file)
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Could not map the compiled catalogue '{catalogue_file}', loading it instead: {e}")
+        return None
+    if catalogue["fingerprint"] != run["catalogue_fingerprint"]:
+        logging.warning(f"The compiled catalogue '{catalogue_file}' is from another run, loading it instead")
+        return None
+    logging.info(f"Mapped the coordinator's catalogue: {len(catalogue['sns_data'])} systems, "
+                 f"{len(catalogue['info_codes'])} info codes ({catalogue['mapped'].size / 1024:.0f} KiB shared)")
+    return catalogue
+
+
+def run_worker(queue_path, options):
+    """Leases documents from the shared work queue and reports classification results until the queue drains."""
+    if not os.path.exists(queue_path):
+        logging.error(f"Work queue '{queue_path}' does not exist - start the coordinator first.")
+        return EXIT_USAGE
+    queue = WorkQueue(queue_path)
+    run = queue.get_meta("run")
+    if not run:
+        logging.error(f"Work queue '{queue_path}' has no run metadata - start the coordinator first.")
+        return EXIT_USAGE
+
+    # The coordinator decides the model, prompt mode and input folder unless overridden locally
+    # (e.g. when the shared input folder is mounted at a different path on this machine)
+    global OLLAMA_MODEL, MAP_REDUCE, CHUNK_TOKENS, MAP_TOKEN_BUDGET, CONTEXT_TOKENS, RESPONSE_FORMAT
+    if "model" not in options:
+        OLLAMA_MODEL = run["model"]
+    if "map_reduce" in run and "map_reduce" not in options:
+        MAP_REDUCE = run["map_reduce"]["enabled"]
+        CHUNK_TOKENS = run["map_reduce"]["chunk_tokens"]
+        MAP_TOKEN_BUDGET = run["map_reduce"]["token_budget"]
+    if "context_tokens" in run and "context_tokens" not in options:
+        CONTEXT_TOKENS = run["context_tokens"]
+    if "response_format" in run and "response_format" not in options:
+        RESPONSE_FORMAT = run["response_format"]
+    input_dir = options.get("input_dir") or run["input_dir"]
+
+    start_model_warmup()
+    try:
+        return work_on_queue(queue, queue_path, run, input_dir)
+    finally:
+        # Unpins the model on every exit, not only after the queue drains
+        finish_model_warmup()
+
+
+def work_on_queue(queue, queue_path, run, input_dir):
+    """The worker loop of run_worker, started once the model is loading."""
+    catalogue = attach_worker_catalogue(queue_path, run)
+    if catalogue is None:
+        catalogue = load_catalogue(run["sns_files"])
+    if catalogue["fingerprint"] != run["catalogue_fingerprint"]:
+        logging.error("This worker's SNS/info code data differs from the coordinator's - check --data-dir.")
+        return EXIT_FATAL
+
+    cache = ResultCache(CACHE_DIRECTORY, CACHE_MODE)
+    start_text_cache()
+    start_concurrency_limiter()
+    history = RunHistory(HISTORY_DATABASE) if HISTORY_DATABASE else None
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    processed = []
+
+    def work_loop():
+        while True:
+            units = queue.lease(worker_id)
+            if not units:
+                if queue.is_finished():
+                    return
+                # Other workers hold the remaining leases; wait in case one of them expires
+                time.sleep(QUEUE_POLL_SECONDS)
+                continue
+            for file_hash, filename in units:
+                logging.info(f"--- [{worker_id}] Processing file: {filename} ---")
+                try:
+                    dmc_parts, issue, _ = classify_document(os.path.join(input_dir, filename), catalogue, cache, file_hash, history)
+                except Exception as e:
+                    dmc_parts, issue = None, f"Unexpected error: {e}"
+                if dmc_parts:
+                    queue.complete(file_hash, worker_id, dmc_parts)
+                else:
+                    queue.fail(file_hash, worker_id, issue)
+                processed.append(filename)
+
+    logging.info(f"Worker {worker_id} started on queue '{queue_path}' with {CONCURRENCY} thread(s)")
+    threads = [threading.Thread(target=work_loop, daemon=True) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    logging.info(f"Worker {worker_id} finished: {len(processed)} document(s) processed")
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        options = resolve_options(args)
+    except ConfigError as e:
+        parser.print_usage(sys.stderr)
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    apply_settings(options)
+
+    if not os.path.isdir(DATA_DIRECTORY):
+        logging.error(f"Data directory '{DATA_DIRECTORY}' does not exist.")
+        return EXIT_FATAL
+
+    if args.list_sns:
+        for f in list_available_sns_files():
+            print(f)
+        return EXIT_OK
+
+    if options.get("worker"):
+        return run_worker(options["worker"], options)
+
     print("\n" + "="*60)
     print("       DMC AUTOMATION PROCESS")
     print("="*60)
-    
-    # Select SNS files interactively
-    selected_sns_files = select_sns_files()
-    if selected_sns_files is None:
-        return
-    
+
+    # SNS files come from --sns/--all-sns/config; fall back to the interactive menu only on a terminal
+    if options.get("all_sns"):
+        selected_sns_files = list_available_sns_files()
+    elif options.get("sns_files"):
+        selected_sns_files = options["sns_files"]
+    elif sys.stdin.isatty():
+        selected_sns_files = select_sns_files()
+        if selected_sns_files is None:
+            return EXIT_OK
+    else:
+        print("error: no SNS files selected; use --sns FILE or --all-sns when running non-interactively", file=sys.stderr)
+        return EXIT_USAGE
+
+    os.makedirs(LOGS_DIRECTORY, exist_ok=True)
+    log_filename = os.path.join(LOGS_DIRECTORY, f"dmc_processing_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+
     logging.info("--- Starting DMC Automation Process ---")
+    if not options.get("coordinator"):
+        # The model loads while the catalogue is read and the first documents are extracted
+        start_model_warmup()
     try:
-        sns_data, info_codes = {}, {}
-        
-        # Load info codes from JSON (preferred) or TXT - ALWAYS LOADED
-        info_codes_json_path = os.path.join(DATA_DIRECTORY, "info_codes.json")
-        info_codes_txt_path = os.path.join(DATA_DIRECTORY, "info_codes.txt")
-        
-        print("\n[INFO CODES] Loading automatically...")
-        if os.path.exists(info_codes_json_path):
-            logging.info(f"Loading info codes from JSON: {info_codes_json_path}")
-            info_codes = parse_info_codes_json(info_codes_json_path)
-            print(f"  ✓ Loaded {len(info_codes)} info codes from: info_codes.json")
-        elif os.path.exists(info_codes_txt_path):
-            logging.info(f"Loading info codes from TXT: {info_codes_txt_path}")
-            info_codes = parse_info_codes(info_codes_txt_path)
-            print(f"  ✓ Loaded {len(info_codes)} info codes from: info_codes.txt")
-        else:
-            logging.warning("No info_codes.json or info_codes.txt found.")
-            print("  ✗ No info codes file found!")
-        
-        # Load SNS data from SELECTED JSON files
-        print("\n[SNS FILES] Loading selected files...")
-        loaded_sns_files = []
-        for sns_file in selected_sns_files:
-            file_path = os.path.join(DATA_DIRECTORY, sns_file)
-            if os.path.exists(file_path):
-                file_sns_data = parse_sns_json(file_path)
-                if file_sns_data:
-                    sns_data.update(file_sns_data)
-                    loaded_sns_files.append(sns_file)
-                    print(f"  ✓ Loaded {len(file_sns_data)} systems from: {sns_file}")
-                    logging.info(f"  ✓ Loaded {len(file_sns_data)} systems from: {sns_file}")
-            else:
-                print(f"  ✗ SNS file not found: {sns_file}")
-                logging.debug(f"  ✗ SNS file not found (skipping): {sns_file}")
-
-        # Summary of loaded files
-        print(f"\n{'='*50}")
-        print(f"DATA SOURCES LOADED:")
-        print(f"  Info Codes: {len(info_codes)} codes")
-        print(f"  SNS Files: {len(loaded_sns_files)} file(s)")
-        print(f"  Total SNS systems: {len(sns_data)}")
-        print(f"{'='*50}")
-        
-        logging.info(f"\n{'='*50}")
-        logging.info(f"DATA SOURCES LOADED:")
-        logging.info(f"  Info Codes: {info_codes_json_path if os.path.exists(info_codes_json_path) else info_codes_txt_path}")
-        logging.info(f"  SNS Files ({len(loaded_sns_files)}):")
-        for f in loaded_sns_files:
-            logging.info(f"    - {f}")
-        logging.info(f"  Total SNS systems: {len(sns_data)}")
-        logging.info(f"  Total Info codes: {len(info_codes)}")
-        logging.info(f"{'='*50}\n")
-
-        if not sns_data: 
-            logging.warning(f"CRITICAL: No SNS systems were loaded.")
-        if not info_codes: 
-            logging.warning(f"CRITICAL: No Info Codes were loaded.")
-            
+        return run_batch(options, selected_sns_files, log_filename)
+    finally:
+        # Early exits (no catalogue, no documents) and crashes must not leave the model pinned for KEEP_ALIVE
+        finish_model_warmup()
+
+
+def run_batch(options, selected_sns_files, log_filename):
+    """Loads the catalogue, classifies the input documents and writes the run log. Returns the exit code."""
+    try:
+        catalogue = load_catalogue(selected_sns_files)
     except Exception as e:
         logging.error(f"Critical error during data loading: {e}. Exiting.")
-        return
+        return EXIT_FATAL
+    if not catalogue["sns_data"] and not catalogue["info_codes"]:
+        logging.error("No SNS systems or info codes could be loaded. Exiting.")
+        return EXIT_FATAL
 
-    sns_context_str, info_context_str = prepare_context_for_llm(sns_data, info_codes)
-    available_sns_codes, available_info_codes = set(sns_data.keys()), set(info_codes.keys())
-    
-    logging.info(f"Context prepared - SNS context size: {len(sns_context_str)} chars, Info context size: {len(info_context_str)} chars")
-    
-    files_to_process = [f for f in os.listdir(DOCS_DIRECTORY) if f.endswith(".docx")]
+    # Names are relative to DOCS_DIRECTORY ("sub/doc.docx" with --recursive)
+    scanner = DocumentScanner(SCAN_STATE_FILE, DOCS_DIRECTORY, RECURSIVE_SCAN) if INCREMENTAL_SCAN else None
+    try:
+        files_to_process = scanner.scan() if scanner else list_documents(DOCS_DIRECTORY, RECURSIVE_SCAN)
+    except OSError as e:
+        logging.error(f"Cannot read input directory '{DOCS_DIRECTORY}': {e}")
+        return EXIT_FATAL
+    if scanner:
+        logging.info(f"Incremental scan of '{DOCS_DIRECTORY}': {scanner.summary()}")
+    shard = options.get("shard")
+    files_to_process = [f for f in files_to_process if in_shard(f, shard)]
     if not files_to_process:
-        logging.warning(f"No .docx files found in '{DOCS_DIRECTORY}'.")
-        return
-    
+        found = "new or changed .docx files" if scanner else ".docx files"
+        logging.warning(f"No {found} found in '{DOCS_DIRECTORY}'" + (f" for shard {shard[0]}/{shard[1]}." if shard else "."))
+        if scanner:
+            scanner.save()
+        return EXIT_OK
+
     # Ensure output directory exists
     if not os.path.exists(OUTPUT_DIRECTORY):
         os.makedirs(OUTPUT_DIRECTORY)
         logging.info(f"Created output directory: {OUTPUT_DIRECTORY}")
-    
-    log_data = {
-        "data_sources": {
-            "info_codes_file": info_codes_json_path if os.path.exists(info_codes_json_path) else info_codes_txt_path,
-            "sns_files_loaded": loaded_sns_files,
-            "total_sns_systems": len(sns_data),
-            "total_info_codes": len(info_codes)
+
+    output_index = OutputNameIndex(OUTPUT_DIRECTORY)
+    cache = ResultCache(CACHE_DIRECTORY, CACHE_MODE)
+    start_text_cache()
+    start_concurrency_limiter()
+    history = None
+    if HISTORY_DATABASE:
+        history = RunHistory(HISTORY_DATABASE)
+        # Older logs are imported once; later runs only look at files not seen before
+        ingested = history.ingest_logs(LOGS_DIRECTORY)
+        if ingested:
+            logging.info(f"Run history: imported {ingested} earlier log file(s) into {HISTORY_DATABASE}")
+
+    # Entries are written as each document completes rather than collected until the end
+    log_writer = StreamingLogWriter(
+        log_filename,
+        data_sources={
+            "info_codes_file": catalogue["info_codes_file"],
+            "sns_files_loaded": catalogue["sns_files_loaded"],
+            "total_sns_systems": len(catalogue["sns_data"]),
+            "total_info_codes": len(catalogue["info_codes"]),
+            "catalogue_fingerprint": results_fingerprint(catalogue)
         },
-        "successful": [], 
-        "failed": []
-    }
-    for filename in files_to_process:
-        logging.info(f"--- Processing file: {filename} ---")
-        filepath = os.path.join(DOCS_DIRECTORY, filename)
-        headings_text, body_text = extract_text_from_docx(filepath)
-        if not headings_text and not body_text:
-            log_data["failed"].append({"file": filename, "issue": "Could not read or extract content."})
-            continue
-        
-        dmc_parts = generate_dmc_with_llm(headings_text, body_text, sns_context_str, info_context_str, available_sns_codes, available_info_codes)
-        
-        if not dmc_parts:
-            logging.warning("LLM failed, attempting context-aware fallback.")
-            dmc_parts = generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes)
-            
-        if dmc_parts:
-            final_dmc = format_dmc(dmc_parts)
-            
-            # Save file to output directory with new DMC filename
-            new_filename = f"{final_dmc}.docx"
-            output_path = os.path.join(OUTPUT_DIRECTORY, new_filename)
-            try:
-                shutil.copy2(filepath, output_path)
-                logging.info(f"Saved: {new_filename} -> {OUTPUT_DIRECTORY}/")
-            except Exception as e:
-                logging.error(f"Failed to save file {new_filename}: {e}")
-            
-            log_data["successful"].append({
-                "file": filename, 
-                "assigned_dmc": final_dmc, 
-                "output_file": new_filename,
-                "dmc_parts": dmc_parts
-            })
-            logging.info(f"Successfully assigned DMC: {final_dmc}")
-        else:
-            log_data["failed"].append({"file": filename, "issue": "Failed to determine DMC using all methods."})
-            logging.error(f"Could not assign DMC for file: {filename}")
-            
-    with open(log_filename, 'w', encoding='utf-8') as f:
-        json.dump(log_data, f, indent=4)
-    
+        history=history,
+        run_settings={
+            "model": OLLAMA_MODEL,
+            "concurrency": CONCURRENCY,
+            "adaptive_concurrency": ADAPTIVE_CONCURRENCY,
+            "schedule": SCHEDULE_POLICY,
+            "map_reduce": MAP_REDUCE,
+            "context_tokens": CONTEXT_TOKENS,
+            "batch_small": BATCH_SMALL_DOCUMENTS,
+            "response_format": RESPONSE_FORMAT,
+            "keep_alive": KEEP_ALIVE,
+            "cache_mode": CACHE_MODE,
+            "output_mode": OUTPUT_MODE,
+            "shard": f"{shard[0]}/{shard[1]}" if shard else None,
+            "queue": options.get("coordinator")
+        })
+
+    schedule_report = None
+    if options.get("coordinator"):
+        # Workers only classify; outputs are written here in filename order so duplicate
+        # DMCs get the same __NNN counters no matter which machine finished first
+        queue = run_coordinator(options["coordinator"], catalogue, files_to_process, selected_sns_files)
+        for filename, file_hash, state, dmc_parts, issue, worker in queue.file_results():
+            if state == 'done':
+                try:
+                    status, entry = write_output(filename, dmc_parts, output_index)
+                except Exception as e:
+                    logging.error(f"Could not write output for file: {filename} ({e})")
+                    status, entry = "failed", {"file": filename, "issue": f"Could not write output: {e}", "dmc_parts": dmc_parts}
+                entry.update(file_hash=file_hash, worker=worker)
+                log_writer.write(status, entry)
+                # Only documents whose output exists are skipped by later incremental scans
+                if scanner and status == "successful":
+                    scanner.mark_done(filename, file_hash)
+            else:
+                log_writer.write("failed", {"file": filename, "file_hash": file_hash, "issue": issue, "worker": worker})
+        queue.close()
+    else:
+        prepared = classify_small_documents(files_to_process, catalogue, cache, history) if BATCH_SMALL_DOCUMENTS else {}
+
+        # Documents are taken in scheduler order (size, priority, waiting time); entries are
+        # logged as each one completes, with how long it waited and its total turnaround
+        scheduler = DocumentScheduler(SCHEDULE_POLICY, AGING_SECONDS, PRIORITY_PATTERNS)
+        scheduler.add_all(files_to_process, DOCS_DIRECTORY)
+
+        def work_loop():
+            while True:
+                job = scheduler.take()
+                if job is None:
+                    return
+                try:
+                    status, entry = process_file(job.filename, catalogue, cache, output_index, history, prepared.get(job.filename))
+                except Exception as e:
+                    # One document must not end this thread and leave the remaining jobs to fewer threads
+                    logging.error(f"Unexpected error processing {job.filename}: {e}")
+                    status, entry = "failed", {"file": job.filename, "issue": f"Unexpected error: {e}"}
+                finally:
+                    scheduler.finish(job)
+                entry.update(priority=job.priority, queue_wait_ms=round(job.queue_wait * 1000),
+                             turnaround_ms=round(job.turnaround * 1000))
+                log_writer.write(status, entry)
+                if scanner and status == "successful":
+                    scanner.mark_done(job.filename, entry.get("file_hash"))
+
+        threads = [threading.Thread(target=work_loop, daemon=True) for _ in range(CONCURRENCY)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        schedule_report = scheduler.report()
+
+    model_load = finish_model_warmup()
+    log_writer.close(cache_hits=cache.hits if cache.mode == 'use' else None,
+                     concurrency_curve=LLM_LIMITER.decisions if LLM_LIMITER else None,
+                     schedule=schedule_report,
+                     model_load=model_load)
+    if history:
+        history.close()
+    if scanner:
+        # Failed documents stay unrecorded and are picked up again by the next --incremental run
+        scanner.save()
+    if LOG_FORMAT == "json":
+        json_filename = convert_to_legacy(log_filename)
+        os.remove(log_filename)
+        log_filename = json_filename
+
     # Print summary
     logging.info(f"\n{'='*50}")
     logging.info(f"PROCESSING COMPLETE")
-    logging.info(f"  Successful: {len(log_data['successful'])} files")
-    logging.info(f"  Failed: {len(log_data['failed'])} files")
+    logging.info(f"  Successful: {log_writer.counts['successful']} files")
+    logging.info(f"  Failed: {log_writer.counts['failed']} files")
+    if cache.mode == 'use':
+        logging.info(f"  Cache hits: {cache.hits}")
+    if TEXT_CACHE.enabled and TEXT_CACHE.hits:
+        logging.info(f"  Extracted text reused: {TEXT_CACHE.hits} documents")
+    if model_load and "load_ms" in model_load:
+        logging.info(f"  Model load: {model_load['load_ms']:.0f} ms (overlapped with catalogue loading)")
+    if schedule_report:
+        logging.info(f"  Queue wait (median/max): {schedule_report['median_queue_wait_s']}s / {schedule_report['max_queue_wait_s']}s")
+        logging.info(f"  Turnaround (median/max): {schedule_report['median_turnaround_s']}s / {schedule_report['max_turnaround_s']}s")
     logging.info(f"  Output folder: {os.path.abspath(OUTPUT_DIRECTORY)}")
     logging.info(f"  Log file: {log_filename}")
     logging.info(f"{'='*50}")
 
+    return EXIT_DOCUMENTS_FAILED if log_writer.counts["failed"] else EXIT_OK
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
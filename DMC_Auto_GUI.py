@@ -1,15 +1,26 @@
 import os
 import re
 import json
-import shutil
+import queue
 import logging
+import importlib
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 from datetime import datetime
-from bs4 import BeautifulSoup
-import docx
-import requests
+from dmc_output import OUTPUT_MODES, OutputNameIndex, materialize_output
+from dmc_results import ResultStore
+from dmc_llm import BATCH_KEEP_ALIVE, Cancelled, CancelToken, ModelWarmup, ollama_generate, release_model
+from dmc_log import StreamingLogWriter
+from dmc_history import DEFAULT_HISTORY_PATH, RunHistory
+from dmc_cache import TextCache, hash_file
+from dmc_catalogue import CatalogueCache, CatalogueManager
+from dmc_scan import DEFAULT_SCAN_STATE_PATH, DocumentScanner, list_documents
+from dmc_schedule import DocumentScheduler
+from dmc_chunking import condense_document, needs_map_reduce
+from dmc_prompt import DEFAULT_CONTEXT_TOKENS, ESTIMATOR, PromptBuilder, subsystem_catalogue_entries
+from dmc_schema import DEFAULT_OUTPUT_FORMAT, choice_schema, dmc_parts_schema
 
 # --- CONFIGURATION ---
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
@@ -18,6 +29,7 @@ DOCS_DIRECTORY = "documents_to_process"
 DATA_DIRECTORY = "Lake"
 LOGS_DIRECTORY = "logs"
 OUTPUT_DIRECTORY = "output"
+OUTPUT_MODE = "auto"
 
 # --- USER-FIXED DMC COMPONENTS ---
 USER_MODEL_IDENT_CODE = "USERMODEL"
@@ -29,6 +41,22 @@ USER_ITEM_LOCATION_CODE = "D"
 DEFAULT_SYSTEM_CODE = "00"
 DEFAULT_INFO_CODE = "000"
 
+# Heavy third-party modules are imported on first use so the window appears before they load;
+# warm_up_imports() preloads them in the background once the first frame is drawn.
+HEAVY_MODULES = ("docx", "requests")
+
+# --- GUI LOG SINK ---
+LOG_POLL_MS = 100      # how often the Tk main loop drains queued log lines and UI updates
+LOG_MAX_LINES = 5000   # lines kept in the log widget; the full log is written to LOGS_DIRECTORY
+
+# --- PROCESSING PIPELINE ---
+EXTRACT_PREFETCH = 2   # documents extracted ahead of the LLM; extraction blocks when this many are waiting
+CONTEXT_TOKENS = DEFAULT_CONTEXT_TOKENS  # largest num_ctx requested; prompts are filled up to it (see dmc_prompt.py)
+SNS_DEFINITION_CHARS = 100  # start of each system's definition included with its title
+MAP_CONCURRENCY = 2    # chunk summaries requested in parallel in map-reduce mode (see dmc_chunking.py)
+KEEP_ALIVE = BATCH_KEEP_ALIVE  # model stays loaded this long after each request; preloaded on connect and at batch start
+RESPONSE_FORMAT = DEFAULT_OUTPUT_FORMAT  # schema (answers constrained to the loaded codes) or json (see dmc_schema.py)
+
 # --- SETUP LOGGING ---
 if not os.path.exists(LOGS_DIRECTORY):
     os.makedirs(LOGS_DIRECTORY)
@@ -137,50 +165,21 @@ def parse_info_codes_txt(file_path):
         return {}
 
 
-def prepare_context_for_llm(sns_data, info_codes):
-    """Creates context string for LLM including subsystems."""
-    sns_lines = []
-    for code, data in sorted(sns_data.items()):
-        title = data.get('title', '')
-        definition = data.get('definition', '')
-        if title:
-            # Include definition for better context
-            if definition:
-                sns_lines.append(f"{code}: {title} - {definition[:100]}")
-            else:
-                sns_lines.append(f"{code}: {title}")
-            subsystems = data.get('subsystems', {})
-            for sub_code, sub_data in sorted(subsystems.items()):
-                sub_title = sub_data.get('title', '')
-                if sub_title and sub_code not in ['00', '0']:
-                    sns_lines.append(f"  {code}-{sub_code}: {sub_title}")
-    
-    sns_context = "VALID SYSTEM CODES AND SUBSYSTEMS:\n" + "\n".join(sns_lines)
-    
-    info_by_type = {}
-    for code, data in sorted(info_codes.items()):
-        code_type = data.get('type', 'other')
-        desc = data.get('description', '')
-        if code_type not in info_by_type:
-            info_by_type[code_type] = []
-        # Increased from 15 to 30 for more comprehensive coverage
-        if desc and len(info_by_type[code_type]) < 30:
-            info_by_type[code_type].append(f"{code}: {desc}")
-    
-    info_lines = []
-    for code_type in ['proced', 'descript', 'fault', 'process', 'sched']:
-        if code_type in info_by_type:
-            info_lines.append(f"\n[{code_type.upper()}]")
-            info_lines.extend(info_by_type[code_type])
-    
-    info_context = "VALID INFO CODES:" + "\n".join(info_lines)
-    
-    return sns_context, info_context
+def warm_up_imports():
+    """Imports HEAVY_MODULES in a background thread so the first document doesn't pay for them."""
+    def load():
+        for name in HEAVY_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+    threading.Thread(target=load, daemon=True).start()
 
 
 def extract_text_from_docx(file_path):
     """Extracts text from a .docx file."""
     try:
+        import docx
         doc = docx.Document(file_path)
         headings, body = [], []
         for para in doc.paragraphs:
@@ -196,27 +195,18 @@ def extract_text_from_docx(file_path):
         return None, None
 
 
-def generate_dmc_with_llm(headings_text, body_text, sns_context, info_context, available_sns_codes, available_info_codes):
-    """Uses Ollama to determine the DMC."""
-    # Use ALL headings and as much body content as practical for LLM context
-    # Most LLMs can handle 8000+ chars comfortably while staying accurate
-    headings_preview = headings_text if headings_text else "No headings."
-    body_preview = body_text[:8000] if body_text else "No content."
-    
-    # Calculate how much content we're analyzing
-    total_chars = len(headings_preview) + len(body_preview)
-    
-    prompt = f"""You are an expert in S1000D documentation standards. Analyze this COMPLETE technical document carefully and select the MOST APPROPRIATE DMC codes.
+CLASSIFY_PROMPT = """You are an expert in S1000D documentation standards. Analyze this COMPLETE technical document carefully and select the MOST APPROPRIATE DMC codes.
 
 DOCUMENT TITLE/HEADINGS (COMPLETE):
-{headings_preview}
+{headings}
 
-DOCUMENT CONTENT (Full text - {len(body_preview)} characters):
-{body_preview}
+DOCUMENT CONTENT (Full text - {body_chars} characters):
+{body}
 
+VALID SYSTEM CODES AND SUBSYSTEMS:
 {sns_context}
 
-{info_context}
+VALID INFO CODES:{info_context}
 
 INSTRUCTIONS:
 1. Read the ENTIRE document title and content carefully
@@ -236,61 +226,217 @@ CODE SELECTION RULES:
 
 Return ONLY this JSON (no other text):
 {{"systemCode": "XX", "subSystemCode": "XX", "subSubSystemCode": "0", "infoCode": "XXX", "disassyCode": "00", "disassyCodeVariant": "A", "confidence": 85, "reasoning": "Brief explanation"}}"""
+# Lean mode: the same prompt without the reasoning field, which is most of the generated tokens
+CLASSIFY_PROMPT_LEAN = (CLASSIFY_PROMPT
+                        .replace("- reasoning: Brief explanation of why you chose these codes\n", "")
+                        .replace(', "reasoning": "Brief explanation"', ""))
+CLASSIFY_OUTPUT_TOKENS = 300
+LEAN_OUTPUT_TOKENS = 100
+
+
+def classification_prompt_builder(lean=False):
+    if lean:
+        return PromptBuilder(CLASSIFY_PROMPT_LEAN, CONTEXT_TOKENS, LEAN_OUTPUT_TOKENS)
+    return PromptBuilder(CLASSIFY_PROMPT, CONTEXT_TOKENS, CLASSIFY_OUTPUT_TOKENS)
+
+
+def generate_dmc_with_llm(headings_text, body_text, sns_entries, info_entries, available_sns_codes, available_info_codes,
+                          cancel_token=None, prompt_stats=None, lean=False):
+    """
+    Uses Ollama to determine the DMC. Raises Cancelled if cancel_token is stopped mid-request.
+    The prompt is filled up to CONTEXT_TOKENS; its token breakdown is stored in prompt_stats when a dict is given.
+    With lean=True no reasoning is requested.
+    """
+    builder = classification_prompt_builder(lean)
+    prompt, report = builder.build(headings_text, body_text, sns_entries, info_entries)
+    if prompt_stats is not None:
+        prompt_stats.update(report)
+    if RESPONSE_FORMAT == "schema":
+        answer_format = dmc_parts_schema(available_sns_codes, available_info_codes, confidence=True, reasoning=not lean)
+    else:
+        answer_format = "json"
+
+    try:
+        dmc_parts = query_llm_json(prompt, answer_format, builder.output_tokens, report["num_ctx"], cancel_token, prompt_stats)
+        if dmc_parts is None:
+            return None
+        return validated_parts(dmc_parts, available_sns_codes, available_info_codes, prompt_stats)
+    except Cancelled:
+        raise
+    except:
+        return None
+
+
+def query_llm_json(prompt, answer_format, output_tokens, num_ctx, cancel_token=None, reply_stats=None):
+    """
+    Sends one request with a JSON answer and returns the decoded object, or None for an empty answer.
+    Raises on request and parse errors. Ollama's token counts and timings are added up in reply_stats.
+    """
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "format": answer_format,
+        "options": {"temperature": 0.2, "num_predict": output_tokens, "num_ctx": num_ctx},
+        "keep_alive": KEEP_ALIVE
+    }
+    reply = ollama_generate(OLLAMA_API_URL, payload, timeout=180, cancel_token=cancel_token)
+    ESTIMATOR.calibrate(prompt, reply.get('prompt_eval_count'))
+    if reply_stats is not None:
+        for key in ('prompt_eval_count', 'eval_count'):
+            if reply.get(key):
+                reply_stats[key] = reply_stats.get(key, 0) + reply[key]
+        if reply.get('load_duration'):
+            reply_stats["load_ms"] = round(reply_stats.get("load_ms", 0) + reply['load_duration'] / 1e6, 1)
+        if reply.get('eval_count'):
+            reply_stats["eval_ms"] = round(reply_stats.get("eval_ms", 0) + (reply.get('eval_duration') or 0) / 1e6, 1)
+    raw_response = reply.get('response', '')
+    if not raw_response.strip():
+        return None
     
+    # A schema-constrained answer is always complete JSON; plain JSON mode may need repairs
+    json_text = raw_response.strip()
+    if RESPONSE_FORMAT == "json" and not json_text.endswith('}'):
+        last_brace = json_text.rfind('}')
+        if last_brace > 0:
+            json_text = json_text[:last_brace + 1]
+    
+    if RESPONSE_FORMAT == "json" and not json_text.startswith('{'):
+        start = json_text.find('{')
+        if start >= 0:
+            json_text = json_text[start:]
+    
+    return json.loads(json_text)
+
+
+def validated_parts(dmc_parts, available_sns_codes, available_info_codes, prompt_stats=None):
+    """Fills missing DMC parts with defaults and replaces codes that are not in the loaded data."""
+    final_parts = {
+        'systemCode': str(dmc_parts.get('systemCode', DEFAULT_SYSTEM_CODE)),
+        'infoCode': str(dmc_parts.get('infoCode', DEFAULT_INFO_CODE)),
+        'subSystemCode': str(dmc_parts.get('subSystemCode', '0')),
+        'subSubSystemCode': str(dmc_parts.get('subSubSystemCode', '0')),
+        'disassyCode': str(dmc_parts.get('disassyCode', '00')),
+        'disassyCodeVariant': str(dmc_parts.get('disassyCodeVariant', 'A')),
+        'confidence': dmc_parts.get('confidence', 0),
+        'reasoning': dmc_parts.get('reasoning', '')
+    }
+    
+    invalid_codes = 0
+    if available_sns_codes and final_parts['systemCode'] not in available_sns_codes:
+        final_parts['systemCode'] = DEFAULT_SYSTEM_CODE
+        final_parts['confidence'] = max(0, final_parts['confidence'] - 20)  # Reduce confidence if code was invalid
+        invalid_codes += 1
+    
+    if available_info_codes and final_parts['infoCode'] not in available_info_codes:
+        final_parts['infoCode'] = DEFAULT_INFO_CODE
+        final_parts['confidence'] = max(0, final_parts['confidence'] - 20)  # Reduce confidence if code was invalid
+        invalid_codes += 1
+    if prompt_stats is not None:
+        prompt_stats["invalid_codes"] = prompt_stats.get("invalid_codes", 0) + invalid_codes
+    
+    return final_parts
+
+
+# --- TWO-STAGE CLASSIFICATION ---
+
+# Both stages start with the same text so Ollama can reuse the evaluated document prefix in stage 2
+TWO_STAGE_PREFIX = """You are an expert in S1000D documentation standards. Analyze this technical document.
+
+DOCUMENT TITLE/HEADINGS (COMPLETE):
+{headings}
+
+DOCUMENT CONTENT (Full text - {body_chars} characters):
+{body}
+
+"""
+STAGE1_PROMPT = TWO_STAGE_PREFIX + """VALID SYSTEM CODES:
+{sns_context}
+
+VALID INFO CODES:{info_context}
+
+TASK: Select the system and the info code of this document (its subsystem is selected in a second step).
+- systemCode: 2-digit code for the main system (e.g., 20=Air Conditioning, 24=Electrical Power, 34=Navigation)
+- infoCode: 3-character code matching document type (e.g., 000=General, 040=Description, 520=Procedure, 720=Fault Isolation)
+- confidence: Your confidence level (0-100) in this selection based on the entire document
+- reasoning: Brief explanation of why you chose these codes
+
+Return ONLY this JSON (no other text):
+{{"systemCode": "XX", "infoCode": "XXX", "confidence": 85, "reasoning": "Brief explanation"}}"""
+STAGE1_PROMPT_LEAN = (STAGE1_PROMPT
+                      .replace("- reasoning: Brief explanation of why you chose these codes\n", "")
+                      .replace(', "reasoning": "Brief explanation"', ""))
+STAGE2_PROMPT = TWO_STAGE_PREFIX + """THE DOCUMENT BELONGS TO THIS SYSTEM. ITS SUBSYSTEMS:
+{sns_context}
+
+TASK: Select the subsystem (e.g., "10" for 24-10) that this document is about; use "00" if it covers the system in general.
+
+Return ONLY this JSON (no other text):
+{{"subsystem": "XX"}}"""
+STAGE2_OUTPUT_TOKENS = 30
+
+
+def classify_two_stage(headings_text, body_text, system_entries, info_entries, sns_data, available_sns_codes,
+                       available_info_codes, cancel_token=None, prompt_stats=None, lean=False):
+    """
+    Hierarchical alternative to generate_dmc_with_llm for large catalogues. Stage 1 sees only
+    system-level titles (system_entries) and the info codes and picks systemCode and infoCode;
+    stage 2 sees only the chosen system's subsystems and picks the subsystem. Same return
+    value and exceptions as generate_dmc_with_llm; stage 2's prompt report is under "stage2".
+    """
+    stats = {} if prompt_stats is None else prompt_stats
+    builder = PromptBuilder(STAGE1_PROMPT_LEAN if lean else STAGE1_PROMPT, CONTEXT_TOKENS,
+                            LEAN_OUTPUT_TOKENS if lean else CLASSIFY_OUTPUT_TOKENS)
+    prompt, report = builder.build(headings_text, body_text, system_entries, info_entries)
+    stats.update(report)
+    answer_format = "json"
+    if RESPONSE_FORMAT == "schema":
+        answer_format = dmc_parts_schema(available_sns_codes, available_info_codes, confidence=True, reasoning=not lean,
+                                         subsystems=False)
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "format": "json",
-            "options": {"temperature": 0.2, "num_predict": 300}
-        }
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=180)
-        response.raise_for_status()
-        
-        raw_response = response.json().get('response', '')
-        if not raw_response.strip():
+        answer = query_llm_json(prompt, answer_format, builder.output_tokens, report["num_ctx"], cancel_token, stats)
+        if answer is None:
             return None
-        
-        json_text = raw_response.strip()
-        if not json_text.endswith('}'):
-            last_brace = json_text.rfind('}')
-            if last_brace > 0:
-                json_text = json_text[:last_brace + 1]
-        
-        if not json_text.startswith('{'):
-            start = json_text.find('{')
-            if start >= 0:
-                json_text = json_text[start:]
-        
-        dmc_parts = json.loads(json_text)
-        
-        final_parts = {
-            'systemCode': str(dmc_parts.get('systemCode', DEFAULT_SYSTEM_CODE)),
-            'infoCode': str(dmc_parts.get('infoCode', DEFAULT_INFO_CODE)),
-            'subSystemCode': str(dmc_parts.get('subSystemCode', '0')),
-            'subSubSystemCode': str(dmc_parts.get('subSubSystemCode', '0')),
-            'disassyCode': str(dmc_parts.get('disassyCode', '00')),
-            'disassyCodeVariant': str(dmc_parts.get('disassyCodeVariant', 'A')),
-            'confidence': dmc_parts.get('confidence', 0),
-            'reasoning': dmc_parts.get('reasoning', '')
-        }
-        
-        if available_sns_codes and final_parts['systemCode'] not in available_sns_codes:
-            final_parts['systemCode'] = DEFAULT_SYSTEM_CODE
-            final_parts['confidence'] = max(0, final_parts['confidence'] - 20)  # Reduce confidence if code was invalid
-        
-        if available_info_codes and final_parts['infoCode'] not in available_info_codes:
-            final_parts['infoCode'] = DEFAULT_INFO_CODE
-            final_parts['confidence'] = max(0, final_parts['confidence'] - 20)  # Reduce confidence if code was invalid
-        
+        final_parts = validated_parts(answer, available_sns_codes, available_info_codes, stats)
+
+        subsystems = sorted(sns_data.get(final_parts['systemCode'], {}).get('subsystems', {}))
+        sub_code = '00'
+        if subsystems:
+            # The same headings and body excerpt as stage 1, so the prompts share their prefix
+            builder = PromptBuilder(STAGE2_PROMPT, CONTEXT_TOKENS, STAGE2_OUTPUT_TOKENS)
+            prompt, stats["stage2"] = builder.build(
+                headings_text[:report["headings_chars"]] if headings_text else headings_text,
+                body_text[:report["body_chars"]] if body_text else body_text,
+                subsystem_catalogue_entries(sns_data, final_parts['systemCode'], SNS_DEFINITION_CHARS), [])
+            answer = query_llm_json(prompt, choice_schema("subsystem", subsystems) if RESPONSE_FORMAT == "schema" else "json",
+                                    builder.output_tokens, stats["stage2"]["num_ctx"], cancel_token, stats)
+            chosen = str((answer or {}).get('subsystem', ''))
+            if chosen in subsystems:
+                sub_code = chosen
+            else:
+                stats["invalid_codes"] = stats.get("invalid_codes", 0) + 1
+        final_parts['subSystemCode'], final_parts['subSubSystemCode'] = sub_code[0], sub_code[1:2] or '0'
         return final_parts
+    except Cancelled:
+        raise
     except:
         return None
 
 
+def summarize_with_llm(prompt, cancel_token=None):
+    """Map step of map-reduce: a short free-text completion. Returns '' on failure so one bad chunk is skipped."""
+    payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "keep_alive": KEEP_ALIVE,
+               "options": {"temperature": 0.1, "num_predict": 100}}
+    try:
+        return ollama_generate(OLLAMA_API_URL, payload, timeout=180, cancel_token=cancel_token).get('response', '')
+    except Cancelled:
+        raise
+    except Exception:
+        return ''
+
+
 def generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes):
-    """Fallback mechanism when LLM fails."""
+    """Fallback mechanism when LLM fails. Takes the catalogue's compact records."""
     full_text_lower = (headings_text + " " + body_text).lower()
     
     CATEGORY_KEYWORDS = {
@@ -305,19 +451,19 @@ def generate_dmc_with_fallback(headings_text, body_text, sns_data, info_codes):
         if score > max_score:
             max_score, doc_category = score, category
     
-    filtered_info = {c: d for c, d in info_codes.items() if d.get('type') == doc_category} if doc_category else info_codes
+    filtered_info = {c: d for c, d in info_codes.items() if d.type == doc_category} if doc_category else info_codes
     if not filtered_info:
         filtered_info = info_codes
     
     info_scores = []
     for code, data in filtered_info.items():
-        score = sum(1 for kw in data.get('description', '').lower().split() if kw in full_text_lower)
+        score = sum(1 for kw in data.description_words if kw in full_text_lower)
         if score > 0:
             info_scores.append((score, code))
     
     sns_scores = []
     for code, data in sns_data.items():
-        score = sum(1 for kw in data.get('title', '').lower().split() if kw in full_text_lower)
+        score = sum(1 for kw in data.title_words if kw in full_text_lower)
         if score > 0:
             sns_scores.append((score, code))
     
@@ -342,6 +488,132 @@ def format_dmc(parts):
 
 # --- GUI APPLICATION ---
 
+class ResultsTable:
+    """
+    Virtualized results view: a ttk.Treeview that only ever holds the rows currently
+    on screen. Scrolling, sorting and filtering re-query the ResultStore for a list of
+    row indices and re-render the visible window, so 10k+ results stay instant.
+    """
+
+    COLUMNS = (
+        ('file', 'File', 220),
+        ('dmc', 'DMC', 260),
+        ('confidence', 'Conf.', 55),
+        ('total_ms', 'Timings (extract / LLM / save)', 200),
+        ('fallback', 'Fallback', 65),
+        ('reasoning', 'Reasoning', 300),
+    )
+
+    def __init__(self, parent, store, visible_rows=12):
+        self.store = store
+        self.visible_rows = visible_rows
+        self.offset = 0
+        self.view = []
+        self.view_version = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.dirty = True
+
+        toolbar = ttk.Frame(parent)
+        toolbar.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(toolbar, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add('write', lambda *args: self.refresh(reset_offset=True))
+        ttk.Entry(toolbar, textvariable=self.filter_var, width=40).pack(side=tk.LEFT, padx=(5, 10))
+        self.count_label = ttk.Label(toolbar, text="0 results")
+        self.count_label.pack(side=tk.LEFT)
+
+        table_frame = ttk.Frame(parent)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=[c[0] for c in self.COLUMNS], show='headings',
+                                 height=visible_rows, selectmode='browse')
+        for name, heading, width in self.COLUMNS:
+            self.tree.heading(name, text=heading, command=lambda n=name: self.sort_by(n))
+            self.tree.column(name, width=width, stretch=(name == 'reasoning'))
+        self.tree.tag_configure('failed', foreground='#f44336')
+        self.tree.tag_configure('fallback', foreground='#ffb74d')
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Scroll the table, not the surrounding canvas ("break" stops the bind_all handler)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+
+    def mark_dirty(self):
+        """Flags new results; the next refresh_if_dirty() on the Tk loop picks them up."""
+        self.dirty = True
+
+    def refresh_if_dirty(self):
+        if self.dirty:
+            self.refresh()
+
+    def refresh(self, reset_offset=False):
+        self.dirty = False
+        self.view_version = self.store.version
+        self.view = self.store.query(self.filter_var.get(), self.sort_column, self.sort_descending)
+        if reset_offset:
+            self.offset = 0
+        self.draw_rows()
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = column, False
+        for name, heading, _ in self.COLUMNS:
+            arrow = (' ▼' if self.sort_descending else ' ▲') if name == column else ''
+            self.tree.heading(name, text=heading + arrow)
+        self.refresh(reset_offset=True)
+
+    def render(self):
+        if self.view_version != self.store.version:
+            # The store changed (or was cleared for a new run) since the last query
+            self.refresh()
+        else:
+            self.draw_rows()
+
+    def draw_rows(self):
+        total = len(self.view)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        self.tree.delete(*self.tree.get_children())
+        for index in self.view[self.offset:self.offset + self.visible_rows]:
+            try:
+                row = self.store.row(index)
+            except IndexError:
+                # Cleared by the worker mid-render; the next drain re-queries
+                self.dirty = True
+                break
+            timings = f"{row['extract_ms']:.0f} / {row['llm_ms']:.0f} / {row['save_ms']:.0f} ms"
+            confidence = f"{row['confidence']}%" if row['confidence'] is not None else '-'
+            tags = ('failed',) if row['status'] != 'successful' else ('fallback',) if row['fallback'] else ()
+            self.tree.insert('', tk.END, values=(row['file'], row['dmc'] or row['status'], confidence,
+                                                 timings, 'yes' if row['fallback'] else '',
+                                                 row['reasoning'].replace('\n', ' ')), tags=tags)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total} of {len(self.store)} results")
+
+    def scroll_rows(self, delta):
+        self.offset += delta
+        self.render()
+        return "break"
+
+    def on_mousewheel(self, event):
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.offset = int(float(args[0]) * len(self.view))
+        elif action == 'scroll':
+            amount, unit = int(args[0]), args[1]
+            self.offset += amount * (self.visible_rows if unit == 'pages' else 1)
+        self.render()
+
+
 class DMCAutomationGUI:
     def __init__(self, root):
         self.root = root
@@ -364,15 +636,42 @@ class DMCAutomationGUI:
         # Data storage
         self.sns_data = {}
         self.info_codes = {}
+        # Parsed SNS/info code files and prompt entries, reused across Start clicks and sessions
+        self.catalogue_cache = CatalogueCache(parse_sns_json, parse_info_codes_json, parse_info_codes_txt,
+                                              os.path.join(LOGS_DIRECTORY, "cache", "catalogue"),
+                                              definition_chars=SNS_DEFINITION_CHARS)
+        # Extracted (headings, body) by document hash, independent of model and prompt (see dmc_cache.py)
+        self.text_cache = TextCache(os.path.join(LOGS_DIRECTORY, "cache", "text"))
+        # Keeps the selected files parsed while the window is open and reloads them when they change on disk
+        self.catalogue_manager = CatalogueManager(self.catalogue_cache, on_files_changed=self.sns_files_changed,
+                                                  on_reload=self.catalogue_reloaded)
         self.selected_sns_files = []
         self.available_sns_files = []
+        # Bumped per document listing so a slow scan finishing late does not overwrite a newer one
+        self.docs_scan_id = 0
         self.processing = False
+        self.cancel_token = None
         self.ollama_connected = False
+        # The model load started on connect; the next batch reuses it and the window releases it on close
+        self.model_warmup = None
+        self.results = ResultStore()
+        
+        # Worker threads never touch Tk directly: log lines and UI updates are queued
+        # here and applied by the main loop every LOG_POLL_MS
+        self.log_queue = queue.Queue()
+        self.ui_calls = queue.Queue()
+        self.pending_status = None
+        self.pending_progress = None
+        self.session_log_path = os.path.join(LOGS_DIRECTORY, f"gui_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
         
         self.setup_styles()
         self.create_widgets()
-        self.check_ollama_connection()
         self.load_available_files()
+        self.catalogue_manager.start()
+        # Connection check imports requests - let the first frame render before it starts
+        self.root.after_idle(self.check_ollama_connection)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(LOG_POLL_MS, self.drain_ui_queue)
     
     def setup_styles(self):
         style = ttk.Style()
@@ -390,6 +689,8 @@ class DMCAutomationGUI:
         style.configure('TEntry', font=('Consolas', 10))
         style.configure('Connected.TLabel', background='#2b2b2b', foreground='#4caf50', font=('Segoe UI', 10, 'bold'))
         style.configure('Disconnected.TLabel', background='#2b2b2b', foreground='#f44336', font=('Segoe UI', 10, 'bold'))
+        style.configure('Treeview', background='#3c3c3c', fieldbackground='#3c3c3c', foreground='#ffffff', font=('Consolas', 9))
+        style.configure('Treeview.Heading', font=('Segoe UI', 9, 'bold'))
     
     def create_widgets(self):
         # Create a canvas with scrollbar
@@ -516,6 +817,40 @@ class DMCAutomationGUI:
         self.data_entry.pack(side=tk.LEFT, padx=(5, 5), fill=tk.X, expand=True)
         ttk.Button(data_row, text="Browse...", style='Small.TButton', command=self.browse_data_folder).pack(side=tk.LEFT)
         
+        # Output mode (how renamed files are written)
+        mode_row = ttk.Frame(folders_frame)
+        mode_row.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(mode_row, text="Output Mode:", width=12).pack(side=tk.LEFT)
+        self.output_mode_var = tk.StringVar(value=OUTPUT_MODE)
+        ttk.Combobox(mode_row, textvariable=self.output_mode_var, values=OUTPUT_MODES,
+                     state='readonly', width=12).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(mode_row, text="auto = zero-copy clone on the same filesystem, copy otherwise",
+                  style='Path.TLabel').pack(side=tk.LEFT)
+        
+        # Map-reduce for documents longer than the prompt excerpt
+        self.map_reduce_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folders_frame, variable=self.map_reduce_var,
+                        text="Map-reduce long documents (summarize sections in parallel instead of reading only the excerpt that fits the prompt)"
+                        ).pack(anchor=tk.W, pady=(5, 0))
+        self.lean_output_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folders_frame, variable=self.lean_output_var,
+                        text="Lean output (no reasoning - fewer generated tokens, faster answers)"
+                        ).pack(anchor=tk.W)
+        self.two_stage_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folders_frame, variable=self.two_stage_var,
+                        text="Two-stage classification (system and info code first, then only that system's subsystems)"
+                        ).pack(anchor=tk.W)
+        # Input scanning (see dmc_scan.py)
+        self.recursive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folders_frame, variable=self.recursive_var, command=self.load_documents,
+                        text="Include subfolders of the input folder"
+                        ).pack(anchor=tk.W)
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(folders_frame, variable=self.incremental_var, command=self.load_documents,
+                        text="Only new or changed documents (skip those already processed successfully)"
+                        ).pack(anchor=tk.W)
+        
         # --- FILE SELECTION SECTION ---
         top_frame = ttk.Frame(main_frame)
         top_frame.pack(fill=tk.X, pady=(0, 10))
@@ -528,6 +863,7 @@ class DMCAutomationGUI:
                                        bg='#3c3c3c', fg='#ffffff', font=('Consolas', 10),
                                        selectbackground='#4fc3f7', selectforeground='#000000')
         self.sns_listbox.pack(fill=tk.BOTH, expand=True)
+        self.sns_listbox.bind('<<ListboxSelect>>', lambda e: self.sns_selection_changed())
         
         btn_frame = ttk.Frame(sns_frame)
         btn_frame.pack(fill=tk.X, pady=(10, 0))
@@ -556,6 +892,12 @@ class DMCAutomationGUI:
         self.progress = ttk.Progressbar(status_frame, mode='determinate')
         self.progress.pack(fill=tk.X, pady=(10, 0))
         
+        # Results section
+        results_frame = ttk.LabelFrame(main_frame, text="Results", padding=10)
+        results_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        
+        self.results_table = ResultsTable(results_frame, self.results)
+        
         # Log section
         log_frame = ttk.LabelFrame(main_frame, text="Processing Log", padding=10)
         log_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -572,6 +914,12 @@ class DMCAutomationGUI:
         self.start_btn = ttk.Button(button_frame, text="▶ Start Processing", command=self.start_processing)
         self.start_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.pause_btn = ttk.Button(button_frame, text="⏸ Pause", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.stop_btn = ttk.Button(button_frame, text="⏹ Stop", command=self.stop_processing, state=tk.DISABLED)
+        self.stop_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(button_frame, text="📂 Open Output Folder", command=self.open_output_folder).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="🗑 Clear Log", command=self.clear_log).pack(side=tk.LEFT)
         
@@ -584,41 +932,152 @@ class DMCAutomationGUI:
     
     def load_available_files(self):
         """Load available SNS files from data directory."""
-        self.sns_listbox.delete(0, tk.END)
-        self.available_sns_files = []
-        
         data_dir = self.data_directory
+        files = []
         if os.path.exists(data_dir):
-            for f in os.listdir(data_dir):
-                if f.endswith('.json') and f != 'info_codes.json':
-                    self.available_sns_files.append(f)
-                    self.sns_listbox.insert(tk.END, f"  {f}")
+            files = [f for f in os.listdir(data_dir) if f.endswith('.json') and f != 'info_codes.json']
+        self.show_sns_files(files)
         
         self.load_documents()
         self.log(f"Found {len(self.available_sns_files)} SNS files in '{data_dir}'")
     
+    def show_sns_files(self, files):
+        """Fills the SNS listbox with files, keeping the selection of files that are still there."""
+        selected = {self.available_sns_files[i] for i in self.sns_listbox.curselection()}
+        self.sns_listbox.delete(0, tk.END)
+        self.available_sns_files = list(files)
+        for i, f in enumerate(self.available_sns_files):
+            self.sns_listbox.insert(tk.END, f"  {f}")
+            if f in selected:
+                self.sns_listbox.select_set(i)
+        self.sns_selection_changed()
+    
+    def sns_selection_changed(self):
+        """Lets the catalogue manager load the selected files in the background."""
+        files = [self.available_sns_files[i] for i in self.sns_listbox.curselection()]
+        self.catalogue_manager.select(self.data_directory, files)
+    
+    def sns_files_changed(self, files):
+        """Called by the catalogue manager when SNS files are added to or removed from the data folder."""
+        self.log(f"SNS files changed in '{self.data_directory}' - {len(files)} files")
+        self.run_on_ui(self.show_sns_files, files)
+    
+    def catalogue_reloaded(self, catalogue):
+        """Called by the catalogue manager after the selected files were (re)loaded."""
+        read = [name for name, source in catalogue["sources"].items() if source != "memory"]
+        if read:
+            note = " - the running batch keeps the catalogue it started with" if self.processing else ""
+            self.log(f"Catalogue loaded: {len(catalogue['sns_data'])} systems, {len(catalogue['info_codes'])} info codes "
+                     f"(read {', '.join(read)}){note}")
+        self.run_on_ui(self.info_label.config, {'text': f"Info Codes: {len(catalogue['info_codes'])} | "
+                                                        f"SNS Systems: {len(catalogue['sns_data'])}"})
+    
     def load_documents(self):
-        """Load documents from input documents directory."""
+        """Load documents from input documents directory. The folder is scanned in the background."""
         self.docs_listbox.delete(0, tk.END)
+        self.docs_scan_id += 1
         
         docs_dir = self.docs_directory
         if os.path.exists(docs_dir):
-            docs = [f for f in os.listdir(docs_dir) if f.endswith('.docx')]
-            for doc in docs:
-                self.docs_listbox.insert(tk.END, f"  {doc}")
-            self.log(f"Found {len(docs)} documents in '{docs_dir}'")
+            # An incremental scan may hash every changed document, so it stays off the Tk thread
+            threading.Thread(target=self.scan_documents, daemon=True,
+                             args=(self.docs_scan_id, docs_dir, self.recursive_var.get(), self.incremental_var.get())).start()
+    
+    def scan_documents(self, scan_id, docs_dir, recursive, incremental):
+        """Runs on a background thread: lists the documents and hands them to show_documents."""
+        try:
+            if incremental:
+                # Only a preview: nothing is recorded until documents were processed
+                scanner = DocumentScanner(DEFAULT_SCAN_STATE_PATH, docs_dir, recursive)
+                docs = scanner.scan()
+                found = f"{len(docs)} new or changed documents ({scanner.summary()})"
+            else:
+                docs = list_documents(docs_dir, recursive)
+                found = f"{len(docs)} documents"
+        except OSError as e:
+            self.log(f"Cannot read '{docs_dir}': {e}")
+            return
+        self.run_on_ui(self.show_documents, scan_id, docs)
+        self.log(f"Found {found} in '{docs_dir}'")
+    
+    def show_documents(self, scan_id, docs):
+        if scan_id != self.docs_scan_id:
+            return
+        for doc in docs:
+            self.docs_listbox.insert(tk.END, f"  {doc}")
     
     def select_all_sns(self):
         self.sns_listbox.select_set(0, tk.END)
+        self.sns_selection_changed()
     
     def clear_sns_selection(self):
         self.sns_listbox.selection_clear(0, tk.END)
+        self.sns_selection_changed()
     
     def log(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """Queues a log line; safe to call from any thread."""
+        self.log_queue.put((datetime.now(), message))
+    
+    def run_on_ui(self, func, *args):
+        """Schedules func(*args) on the Tk main loop; safe to call from any thread."""
+        self.ui_calls.put((func, args))
+    
+    def drain_ui_queue(self):
+        """Applies queued UI updates and appends queued log lines in one batch."""
+        try:
+            self.apply_ui_updates()
+        except Exception as e:
+            # The log widget itself may be what failed, so this goes to the console log
+            logging.error(f"UI update failed: {e}")
+        finally:
+            # Always poll again, otherwise the window stops updating for the rest of the session
+            self.root.after(LOG_POLL_MS, self.drain_ui_queue)
+    
+    def apply_ui_updates(self):
+        while True:
+            try:
+                func, args = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                # One failed update must not stop the ones queued after it
+                logging.error(f"UI call {getattr(func, '__name__', func)} failed: {e}")
+        
+        # Status and progress only need their latest value
+        status, self.pending_status = self.pending_status, None
+        if status is not None:
+            self.status_label.config(text=status)
+        progress, self.pending_progress = self.pending_progress, None
+        if progress is not None:
+            value, maximum = progress
+            self.progress.configure(value=value, maximum=maximum)
+        
+        self.results_table.refresh_if_dirty()
+        
+        entries = []
+        try:
+            while True:
+                entries.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if entries:
+            widget_lines = [f"[{ts.strftime('%H:%M:%S')}] {message}\n" for ts, message in entries]
+            self.log_text.insert(tk.END, ''.join(widget_lines))
+            
+            # Keep only the last LOG_MAX_LINES lines in the widget
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete('1.0', f'{line_count - LOG_MAX_LINES + 1}.0')
+            self.log_text.see(tk.END)
+            
+            try:
+                with open(self.session_log_path, 'a', encoding='utf-8') as f:
+                    f.writelines(f"[{ts.strftime('%Y-%m-%d %H:%M:%S')}] {message}\n" for ts, message in entries)
+            except OSError:
+                pass
     
     def clear_log(self):
         self.log_text.delete(1.0, tk.END)
@@ -665,11 +1124,15 @@ class DMCAutomationGUI:
             self.load_available_files()
             self.log(f"Data folder changed to: {folder}")
     
+    def set_ollama_status(self, text, style):
+        self.ollama_status_label.config(text=text, style=style)
+    
     def check_ollama_connection(self):
         """Check if Ollama is running and accessible."""
         def check():
+            import requests
             try:
-                self.ollama_status_label.config(text="● Checking...", style='Disconnected.TLabel')
+                self.run_on_ui(self.set_ollama_status, "● Checking...", 'Disconnected.TLabel')
                 
                 # First try a simple GET to check if server is running
                 test_url = OLLAMA_API_URL.replace('/api/generate', '/api/tags')
@@ -677,33 +1140,44 @@ class DMCAutomationGUI:
                 
                 if response.status_code == 200:
                     self.ollama_connected = True
-                    self.ollama_status_label.config(text="● Connected", style='Connected.TLabel')
+                    self.run_on_ui(self.set_ollama_status, "● Connected", 'Connected.TLabel')
                     self.log(f"✓ Ollama connected (Model: {OLLAMA_MODEL})")
+                    # Load the model now so the first document does not wait for it
+                    self.current_model_warmup()
                 else:
                     self.ollama_connected = False
-                    self.ollama_status_label.config(text="● Disconnected", style='Disconnected.TLabel')
+                    self.run_on_ui(self.set_ollama_status, "● Disconnected", 'Disconnected.TLabel')
                     self.log(f"✗ Ollama returned status {response.status_code}")
             except requests.exceptions.Timeout:
                 self.ollama_connected = False
-                self.ollama_status_label.config(text="● Timeout", style='Disconnected.TLabel')
+                self.run_on_ui(self.set_ollama_status, "● Timeout", 'Disconnected.TLabel')
                 self.log("✗ Ollama connection timeout - server may be slow or unresponsive")
             except requests.exceptions.ConnectionError:
                 self.ollama_connected = False
-                self.ollama_status_label.config(text="● Not Running", style='Disconnected.TLabel')
+                self.run_on_ui(self.set_ollama_status, "● Not Running", 'Disconnected.TLabel')
                 self.log(f"✗ Cannot connect to Ollama at {OLLAMA_API_URL}")
             except Exception as e:
                 self.ollama_connected = False
-                self.ollama_status_label.config(text="● Error", style='Disconnected.TLabel')
+                self.run_on_ui(self.set_ollama_status, "● Error", 'Disconnected.TLabel')
                 self.log(f"✗ Ollama connection error: {e}")
         
         threading.Thread(target=check, daemon=True).start()
     
-    def format_dmc(self, parts):
-        """Format DMC using current GUI configuration values."""
-        model_ident = self.model_ident_var.get()
-        system_diff = self.system_diff_var.get()
-        assy_code = self.assy_code_var.get()
-        item_location = self.item_location_var.get()
+    def read_dmc_fields(self):
+        """The DMC configuration fields; read on the Tk thread and handed to format_dmc."""
+        return {
+            "model_ident": self.model_ident_var.get(),
+            "system_diff": self.system_diff_var.get(),
+            "assy_code": self.assy_code_var.get(),
+            "item_location": self.item_location_var.get(),
+        }
+    
+    def format_dmc(self, parts, fields):
+        """Format DMC using the GUI configuration values in fields (from read_dmc_fields)."""
+        model_ident = fields["model_ident"]
+        system_diff = fields["system_diff"]
+        assy_code = fields["assy_code"]
+        item_location = fields["item_location"]
         
         # Handle subsystem code properly
         sub_sys = str(parts.get("subSystemCode", "0"))
@@ -721,8 +1195,19 @@ class DMCAutomationGUI:
                 f'{parts.get("disassyCode", "00")}{parts.get("disassyCodeVariant", "A")}-{parts.get("infoCode", DEFAULT_INFO_CODE)}A-{item_location}')
     
     def update_status(self, message):
-        self.status_label.config(text=message)
-        self.root.update_idletasks()
+        """Sets the status line; safe to call from any thread."""
+        self.pending_status = message
+    
+    def update_progress(self, value, maximum):
+        """Sets the progress bar; safe to call from any thread."""
+        self.pending_progress = (value, maximum)
+    
+    def add_result(self, filename, dmc='', dmc_parts=None, timings=None, fallback=False, status='successful'):
+        """Records a document result for the results table; safe to call from the worker thread."""
+        dmc_parts = dmc_parts or {}
+        self.results.append(filename, dmc, dmc_parts.get('confidence'), dmc_parts.get('reasoning', ''),
+                            timings, fallback, status)
+        self.results_table.mark_dirty()
     
     def start_processing(self):
         if self.processing:
@@ -745,87 +1230,226 @@ class DMCAutomationGUI:
         
         self.selected_sns_files = [self.available_sns_files[i] for i in selected_indices]
         
+        # The worker thread never reads Tk variables, so the options are taken here, on the Tk thread
+        options = {
+            "output_mode": self.output_mode_var.get(),
+            "map_reduce": self.map_reduce_var.get(),
+            "lean": self.lean_output_var.get(),
+            "two_stage": self.two_stage_var.get(),
+            "recursive": self.recursive_var.get(),
+            "incremental": self.incremental_var.get(),
+            "dmc_fields": self.read_dmc_fields(),
+        }
+        
         # Start processing in a thread
         self.processing = True
+        self.cancel_token = CancelToken()
         self.start_btn.config(state=tk.DISABLED)
-        threading.Thread(target=self.process_documents, daemon=True).start()
+        self.pause_btn.config(state=tk.NORMAL, text="⏸ Pause")
+        self.stop_btn.config(state=tk.NORMAL)
+        threading.Thread(target=self.process_documents, args=(self.cancel_token, options), daemon=True).start()
+    
+    def toggle_pause(self):
+        """Pauses before the next LLM request (the one in flight finishes), or resumes."""
+        token = self.cancel_token
+        if not token or token.cancelled:
+            return
+        if token.paused:
+            token.resume()
+            self.pause_btn.config(text="⏸ Pause")
+            self.log("▶ Resumed")
+        else:
+            token.pause()
+            self.pause_btn.config(text="▶ Resume")
+            self.log("⏸ Paused - no new LLM requests will be sent until resumed")
+            self.update_status("Paused")
+    
+    def stop_processing(self):
+        """Stops the batch: aborts the in-flight LLM request and writes the log for the files done so far."""
+        token = self.cancel_token
+        if not token or token.cancelled:
+            return
+        token.cancel()
+        self.pause_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.log("⏹ Stopping...")
+        self.update_status("Stopping...")
+    
+    def extract_ahead(self, scheduler, prefetch, token):
+        """Producer thread: extracts documents in scheduler order into the bounded prefetch queue, ending with a None sentinel."""
+        for i, job in enumerate(iter(scheduler.take, None)):
+            if token.cancelled:
+                break
+            started = time.perf_counter()
+            # Text extracted in an earlier session (any model or prompt) comes from the text cache
+            try:
+                file_hash = hash_file(job.filepath)
+            except OSError:
+                file_hash = None
+            headings, body = self.text_cache.extract(job.filepath, extract_text_from_docx, file_hash)
+            item = (i, job, headings, body, file_hash, round((time.perf_counter() - started) * 1000, 1))
+            # Backpressure: block while the LLM stage is behind (or paused), but notice a stop
+            while not token.cancelled:
+                try:
+                    prefetch.put(item, timeout=0.2)
+                    break
+                except queue.Full:
+                    pass
+        while not token.cancelled:
+            try:
+                prefetch.put(None, timeout=0.2)
+                break
+            except queue.Full:
+                pass
+    
+    def next_prefetched(self, prefetch, token):
+        """Waits for the next extracted document, honouring pause and stop while waiting."""
+        while True:
+            try:
+                return prefetch.get(timeout=0.2)
+            except queue.Empty:
+                token.checkpoint()
+    
+    def current_model_warmup(self):
+        """
+        The warm-up pinning OLLAMA_MODEL: the one already started (on connect or by a batch) if it
+        is for the same model and did not fail, otherwise a new one.
+        """
+        warmup = self.model_warmup
+        if warmup is not None and warmup.model == OLLAMA_MODEL and warmup.url == OLLAMA_API_URL and \
+                (warmup.stats is None or warmup.succeeded):
+            return warmup
+        self.model_warmup = ModelWarmup(OLLAMA_API_URL, OLLAMA_MODEL, KEEP_ALIVE).start()
+        return self.model_warmup
     
-    def process_documents(self):
+    def on_close(self):
+        """Unpins a warmed-up model instead of leaving it loaded for KEEP_ALIVE after the window is gone."""
+        warmup, self.model_warmup = self.model_warmup, None
+        if warmup is not None and warmup.succeeded:
+            # Not a daemon thread: the window closes now and the process exits once the model is released
+            threading.Thread(target=release_model, args=(warmup.url, warmup.model)).start()
+        self.catalogue_manager.stop()
+        self.root.destroy()
+    
+    def wait_for_model(self, warmup, token):
+        """Waits for the model warm-up, honouring pause and stop while waiting. Returns its stats."""
+        while warmup.wait(timeout=0.2) is None:
+            token.checkpoint()
+        stats = warmup.stats
+        if 'load_ms' in stats:
+            self.log(f"✓ Model ready (load {stats['load_ms'] / 1000:.1f}s, kept loaded for {KEEP_ALIVE} between documents)")
+        else:
+            self.log(f"⚠ Model warm-up failed: {stats.get('error')}")
+        return stats
+
+    def process_documents(self, token, options):
+        """Runs the batch on a worker thread; options are the GUI settings taken by start_processing."""
+        log_writer = history = scanner = None
+        # Reuses the load started on connect, or loads the model while the catalogue is read and
+        # the first documents are extracted
+        warmup = self.current_model_warmup()
+        model_load = None
         try:
             # Get current folder paths
             data_dir = self.data_directory
             docs_dir = self.docs_directory
             output_dir = self.output_directory
+            output_mode = options["output_mode"]
+            map_reduce = options["map_reduce"]
+            lean = options["lean"]
+            two_stage = options["two_stage"]
+            recursive = options["recursive"]
+            incremental = options["incremental"]
             
             # Create output directory if it doesn't exist
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir)
             
-            # Load info codes
-            self.log("Loading info codes...")
+            # The catalogue snapshot for this batch; files edited while it runs take effect with the next batch
+            self.log("Loading info codes and SNS files...")
             self.update_status("Loading info codes...")
+            catalogue = self.catalogue_manager.snapshot(data_dir, self.selected_sns_files)
+            self.info_codes, self.sns_data = catalogue["info_codes"], catalogue["sns_data"]
+            sources = catalogue["sources"]
             
-            info_json = os.path.join(data_dir, "info_codes.json")
-            info_txt = os.path.join(data_dir, "info_codes.txt")
-            
-            if os.path.exists(info_json):
-                self.info_codes = parse_info_codes_json(info_json)
-                self.log(f"✓ Loaded {len(self.info_codes)} info codes from JSON")
-            elif os.path.exists(info_txt):
-                self.info_codes = parse_info_codes_txt(info_txt)
-                self.log(f"✓ Loaded {len(self.info_codes)} info codes from TXT")
+            if catalogue["info_codes_file"]:
+                name = os.path.basename(catalogue["info_codes_file"])
+                self.log(f"✓ Loaded {len(self.info_codes)} info codes from {name} ({sources[name]})")
             else:
                 self.log("✗ No info codes file found!")
-            
-            # Load SNS data
-            self.log("Loading SNS files...")
-            self.sns_data = {}
-            
-            for sns_file in self.selected_sns_files:
-                file_path = os.path.join(data_dir, sns_file)
-                file_data = parse_sns_json(file_path)
-                if file_data:
-                    self.sns_data.update(file_data)
-                    self.log(f"✓ Loaded {len(file_data)} systems from: {sns_file}")
+            for sns_file in catalogue["sns_files_loaded"]:
+                self.log(f"✓ Loaded {catalogue['system_counts'][sns_file]} systems from: {sns_file} ({sources[sns_file]})")
             
             self.log(f"Total: {len(self.sns_data)} systems, {len(self.info_codes)} info codes")
-            self.info_label.config(text=f"Info Codes: {len(self.info_codes)} | SNS Systems: {len(self.sns_data)}")
+            self.run_on_ui(self.info_label.config, {'text': f"Info Codes: {len(self.info_codes)} | SNS Systems: {len(self.sns_data)}"})
             
-            # Prepare context
-            sns_context, info_context = prepare_context_for_llm(self.sns_data, self.info_codes)
-            available_sns = set(self.sns_data.keys())
-            available_info = set(self.info_codes.keys())
+            # The catalogue entries the prompt builder picks from
+            sns_entries, system_entries = catalogue["sns_entries"], catalogue["system_entries"]
+            info_entries = catalogue["info_entries"]
+            available_sns = catalogue["available_sns_codes"]
+            available_info = catalogue["available_info_codes"]
             
-            # Get documents
-            docs = [f for f in os.listdir(docs_dir) if f.endswith('.docx')]
+            # Get documents; names are relative to the input folder ("sub/doc.docx" with subfolders)
+            if incremental:
+                scanner = DocumentScanner(DEFAULT_SCAN_STATE_PATH, docs_dir, recursive)
+                docs = scanner.scan()
+                self.log(f"Incremental scan: {scanner.summary()}")
+            else:
+                docs = list_documents(docs_dir, recursive)
             if not docs:
-                self.log("No documents found to process!")
+                self.log("No new or changed documents to process!" if incremental else "No documents found to process!")
                 return
             
-            self.progress['maximum'] = len(docs)
-            self.progress['value'] = 0
+            self.update_progress(0, len(docs))
+            
+            # Index existing outputs once instead of probing the folder per duplicate
+            output_index = OutputNameIndex(output_dir)
+            
+            # Log entries are streamed to disk as each document completes (see dmc_log.py)
+            os.makedirs(LOGS_DIRECTORY, exist_ok=True)
+            log_filename = os.path.join(LOGS_DIRECTORY, f"dmc_processing_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+            # ...and recorded in the run history so results can be looked up later (see dmc_history.py)
+            history = RunHistory(DEFAULT_HISTORY_PATH)
+            log_writer = StreamingLogWriter(log_filename, data_sources={
+                "sns_files": self.selected_sns_files,
+                "total_systems": len(self.sns_data),
+                "total_info_codes": len(self.info_codes)
+            }, history=history, run_settings={"model": OLLAMA_MODEL, "output_mode": output_mode})
+            
+            self.results.clear()
+            self.results_table.mark_dirty()
             
-            log_data = {
-                "data_sources": {
-                    "sns_files": self.selected_sns_files,
-                    "total_systems": len(self.sns_data),
-                    "total_info_codes": len(self.info_codes)
-                },
-                "successful": [],
-                "failed": []
-            }
+            # Extraction runs one step ahead in its own thread; the bounded queue keeps
+            # it from racing through the folder while the LLM stage is slow or paused
+            prefetch = queue.Queue(maxsize=EXTRACT_PREFETCH)
+            # Small documents first, explicit priorities (.priority sidecars) before that (see dmc_schedule.py)
+            scheduler = DocumentScheduler()
+            scheduler.add_all(sorted(docs), docs_dir)
+            threading.Thread(target=self.extract_ahead, args=(scheduler, prefetch, token), daemon=True).start()
+            processed_files = set()
             
             # Process each document
-            for i, filename in enumerate(docs):
+            while True:
+                try:
+                    token.checkpoint()
+                    item = self.next_prefetched(prefetch, token)
+                except Cancelled:
+                    break
+                if item is None:
+                    break
+                i, job, headings, body, file_hash, extract_ms = item
+                filename, filepath = job.filename, job.filepath
+                timings = {"queue_wait_ms": round(job.queue_wait * 1000), "extract_ms": extract_ms}
                 self.update_status(f"Processing {i+1}/{len(docs)}: {filename}")
                 self.log(f"\n--- Processing: {filename} ---")
                 
-                filepath = os.path.join(docs_dir, filename)
-                headings, body = extract_text_from_docx(filepath)
-                
                 if not headings and not body:
                     self.log(f"✗ Could not read file")
-                    log_data["failed"].append({"file": filename, "issue": "Could not read"})
+                    log_writer.write("failed", {"file": filename, "issue": "Could not read", "timings_ms": timings})
+                    self.add_result(filename, status="Could not read", timings=timings)
+                    processed_files.add(filename)
+                    scheduler.finish(job)
+                    self.update_progress(len(processed_files), len(docs))
                     continue
                 
                 # Show document statistics
@@ -834,31 +1458,61 @@ class DMCAutomationGUI:
                 self.log(f"📄 Document size: {headings_len} chars (headings) + {body_len} chars (body) = {headings_len + body_len} total")
                 
                 # Try LLM
-                self.log("Querying LLM with FULL document content...")
-                dmc_parts = generate_dmc_with_llm(headings, body, sns_context, info_context, available_sns, available_info)
+                map_stats, prompt_stats = None, {}
+                try:
+                    if model_load is None:
+                        model_load = self.wait_for_model(warmup, token)
+                    started = time.perf_counter()
+                    token.checkpoint()
+                    llm_body = body
+                    if map_reduce and needs_map_reduce(body, classification_prompt_builder(lean).body_limit_chars(headings)):
+                        self.log("Long document: summarizing sections (map-reduce)...")
+                        condensed, map_stats = condense_document(headings, body, lambda p: summarize_with_llm(p, token),
+                                                                 concurrency=MAP_CONCURRENCY)
+                        if condensed:
+                            llm_body = condensed
+                            self.log(f"  Summarized {map_stats['chunks_summarized']}/{map_stats['chunks_total']} sections "
+                                     f"in {map_stats['map_ms'] / 1000:.1f}s")
+                    self.log("Querying LLM with document content..." if llm_body is body else "Querying LLM with section summaries...")
+                    if two_stage:
+                        dmc_parts = classify_two_stage(headings, llm_body, system_entries, info_entries, self.sns_data,
+                                                       available_sns, available_info, cancel_token=token,
+                                                       prompt_stats=prompt_stats, lean=lean)
+                    else:
+                        dmc_parts = generate_dmc_with_llm(headings, llm_body, sns_entries, info_entries, available_sns, available_info,
+                                                          cancel_token=token, prompt_stats=prompt_stats, lean=lean)
+                    if prompt_stats:
+                        self.log(f"  Prompt: ~{prompt_stats['prompt_tokens']} tokens (body {prompt_stats['body_tokens']}, "
+                                 f"{prompt_stats['sns_systems']} systems, {prompt_stats['info_codes']} info codes), "
+                                 f"num_ctx {prompt_stats['num_ctx']}")
+                    if prompt_stats.get("stage2"):
+                        stage2 = prompt_stats["stage2"]
+                        self.log(f"  Stage 2: ~{stage2['prompt_tokens']} tokens ({stage2['sns_systems']} subsystem lines), "
+                                 f"num_ctx {stage2['num_ctx']}")
+                except Cancelled:
+                    self.log(f"⏹ Stopped before {filename} was classified")
+                    break
                 
-                if not dmc_parts:
+                used_fallback = not dmc_parts
+                if used_fallback:
                     self.log("LLM failed, using fallback...")
                     dmc_parts = generate_dmc_with_fallback(headings, body, self.sns_data, self.info_codes)
+                timings["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                if prompt_stats.get("load_ms"):
+                    timings["model_load_ms"] = prompt_stats["load_ms"]
                 
                 if dmc_parts:
-                    final_dmc = self.format_dmc(dmc_parts)
-                    new_filename = f"{final_dmc}.docx"
-                    output_path = os.path.join(output_dir, new_filename)
+                    started = time.perf_counter()
+                    final_dmc = self.format_dmc(dmc_parts, options["dmc_fields"])
                     
                     # Handle duplicate DMC codes by appending a counter
-                    if os.path.exists(output_path):
-                        counter = 1
-                        while True:
-                            new_filename = f"{final_dmc}__{counter:03d}.docx"
-                            output_path = os.path.join(output_dir, new_filename)
-                            if not os.path.exists(output_path):
-                                break
-                            counter += 1
+                    new_filename, output_path, counter = output_index.reserve(final_dmc, create=output_mode != 'manifest')
+                    if counter:
                         self.log(f"⚠ Duplicate DMC detected! Appending counter: __{counter:03d}")
                     
                     try:
-                        shutil.copy2(filepath, output_path)
+                        used_mode = materialize_output(filepath, output_path, output_mode)
+                        timings["save_ms"] = round((time.perf_counter() - started) * 1000, 1)
                         self.log(f"✓ Assigned: {final_dmc}")
                         self.log(f"  System: {dmc_parts['systemCode']}, SubSys: {dmc_parts['subSystemCode']}, Info: {dmc_parts['infoCode']}")
                         
@@ -871,56 +1525,103 @@ class DMCAutomationGUI:
                         if 'reasoning' in dmc_parts and dmc_parts['reasoning']:
                             self.log(f"  💡 Reasoning: {dmc_parts['reasoning']}")
                         
-                        self.log(f"  Saved as: {new_filename}")
-                        log_data["successful"].append({
+                        self.log(f"  Saved as: {new_filename} ({used_mode})")
+                        log_writer.write("successful", {
                             "file": filename,
+                            "source_path": os.path.abspath(filepath),
+                            "file_hash": file_hash,
                             "assigned_dmc": final_dmc,
                             "output_file": new_filename,
+                            "output_mode": used_mode,
+                            "fallback": used_fallback,
+                            "timings_ms": timings,
+                            "map_reduce": map_stats,
+                            "prompt": prompt_stats or None,
                             "dmc_parts": dmc_parts
                         })
+                        self.add_result(filename, final_dmc, dmc_parts, timings, used_fallback)
+                        if scanner:
+                            scanner.mark_done(filename, file_hash)
                     except Exception as e:
+                        output_index.release(output_path)
                         self.log(f"✗ Failed to save: {e}")
-                        log_data["failed"].append({"file": filename, "issue": str(e)})
+                        log_writer.write("failed", {"file": filename, "issue": str(e), "timings_ms": timings})
+                        self.add_result(filename, final_dmc, dmc_parts, timings, used_fallback, status="Save failed")
                 else:
                     self.log(f"✗ Could not determine DMC")
-                    log_data["failed"].append({"file": filename, "issue": "Failed to determine DMC"})
+                    log_writer.write("failed", {"file": filename, "issue": "Failed to determine DMC", "timings_ms": timings})
+                    self.add_result(filename, status="No DMC", timings=timings)
                 
-                self.progress['value'] = i + 1
+                processed_files.add(filename)
+                scheduler.finish(job)
+                self.update_progress(len(processed_files), len(docs))
             
-            # Save log
-            log_filename = os.path.join(LOGS_DIRECTORY, f"dmc_processing_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-            with open(log_filename, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=4)
+            # A stopped run still closes its log, listing the files it never got to
+            not_processed = [f for f in docs if f not in processed_files] if token.cancelled else []
+            schedule_report = scheduler.report()
+            model_load = model_load or warmup.stats
+            if token.cancelled:
+                log_writer.close(schedule=schedule_report, model_load=model_load, cancelled=True, not_processed=not_processed)
+            else:
+                log_writer.close(schedule=schedule_report, model_load=model_load)
+            successful, failed = log_writer.counts['successful'], log_writer.counts['failed']
             
             # Summary
             self.log(f"\n{'='*50}")
-            self.log(f"PROCESSING COMPLETE")
-            self.log(f"  Successful: {len(log_data['successful'])} files")
-            self.log(f"  Failed: {len(log_data['failed'])} files")
+            self.log(f"PROCESSING {'STOPPED' if token.cancelled else 'COMPLETE'}")
+            self.log(f"  Successful: {successful} files")
+            self.log(f"  Failed: {failed} files")
+            if model_load and 'load_ms' in model_load:
+                self.log(f"  Model load: {model_load['load_ms'] / 1000:.1f}s (before the first document)")
+            if schedule_report:
+                self.log(f"  Median queue wait: {schedule_report['median_queue_wait_s']}s, "
+                         f"median turnaround: {schedule_report['median_turnaround_s']}s")
             self.log(f"  Log saved: {log_filename}")
             self.log(f"{'='*50}")
             
-            self.update_status(f"Complete! {len(log_data['successful'])} successful, {len(log_data['failed'])} failed")
+            if token.cancelled:
+                self.log(f"  Not processed: {len(not_processed)} files")
+                self.update_status(f"Stopped. {successful} successful, {failed} failed, "
+                                   f"{len(not_processed)} not processed")
+                return
+            
+            self.update_status(f"Complete! {successful} successful, {failed} failed")
             
-            messagebox.showinfo("Complete", 
+            self.run_on_ui(messagebox.showinfo, "Complete", 
                 f"Processing complete!\n\n"
-                f"Successful: {len(log_data['successful'])}\n"
-                f"Failed: {len(log_data['failed'])}\n\n"
+                f"Successful: {successful}\n"
+                f"Failed: {failed}\n\n"
                 f"Output folder: {os.path.abspath(OUTPUT_DIRECTORY)}")
             
         except Exception as e:
             self.log(f"ERROR: {e}")
             self.update_status(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
+            self.run_on_ui(messagebox.showerror, "Error", str(e))
         
         finally:
+            if log_writer and not log_writer.closed:
+                log_writer.close(error=True)
+            if history:
+                history.close()
+            if scanner:
+                # Failed and unprocessed documents stay unrecorded and are found again next time
+                scanner.save()
+            if warmup.succeeded:
+                release_model(OLLAMA_API_URL, OLLAMA_MODEL)
+            if self.model_warmup is warmup:
+                # Released - the next batch pins the model again
+                self.model_warmup = None
+            token.cancel()  # releases the extraction thread if it is still waiting
             self.processing = False
-            self.start_btn.config(state=tk.NORMAL)
+            self.run_on_ui(self.start_btn.config, {'state': tk.NORMAL})
+            self.run_on_ui(self.pause_btn.config, {'state': tk.DISABLED, 'text': "⏸ Pause"})
+            self.run_on_ui(self.stop_btn.config, {'state': tk.DISABLED})
 
 
 def main():
     root = tk.Tk()
     app = DMCAutomationGUI(root)
+    root.after_idle(warm_up_imports)
     root.mainloop()
 
 
@@ -0,0 +1,70 @@
+# -*- mode: python ; coding: utf-8 -*-
+#
+# Onedir build profile: produces dist/DMC_Automation_Tool/ with the executable next to
+# its libraries instead of a single self-extracting exe. The onefile build unpacks the
+# whole bundle to a temp folder on every launch; this one starts straight away.
+# UPX is disabled because decompressing the DLLs at load time also slows startup.
+
+block_cipher = None
+
+a = Analysis(
+    ['DMC_Auto_GUI.py'],
+    pathex=[],
+    binaries=[],
+    datas=[
+        ('Lake', 'Lake'),  # Include the Lake directory with SNS data
+    ],
+    hiddenimports=[
+        'tkinter',
+        'tkinter.ttk',
+        'tkinter.scrolledtext',
+        'tkinter.filedialog',
+        'tkinter.messagebox',
+        'bs4',
+        'docx',
+        'requests',
+        'lxml',
+        'lxml.etree',
+        'lxml._elementpath',
+    ],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='DMC_Automation_Tool',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,  # Set to False for GUI application (no console window)
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=None,  # Add icon path here if you have one (e.g., 'icon.ico')
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='DMC_Automation_Tool',
+)
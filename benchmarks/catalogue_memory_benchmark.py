@@ -0,0 +1,159 @@
+"""
+Catalogue memory and iteration benchmark.
+
+Loads SNS files and the info codes twice - as the parsers' plain dicts (before) and as the
+catalogue's compact records (after) - and reports:
+  - memory   deep size of sns_data and info_codes, per process and for --workers processes
+  - iterate  one pass over every system, subsystem and info code reading their fields
+  - fallback the keyword fallback matcher over --documents synthetic documents built from
+             catalogue titles, dict-based scoring (before) against the record-based matcher
+             (after); both must pick the same codes
+
+Usage: python benchmarks/catalogue_memory_benchmark.py [--data-dir Lake] [--sns FILE ...] [--workers 8]
+Run from the repository root. No Ollama needed.
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import DMC_Auto as cli  # noqa: E402
+from dmc_catalogue import compact_info_codes, compact_sns_data  # noqa: E402
+
+# The CLI fallback's document categories
+CATEGORY_KEYWORDS = {
+    'proced': ['procedure', 'step', 'task', 'perform', 'install', 'remove', 'assemble', 'disassemble', 'prepare', 'unpack', 'setup', 'execute', 'how to'],
+    'descript': ['description', 'overview', 'introduction', 'component', 'feature', 'specification', 'what is', 'theory'],
+    'fault': ['fault', 'troubleshooting', 'symptom', 'remedy', 'isolation', 'failure', 'error code', 'diagnose'],
+}
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by obj and everything it references, counting shared objects once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(obj, name):
+                    size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def iterate_dicts(sns_data, info_codes):
+    chars = 0
+    for data in sns_data.values():
+        chars += len(data['title']) + len(data['definition'])
+        for sub in data['subsystems'].values():
+            chars += len(sub['title'])
+    for data in info_codes.values():
+        chars += len(data['description'])
+    return chars
+
+
+def iterate_records(sns_data, info_codes):
+    chars = 0
+    for data in sns_data.values():
+        chars += len(data.title) + len(data.definition)
+        for sub in data.subsystems.values():
+            chars += len(sub.title)
+    for data in info_codes.values():
+        chars += len(data.description)
+    return chars
+
+
+def dict_fallback(headings_text, body_text, sns_data, info_codes):
+    """The fallback's scoring as it was on plain dicts: titles split and text lowercased per system."""
+    full_text_lower = (headings_text + " " + body_text).lower()
+    doc_category, max_category_score = None, 0
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        score = sum(1 for keyword in keywords if keyword in full_text_lower)
+        if score > max_category_score:
+            max_category_score, doc_category = score, category
+    filtered = {c: d for c, d in info_codes.items() if d['type'] == doc_category} if doc_category else info_codes
+    filtered = filtered or info_codes
+    info_scores = [(sum(1 for k in d['description'].lower().split() if k in full_text_lower), c) for c, d in filtered.items()]
+    sns_scores = []
+    for code, data in sns_data.items():
+        score = sum(10 for keyword in data['title'].lower().split() if keyword in headings_text.lower())
+        score += sum(1 for keyword in data['title'].lower().split() if keyword in body_text.lower())
+        sns_scores.append((score, code))
+    best_sns = max((s for s in sns_scores if s[0] > 0), key=lambda s: s[0], default=(0, cli.DEFAULT_SYSTEM_CODE))[1]
+    best_info = max((s for s in info_scores if s[0] > 0), key=lambda s: s[0], default=(0, cli.DEFAULT_INFO_CODE))[1]
+    return best_sns, best_info
+
+
+def synthetic_documents(sns_data, info_codes, count, seed=7):
+    rng = random.Random(seed)
+    systems, infos = list(sns_data.values()), list(info_codes.values())
+    documents = []
+    for _ in range(count):
+        system, info = rng.choice(systems), rng.choice(infos)
+        subsystems = list(system['subsystems'].values()) or [system]
+        body = ' '.join([info['description'], system['definition'] or ''] +
+                        [rng.choice(subsystems)['title'] for _ in range(20)]) * 20
+        documents.append((system['title'], body))
+    return documents
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=cli.DATA_DIRECTORY, help="SNS and info code files")
+    parser.add_argument("--sns", action="append", metavar="FILE", help="SNS JSON file in the data dir (default: all)")
+    parser.add_argument("--workers", type=int, default=8, help="processes that each hold a copy of the catalogue")
+    parser.add_argument("--documents", type=int, default=50, help="synthetic documents for the fallback matcher")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    sns_files = args.sns or sorted(f for f in os.listdir(args.data_dir) if f.endswith('.json') and f != 'info_codes.json')
+    sns_data = {}
+    for sns_file in sns_files:
+        sns_data.update(cli.parse_sns_json(os.path.join(args.data_dir, sns_file)) or {})
+    info_codes = cli.parse_info_codes_json(os.path.join(args.data_dir, "info_codes.json"))
+    compact_sns, compact_info = compact_sns_data(sns_data), compact_info_codes(info_codes)
+    assert compact_sns == sns_data and compact_info == info_codes
+
+    subsystems = sum(len(d['subsystems']) for d in sns_data.values())
+    print(f"{len(sns_data)} systems, {subsystems} subsystems, {len(info_codes)} info codes\n")
+
+    before = deep_size(sns_data) + deep_size(info_codes)
+    after = deep_size(compact_sns) + deep_size(compact_info)
+    print(f"{'':<20}{'before':>12}{'after':>12}{'change':>9}")
+    print(f"{'memory KiB':<20}{before / 1024:12.0f}{after / 1024:12.0f}{(after - before) / before:+9.0%}")
+    print(f"{f'x {args.workers} workers KiB':<20}{before * args.workers / 1024:12.0f}{after * args.workers / 1024:12.0f}")
+
+    iterate_before = timed(lambda: iterate_dicts(sns_data, info_codes), 200)
+    iterate_after = timed(lambda: iterate_records(compact_sns, compact_info), 200)
+    print(f"{'iterate ms':<20}{iterate_before:12.3f}{iterate_after:12.3f}{(iterate_after - iterate_before) / iterate_before:+9.0%}")
+
+    documents = synthetic_documents(sns_data, info_codes, args.documents)
+    for headings, body in documents:
+        parts = cli.generate_dmc_with_fallback(headings, body, compact_sns, compact_info)
+        assert dict_fallback(headings, body, sns_data, info_codes) == (parts['systemCode'], parts['infoCode'])
+    fallback_before = timed(lambda: [dict_fallback(h, b, sns_data, info_codes) for h, b in documents], 3) / len(documents)
+    fallback_after = timed(lambda: [cli.generate_dmc_with_fallback(h, b, compact_sns, compact_info) for h, b in documents],
+                           3) / len(documents)
+    print(f"{'fallback ms/doc':<20}{fallback_before:12.3f}{fallback_after:12.3f}{(fallback_after - fallback_before) / fallback_before:+9.0%}")
+
+
+if __name__ == "__main__":
+    main()
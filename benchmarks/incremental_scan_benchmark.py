@@ -0,0 +1,93 @@
+"""
+Input scanning benchmark on a synthetic tree of small .docx stand-ins.
+
+Creates --files files spread over --folders subfolders and times
+  - full         listing the tree and hashing every document, as a run that reprocesses
+                 everything does before classifying
+  - first        the incremental scanner's first scan (all new) plus recording every document
+  - unchanged    an incremental rerun over the unchanged tree
+  - touched      a rerun after --touched documents had their mtime changed (same bytes)
+  - edited       a rerun after --touched documents had their contents changed
+
+Usage: python benchmarks/incremental_scan_benchmark.py [--files 50000] [--folders 200] [--touched 100]
+Run from the repository root. No Ollama needed; needs a few hundred MB of temporary disk space
+for the default tree.
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from dmc_cache import hash_file  # noqa: E402
+from dmc_scan import DocumentScanner, list_documents  # noqa: E402
+
+
+def build_tree(root, files, folders, size=4096):
+    names = []
+    for i in range(files):
+        folder = os.path.join(root, f"folder_{i % folders:04d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"doc_{i:06d}.docx"), 'wb') as f:
+            f.write(i.to_bytes(8, 'little') * (size // 8))
+        names.append(f"folder_{i % folders:04d}/doc_{i:06d}.docx")
+    return names
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def rescan(state_path, root):
+    scanner = DocumentScanner(state_path, root, recursive=True)
+    pending = scanner.scan()
+    for name in pending:
+        scanner.mark_done(name)
+    scanner.save()
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50000, help="documents in the synthetic tree")
+    parser.add_argument("--folders", type=int, default=200, help="subfolders they are spread over")
+    parser.add_argument("--touched", type=int, default=100, help="documents touched or edited between reruns")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.join(temp_dir, "in")
+        state_path = os.path.join(temp_dir, "scan_state.json")
+        names = build_tree(root, args.files, args.folders)
+        changed = names[::max(1, len(names) // args.touched)][:args.touched]
+        print(f"{len(names)} documents in {args.folders} folders, {len(changed)} touched/edited per rerun\n")
+        print(f"{'scan':<12}{'ms':>10}{'pending':>10}")
+
+        ms, listed = timed(lambda: [hash_file(os.path.join(root, name)) for name in list_documents(root, recursive=True)])
+        print(f"{'full':<12}{ms:10.0f}{len(listed):10}")
+        ms, pending = timed(lambda: rescan(state_path, root))
+        print(f"{'first':<12}{ms:10.0f}{len(pending):10}")
+        ms, pending = timed(lambda: rescan(state_path, root))
+        print(f"{'unchanged':<12}{ms:10.0f}{len(pending):10}")
+
+        for name in changed:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        ms, pending = timed(lambda: rescan(state_path, root))
+        print(f"{'touched':<12}{ms:10.0f}{len(pending):10}")
+
+        for name in changed:
+            with open(os.path.join(root, name), 'ab') as f:
+                f.write(b'edit')
+        ms, pending = timed(lambda: rescan(state_path, root))
+        print(f"{'edited':<12}{ms:10.0f}{len(pending):10}")
+        assert sorted(pending) == sorted(changed)
+
+
+if __name__ == "__main__":
+    main()
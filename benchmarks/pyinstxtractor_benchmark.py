@@ -0,0 +1,146 @@
+"""
+pyinstxtractor benchmark on a synthetic PyInstaller archive.
+
+Builds an executable-like file: a stub, a CArchive of --binaries zlib-compressed binaries of
+--binary-kb KiB (half of them in nested folders), a few bare modules, and a PYZ of --modules
+compressed modules, followed by the PyInstaller 2.1+ cookie. The archive is extracted with --workers 1 (serial) and with each other
+worker count given. Reported per run: wall time, MiB/s of uncompressed data, and whether the
+extracted tree matches the serial one byte for byte.
+
+Usage: python benchmarks/pyinstxtractor_benchmark.py [--binaries 200] [--binary-kb 1024] [--modules 3000] [--workers 1 4 8]
+Run from the repository root.
+"""
+import os
+import sys
+import zlib
+import struct
+import random
+import marshal
+import hashlib
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+import io
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pyinstxtractor  # noqa: E402
+
+PYC_MAGIC = importlib.util.MAGIC_NUMBER
+STUB_BYTES = 4 * 1024 * 1024
+
+
+def compressible(rng, size):
+    """Text-like bytes that zlib compresses about 3:1, like the binaries in a real bundle."""
+    words = [bytes(rng.choice(b'abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 9))) for _ in range(4000)]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words) + b' '
+    return bytes(out[:size])
+
+
+def build_pyz(rng, modules):
+    code = marshal.dumps(compile("VALUE = 1\n" * 200, "<synthetic>", "exec"))
+    blobs, toc = bytearray(), []
+    offset = 12
+    for i in range(modules):
+        data = zlib.compress(code + compressible(rng, 16 * 1024))
+        name = f"pkg{i % 50}.module_{i}"
+        toc.append((name, (0, offset + len(blobs), len(data))))
+        blobs += data
+    toc_position = 12 + len(blobs)
+    return b'PYZ\0' + PYC_MAGIC + struct.pack('!i', toc_position) + bytes(blobs) + marshal.dumps(toc)
+
+
+def build_archive(path, binaries, binary_kb, modules, seed=3):
+    rng = random.Random(seed)
+    entries = []  # (name, type, raw data, compress)
+    for i in range(binaries):
+        # Half of the binaries go into nested folders named with Windows separators, which only
+        # the writer turns into directories, so parallel writes into each new folder are covered
+        name = f"lib/binary_{i:04d}.so" if i % 2 else f"lib\\plugins\\group_{i // 4}\\binary_{i:04d}.so"
+        entries.append((name, b'b', compressible(rng, binary_kb * 1024), True))
+    for i in range(5):
+        entries.append((f"module_{i}", b'm', marshal.dumps(compile(f"X = {i}\n", "<m>", "exec")), True))
+    entries.append(("main", b's', marshal.dumps(compile("print('hi')\n", "<s>", "exec")), True))
+    entries.append(("PYZ-00.pyz", b'z', build_pyz(rng, modules), False))
+
+    package, toc = bytearray(), bytearray()
+    uncompressed = 0
+    for name, kind, data, compress in entries:
+        stored = zlib.compress(data) if compress else data
+        uncompressed += len(data)
+        name_bytes = name.encode('utf-8') + b'\0'
+        name_bytes += b'\0' * (-(18 + len(name_bytes)) % 16)
+        toc += struct.pack('!iIIIBc', 18 + len(name_bytes), len(package), len(stored), len(data), int(compress), kind) + name_bytes
+        package += stored
+    toc_offset = len(package)
+    package += toc
+    cookie_size = pyinstxtractor.PyInstArchive.PYINST21_COOKIE_SIZE
+    pyver = sys.version_info.major * 100 + sys.version_info.minor
+    cookie = struct.pack('!8sIIii64s', pyinstxtractor.PyInstArchive.MAGIC, len(package) + cookie_size,
+                         toc_offset, len(toc), pyver, b'python%d%d.dll' % sys.version_info[:2])
+    with open(path, 'wb') as f:
+        f.write(b'\x90' * STUB_BYTES)
+        f.write(package)
+        f.write(cookie)
+    return uncompressed
+
+
+def extract(archive_path, workers, work_dir):
+    os.makedirs(work_dir)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        arch = pyinstxtractor.PyInstArchive(archive_path, workers=workers)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert arch.open() and arch.checkFile() and arch.getCArchiveInfo()
+            arch.parseTOC()
+            arch.extractFiles()
+            arch.close()
+        return time.perf_counter() - started
+    finally:
+        os.chdir(cwd)
+
+
+def tree_digest(root):
+    digest = hashlib.sha256()
+    for folder, dirs, files in sorted(os.walk(root)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            digest.update(os.path.relpath(path, root).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--binaries", type=int, default=200, help="compressed binaries in the CArchive")
+    parser.add_argument("--binary-kb", type=int, default=1024, help="uncompressed size of each binary")
+    parser.add_argument("--modules", type=int, default=3000, help="modules in the PYZ")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="thread pool sizes to run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive_path = os.path.join(temp_dir, "synthetic.exe")
+        uncompressed = build_archive(archive_path, args.binaries, args.binary_kb, args.modules)
+        print(f"archive {os.path.getsize(archive_path) / 2**20:.0f} MiB, {uncompressed / 2**20:.0f} MiB uncompressed, "
+              f"{args.binaries} binaries, {args.modules} PYZ modules\n")
+        print(f"{'workers':>8}{'seconds':>10}{'MiB/s':>9}{'same as serial':>16}")
+        reference = None
+        for workers in [1] + [w for w in args.workers if w != 1]:
+            work_dir = os.path.join(temp_dir, f"run_{workers}")
+            seconds = extract(archive_path, workers, work_dir)
+            digest = tree_digest(work_dir)
+            reference = reference or digest
+            print(f"{workers:>8}{seconds:10.2f}{uncompressed / 2**20 / seconds:9.0f}{str(digest == reference):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Response format benchmark for the GUI classification prompt.
+
+Classifies the same documents with each answer format against a running Ollama:
+  - json          "format": "json" plus repair/validation (previous behaviour)
+  - schema        JSON Schema with the loaded system/info codes as enums
+  - schema-lean   the schema without the reasoning field (lean mode)
+
+and reports, per format: failed answers (unparseable or empty - these fall through to the
+keyword fallback), codes replaced because they were not in the loaded data, generated
+tokens (eval_count), generation time and wall-clock time per document.
+
+Usage: python benchmarks/response_format_benchmark.py --input-dir DOCS [--sns FILE ...] [--limit 20]
+Run from the repository root. Needs Ollama with the GUI's configured model (0.5+ for the schema formats).
+"""
+import os
+import sys
+import argparse
+import statistics
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import DMC_Auto_GUI as gui  # noqa: E402
+from dmc_prompt import info_catalogue_entries, sns_catalogue_entries  # noqa: E402
+
+FORMATS = [("json", "json", False), ("schema", "schema", False), ("schema-lean", "schema", True)]
+
+
+def load_catalogue(data_dir, sns_files):
+    info_json = os.path.join(data_dir, "info_codes.json")
+    info_codes = gui.parse_info_codes_json(info_json) if os.path.exists(info_json) else \
+        gui.parse_info_codes_txt(os.path.join(data_dir, "info_codes.txt"))
+    sns_data = {}
+    for sns_file in sns_files:
+        sns_data.update(gui.parse_sns_json(os.path.join(data_dir, sns_file)) or {})
+    return sns_data, info_codes
+
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return statistics.mean(values) if values else None
+
+
+def fmt(value, unit=""):
+    return f"{value:8.1f}{unit}" if value is not None else "     n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input-dir", required=True, help="folder of .docx documents")
+    parser.add_argument("--data-dir", default=gui.DATA_DIRECTORY, help="SNS and info code files")
+    parser.add_argument("--sns", action="append", metavar="FILE", help="SNS JSON file in the data dir (default: all)")
+    parser.add_argument("--limit", type=int, default=20, help="documents to classify per format")
+    args = parser.parse_args()
+
+    sns_files = args.sns or sorted(f for f in os.listdir(args.data_dir) if f.endswith('.json') and f != 'info_codes.json')
+    sns_data, info_codes = load_catalogue(args.data_dir, sns_files)
+    sns_entries = sns_catalogue_entries(sns_data, gui.SNS_DEFINITION_CHARS)
+    info_entries = info_catalogue_entries(info_codes)
+    available_sns, available_info = set(sns_data), set(info_codes)
+
+    documents = []
+    for filename in sorted(f for f in os.listdir(args.input_dir) if f.endswith('.docx'))[:args.limit]:
+        headings, body = gui.extract_text_from_docx(os.path.join(args.input_dir, filename))
+        if headings or body:
+            documents.append((headings, body))
+    print(f"{len(documents)} documents, {len(sns_data)} systems, {len(info_codes)} info codes, model {gui.OLLAMA_MODEL}\n")
+
+    # Load the model first so the first format is not charged for it
+    gui.ModelWarmup(gui.OLLAMA_API_URL, gui.OLLAMA_MODEL, gui.KEEP_ALIVE).start().wait()
+
+    print(f"{'format':<13}{'failed':>8}{'invalid':>9}{'tokens':>9}{'gen ms':>9}{'wall ms':>9}")
+    for name, response_format, lean in FORMATS:
+        gui.RESPONSE_FORMAT = response_format
+        failed = invalid = 0
+        tokens, eval_ms, wall_ms = [], [], []
+        for headings, body in documents:
+            stats = {}
+            started = time.perf_counter()
+            parts = gui.generate_dmc_with_llm(headings, body, sns_entries, info_entries, available_sns, available_info,
+                                              prompt_stats=stats, lean=lean)
+            wall_ms.append((time.perf_counter() - started) * 1000)
+            failed += parts is None
+            invalid += stats.get("invalid_codes", 0)
+            tokens.append(stats.get("eval_count"))
+            eval_ms.append(stats.get("eval_ms"))
+        print(f"{name:<13}{failed:>8}{invalid:>9}{fmt(mean(tokens))}{fmt(mean(eval_ms))}{fmt(mean(wall_ms))}")
+
+
+if __name__ == "__main__":
+    main()
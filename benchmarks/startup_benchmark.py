@@ -0,0 +1,103 @@
+"""
+Startup benchmark for the DMC tools.
+
+Measures, each in a fresh interpreter:
+  - import time per module (python -X importtime, cumulative)
+  - time to first frame of the GUI, with heavy modules imported lazily (current
+    behaviour) and eagerly before the window is built (previous behaviour)
+
+Usage: python benchmarks/startup_benchmark.py [--repeat 5]
+Run from the repository root. The first-frame test needs a display (use xvfb-run on a headless box).
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["tkinter", "dmc_output", "dmc_cache", "requests", "docx", "bs4", "lxml.etree", "DMC_Auto", "DMC_Auto_GUI"]
+
+FIRST_FRAME_SCRIPT = """
+import sys
+if {eager}:
+    import docx, requests
+import tkinter as tk
+import DMC_Auto_GUI
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("NO_DISPLAY", flush=True)
+    sys.exit(0)
+app = DMC_Auto_GUI.DMCAutomationGUI(root)
+def first_frame():
+    root.update_idletasks()
+    print("FIRST_FRAME", flush=True)
+    root.destroy()
+root.after(0, first_frame)
+root.mainloop()
+"""
+
+
+def import_time_ms(module):
+    """Cumulative import time of a module in a fresh interpreter, in milliseconds."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.splitlines()):
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000.0
+    return None
+
+
+def first_frame_ms(eager):
+    """Wall time from process launch until the GUI's first frame is drawn, in milliseconds."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", FIRST_FRAME_SCRIPT.format(eager=eager)],
+                            cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in proc.stdout:
+        if line.startswith("FIRST_FRAME"):
+            elapsed = (time.perf_counter() - start) * 1000
+            proc.wait()
+            return elapsed
+        if line.startswith("NO_DISPLAY"):
+            break
+    proc.wait()
+    return None
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def fmt(value):
+    return f"{value:9.1f} ms" if value is not None else "      n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (median is reported)")
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]} - median of {args.repeat} run(s)\n")
+    print("IMPORT TIME (cumulative, fresh interpreter)")
+    for module in MODULES:
+        print(f"  {module:<16}{fmt(median(import_time_ms(module) for _ in range(args.repeat)))}")
+
+    print("\nTIME TO FIRST FRAME (process launch -> window drawn)")
+    lazy = median(first_frame_ms(False) for _ in range(args.repeat))
+    eager = median(first_frame_ms(True) for _ in range(args.repeat))
+    if lazy is None:
+        print("  skipped - no display available (try: xvfb-run python benchmarks/startup_benchmark.py)")
+    else:
+        print(f"  lazy imports    {fmt(lazy)}")
+        print(f"  eager imports   {fmt(eager)}")
+
+
+if __name__ == "__main__":
+    main()
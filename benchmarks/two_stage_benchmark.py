@@ -0,0 +1,95 @@
+"""
+Two-stage classification benchmark for the GUI.
+
+Classifies the same documents in both modes against a running Ollama:
+  - single      one prompt with every system, its subsystems and the info codes
+  - two-stage   system titles and info codes first, then only the chosen system's subsystems
+
+and reports, per mode: failed answers (these fall through to the keyword fallback), prompt
+tokens as estimated by the prompt builder and as evaluated by Ollama (both stages added up;
+a stage-2 prompt partly served from Ollama's prompt cache evaluates fewer tokens), systems
+shortlisted out of the catalogue, and wall-clock time per document. The last line is how often
+the two modes agree on systemCode, infoCode and the subsystem.
+
+Usage: python benchmarks/two_stage_benchmark.py --input-dir DOCS [--sns FILE ...] [--limit 20] [--lean]
+Run from the repository root. Needs Ollama with the GUI's configured model. Large catalogues
+(several SNS files) are where the single prompt has to shortlist and two-stage pays off.
+"""
+import os
+import sys
+import argparse
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import DMC_Auto_GUI as gui  # noqa: E402
+from dmc_prompt import info_catalogue_entries, sns_catalogue_entries  # noqa: E402
+from response_format_benchmark import load_catalogue, mean, fmt  # noqa: E402
+
+MODES = ("single", "two-stage")
+
+
+def prompt_tokens(stats):
+    return stats.get("prompt_tokens", 0) + stats.get("stage2", {}).get("prompt_tokens", 0) if stats else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input-dir", required=True, help="folder of .docx documents")
+    parser.add_argument("--data-dir", default=gui.DATA_DIRECTORY, help="SNS and info code files")
+    parser.add_argument("--sns", action="append", metavar="FILE", help="SNS JSON file in the data dir (default: all)")
+    parser.add_argument("--limit", type=int, default=20, help="documents to classify per mode")
+    parser.add_argument("--lean", action="store_true", help="ask for answers without reasoning in both modes")
+    args = parser.parse_args()
+
+    sns_files = args.sns or sorted(f for f in os.listdir(args.data_dir) if f.endswith('.json') and f != 'info_codes.json')
+    sns_data, info_codes = load_catalogue(args.data_dir, sns_files)
+    sns_entries = sns_catalogue_entries(sns_data, gui.SNS_DEFINITION_CHARS)
+    system_entries = sns_catalogue_entries(sns_data, gui.SNS_DEFINITION_CHARS, subsystems=False)
+    info_entries = info_catalogue_entries(info_codes)
+    available_sns, available_info = set(sns_data), set(info_codes)
+
+    documents = []
+    for filename in sorted(f for f in os.listdir(args.input_dir) if f.endswith('.docx'))[:args.limit]:
+        headings, body = gui.extract_text_from_docx(os.path.join(args.input_dir, filename))
+        if headings or body:
+            documents.append((headings, body))
+    print(f"{len(documents)} documents, {len(sns_data)} systems, {len(info_codes)} info codes, model {gui.OLLAMA_MODEL}\n")
+
+    # Load the model first so the first mode is not charged for it
+    gui.ModelWarmup(gui.OLLAMA_API_URL, gui.OLLAMA_MODEL, gui.KEEP_ALIVE).start().wait()
+
+    answers = {}
+    print(f"{'mode':<11}{'failed':>8}{'tokens':>9}{'evaluated':>10}{'systems':>10}{'wall ms':>9}")
+    for mode in MODES:
+        failed = 0
+        tokens, evaluated, systems, wall_ms = [], [], [], []
+        answers[mode] = []
+        for headings, body in documents:
+            stats = {}
+            started = time.perf_counter()
+            if mode == "single":
+                parts = gui.generate_dmc_with_llm(headings, body, sns_entries, info_entries, available_sns, available_info,
+                                                  prompt_stats=stats, lean=args.lean)
+            else:
+                parts = gui.classify_two_stage(headings, body, system_entries, info_entries, sns_data, available_sns,
+                                               available_info, prompt_stats=stats, lean=args.lean)
+            wall_ms.append((time.perf_counter() - started) * 1000)
+            failed += parts is None
+            answers[mode].append(parts)
+            tokens.append(prompt_tokens(stats))
+            evaluated.append(stats.get("prompt_eval_count"))
+            systems.append(int(stats["sns_systems"].split('/')[0]) if stats.get("sns_systems") else None)
+        print(f"{mode:<11}{failed:>8}{fmt(mean(tokens))}{fmt(mean(evaluated)):>10}{fmt(mean(systems)):>10}{fmt(mean(wall_ms))}")
+
+    pairs = [(a, b) for a, b in zip(*(answers[mode] for mode in MODES)) if a and b]
+    if pairs:
+        def agree(*fields):
+            return sum(all(a[f] == b[f] for f in fields) for a, b in pairs) / len(pairs) * 100
+        print(f"\nagreement over {len(pairs)} documents: systemCode {agree('systemCode'):.0f}%, "
+              f"infoCode {agree('infoCode'):.0f}%, subsystem {agree('systemCode', 'subSystemCode', 'subSubSystemCode'):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Worker catalogue benchmark: loading the catalogue per process against mapping the compiled file.
+
+Starts --workers processes at once, as coordinator/worker mode does on one machine, and each
+process either
+  - load    loads the catalogue through the catalogue cache (warm: fragments already on disk)
+  - mapped  maps the compiled catalogue the coordinator writes next to the work queue
+
+then builds one prompt and runs the fallback matcher, so it has read every system and info code
+once. Reported per mode and worker count: mean startup time (load or map) and the
+private memory each worker gained (Private_Clean + Private_Dirty from /proc/self/smaps_rollup,
+so pages shared through the page cache are not counted; Linux only, n/a elsewhere).
+
+Usage: python benchmarks/worker_catalogue_benchmark.py [--data-dir Lake] [--workers 1 4 8]
+Run from the repository root. No Ollama needed.
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import DMC_Auto as cli  # noqa: E402
+from dmc_catalogue import CatalogueCache, attach_compiled_catalogue, write_compiled_catalogue  # noqa: E402
+from dmc_prompt import PromptBuilder  # noqa: E402
+
+HEADINGS = "Hydraulic pump - removal and installation"
+BODY = "Remove the hydraulic pump from the power unit. Inspect the seals and install a new filter. " * 40
+
+
+def private_kib():
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return sum(int(fields[name].split()[0]) for name in ("Private_Clean", "Private_Dirty"))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def worker(mode, data_dir, sns_files, cache_dir, compiled_path, results):
+    logging.disable(logging.WARNING)
+    before = private_kib()
+    started = time.perf_counter()
+    if mode == "mapped":
+        catalogue = attach_compiled_catalogue(compiled_path)
+    else:
+        cache = CatalogueCache(cli.parse_sns_json, cli.parse_info_codes_json, cli.parse_info_codes, cache_dir)
+        catalogue = cache.load(data_dir, sns_files)
+    startup_ms = (time.perf_counter() - started) * 1000
+    PromptBuilder(cli.CLASSIFY_PROMPT).build(HEADINGS, BODY, catalogue["sns_entries"], catalogue["info_entries"])
+    cli.generate_dmc_with_fallback(HEADINGS, BODY, catalogue["sns_data"], catalogue["info_codes"])
+    after = private_kib()
+    results.put((startup_ms, after - before if before is not None and after is not None else None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=cli.DATA_DIRECTORY, help="SNS and info code files")
+    parser.add_argument("--sns", action="append", metavar="FILE", help="SNS JSON file in the data dir (default: all)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="worker counts to run")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    sns_files = args.sns or sorted(f for f in os.listdir(args.data_dir) if f.endswith('.json') and f != 'info_codes.json')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir = os.path.join(temp_dir, "catalogue")
+        catalogue = CatalogueCache(cli.parse_sns_json, cli.parse_info_codes_json, cli.parse_info_codes,
+                                   cache_dir).load(args.data_dir, sns_files)
+        compiled_path = os.path.join(temp_dir, "queue.db.catalogue")
+        size = write_compiled_catalogue(catalogue, compiled_path)
+        print(f"{len(catalogue['sns_data'])} systems, {len(catalogue['info_codes'])} info codes, "
+              f"compiled file {size / 1024:.0f} KiB\n")
+
+        context = multiprocessing.get_context("spawn")
+        print(f"{'mode':<8}{'workers':>8}{'startup ms':>12}{'private KiB':>13}{'total KiB':>11}")
+        for mode in ("load", "mapped"):
+            for count in args.workers:
+                results = context.Queue()
+                processes = [context.Process(target=worker, args=(mode, args.data_dir, sns_files, cache_dir,
+                                                                  compiled_path, results)) for _ in range(count)]
+                for process in processes:
+                    process.start()
+                measured = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                startup = statistics.mean(m[0] for m in measured)
+                private = [m[1] for m in measured if m[1] is not None]
+                if private:
+                    print(f"{mode:<8}{count:>8}{startup:12.1f}{statistics.mean(private):13.0f}{sum(private):11.0f}")
+                else:
+                    print(f"{mode:<8}{count:>8}{startup:12.1f}{'n/a':>13}{'n/a':>11}")
+
+
+if __name__ == "__main__":
+    main()
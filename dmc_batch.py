@@ -0,0 +1,81 @@
+import json
+from collections import namedtuple
+
+
+# --- MULTI-DOCUMENT PROMPTS ---
+
+# Documents whose headings and body together stay under this many tokens are batched
+DEFAULT_SMALL_DOCUMENT_TOKENS = 600
+# Document text packed into one request, and the most documents per request
+DEFAULT_BATCH_TOKEN_BUDGET = 2400
+DEFAULT_BATCH_MAX_DOCUMENTS = 8
+# Uncompressed word/document.xml bytes per character of text; documents whose XML is larger
+# than this many times the small-document limit are not even extracted to check their length
+XML_BYTES_PER_TEXT_CHAR = 20
+
+BatchDocument = namedtuple('BatchDocument', 'doc_id filename headings body tokens')
+
+
+def pack_batches(documents, token_budget=DEFAULT_BATCH_TOKEN_BUDGET, max_documents=DEFAULT_BATCH_MAX_DOCUMENTS):
+    """
+    Greedily groups BatchDocuments, in the given order, into lists of at most token_budget
+    tokens and max_documents documents. Documents are numbered D1, D2, ... within each batch.
+    """
+    batches, current, used = [], [], 0
+    for document in documents:
+        if current and (used + document.tokens > token_budget or len(current) >= max_documents):
+            batches.append(current)
+            current, used = [], 0
+        current.append(document)
+        used += document.tokens
+    if current:
+        batches.append(current)
+    return [_numbered(batch) for batch in batches]
+
+
+def split_to_fit(batch, fits):
+    """
+    Halves batch until every part passes fits(part), renumbering the documents of each part.
+    A single document that still does not fit is returned alone (and so classified individually).
+    """
+    if len(batch) == 1 or fits(batch):
+        return [batch]
+    middle = len(batch) // 2
+    return split_to_fit(_numbered(batch[:middle]), fits) + split_to_fit(_numbered(batch[middle:]), fits)
+
+
+def _numbered(batch):
+    return [d._replace(doc_id=f"D{i}") for i, d in enumerate(batch, 1)]
+
+
+def render_documents(batch):
+    """The documents section of a batch prompt: each document under its id."""
+    return '\n\n'.join(f"=== DOCUMENT {d.doc_id} ===\nTITLE/HEADINGS:\n{d.headings or 'No headings.'}\n"
+                       f"CONTENT:\n{d.body or 'No content.'}" for d in batch)
+
+
+def parse_batch_response(text, doc_ids):
+    """
+    Reads a batch answer into {doc_id: dmc_parts dict}. Accepts {"results": [...]}, a bare
+    array of objects carrying an "id", or an object keyed by id. Unknown ids, duplicates and
+    entries without systemCode/infoCode are dropped; the caller retries whatever is missing.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        data = data['results']
+    if isinstance(data, dict):
+        data = [dict(parts, id=doc_id) for doc_id, parts in data.items() if isinstance(parts, dict)]
+    if not isinstance(data, list):
+        return {}
+
+    wanted, results = set(doc_ids), {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        doc_id = str(item.get('id', '')).strip()
+        if doc_id in wanted and doc_id not in results and item.get('systemCode') and item.get('infoCode'):
+            results[doc_id] = {k: v for k, v in item.items() if k != 'id'}
+    return results
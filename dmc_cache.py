@@ -0,0 +1,165 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+import threading
+
+
+# --- RESULT CACHE ---
+
+# use     - return cached LLM results and store new ones
+# refresh - ignore cached results but store the new ones (re-classify everything)
+# off     - neither read nor write the cache
+CACHE_MODES = ('use', 'refresh', 'off')
+DEFAULT_CACHE_DIRECTORY = os.path.join("logs", "cache")
+
+# Bump when the prompt or response handling changes in a way that makes old results stale
+PROMPT_VERSION = 2
+# Bump when extract_text_from_docx returns different text for the same file
+EXTRACTOR_VERSION = 1
+DEFAULT_TEXT_CACHE_DIRECTORY = os.path.join(DEFAULT_CACHE_DIRECTORY, "text")
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_text(*parts):
+    """Returns a short stable fingerprint for the given strings (e.g. the rendered catalogue context)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Content-addressed store of LLM classification results.
+    Keys combine the document hash with everything that influences the answer
+    (model, catalogue fingerprint, prompt version), so changing any of them
+    simply misses instead of returning a stale DMC.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIRECTORY, mode='use'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Expected one of: {', '.join(CACHE_MODES)}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_hash, model, catalogue_fingerprint):
+        return fingerprint_text(file_hash, model, catalogue_fingerprint, PROMPT_VERSION)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached dmc_parts for key, or None on a miss (always None unless mode is 'use')."""
+        if self.mode != 'use':
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            self.hits += 1
+            return value
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        """True if key has a usable cached result; unlike get() this is not counted as a hit or miss."""
+        return self.mode == 'use' and os.path.exists(self._path(key))
+
+    def put(self, key, value):
+        """Stores dmc_parts for key. Written via a temp file + rename so readers never see partial JSON."""
+        if self.mode == 'off':
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write result cache entry {key}: {e}")
+
+
+# --- EXTRACTED TEXT CACHE ---
+
+class TextCache:
+    """
+    Content-addressed store of extracted document text, (headings, body) compressed with zlib.
+    Keys are the document hash and EXTRACTOR_VERSION only: the text does not depend on the
+    model, prompt or catalogue, so it stays valid when the result cache is invalidated by them
+    and re-running a corpus with another model or prompt skips extraction entirely.
+    Documents that could not be read are not stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_TEXT_CACHE_DIRECTORY, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_hash):
+        return fingerprint_text(file_hash, EXTRACTOR_VERSION)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.z")
+
+    def get(self, file_hash):
+        """Returns the cached (headings, body) for a document hash, or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(self.make_key(file_hash)), 'rb') as f:
+                headings, body = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            self.hits += 1
+            return headings, body
+        except (OSError, ValueError, zlib.error):
+            self.misses += 1
+            return None
+
+    def put(self, file_hash, headings, body):
+        """Stores extracted text for a document hash. Written via a temp file + rename."""
+        if not self.enabled:
+            return
+        path = self._path(self.make_key(file_hash))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(json.dumps([headings, body], ensure_ascii=False).encode('utf-8')))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write text cache entry for {file_hash[:12]}: {e}")
+
+    def extract(self, file_path, extractor, file_hash=None):
+        """
+        Returns extractor(file_path) - a (headings, body) pair - from the cache when this file's
+        contents were extracted before. file_hash saves re-hashing when the caller has it.
+        """
+        if not self.enabled:
+            return extractor(file_path)
+        try:
+            file_hash = file_hash or hash_file(file_path)
+        except OSError:
+            return extractor(file_path)
+        cached = self.get(file_hash)
+        if cached is not None:
+            return cached
+        headings, body = extractor(file_path)
+        if headings or body:
+            self.put(file_hash, headings, body)
+        return headings, body
@@ -0,0 +1,630 @@
+import os
+import sys
+import json
+import mmap
+import logging
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+
+from dmc_cache import CACHE_MODES, DEFAULT_CACHE_DIRECTORY, fingerprint_text, hash_file
+from dmc_prompt import CatalogueEntry, info_catalogue_entries, render_entries, sns_catalogue_entries
+
+
+# --- CATALOGUE CACHE ---
+
+# Parsed SNS and info code files with their rendered prompt entries, one JSON file per source file content
+DEFAULT_CATALOGUE_DIRECTORY = os.path.join(DEFAULT_CACHE_DIRECTORY, "catalogue")
+
+# Bump when the parsers or the catalogue entry rendering change in a way that makes stored fragments stale
+CATALOGUE_VERSION = 1
+
+# How often CatalogueManager looks for added, removed or edited files in the data folder
+CATALOGUE_POLL_SECONDS = 2.0
+
+
+# --- COMPACT RECORDS ---
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _words(text):
+    return tuple(sys.intern(word) for word in (text or '').lower().split())
+
+
+class CatalogueRecord(Mapping):
+    """
+    Read-only catalogue record with its fields in __slots__ instead of a per-record dict.
+    Reads like the parsed dict it replaces - record['title'], record.get('definition', ''),
+    dict(record) - and compares equal to it. Derived fields are attributes only.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class SnsSubsystem(CatalogueRecord):
+    __slots__ = ('title', 'definition')
+    _fields = __slots__
+
+    def __init__(self, title, definition):
+        self.title = _intern(title)
+        self.definition = _intern(definition)
+
+
+class SnsSystem(CatalogueRecord):
+    """A system with its subsystems; title_words is the lowercased, interned title split into words."""
+    __slots__ = ('title', 'definition', 'subsystems', 'title_words')
+    _fields = ('title', 'definition', 'subsystems')
+
+    def __init__(self, title, definition, subsystems):
+        self.title = _intern(title)
+        self.definition = _intern(definition)
+        self.subsystems = subsystems
+        self.title_words = _words(title)
+
+
+class InfoCode(CatalogueRecord):
+    """An info code; description_words is the lowercased, interned description split into words."""
+    __slots__ = ('type', 'description', 'description_words')
+    _fields = ('type', 'description')
+
+    def __init__(self, type, description):
+        self.type = _intern(type)
+        self.description = _intern(description)
+        self.description_words = _words(description)
+
+
+def compact_sns_data(sns_data):
+    """Parsed SNS dicts as SnsSystem/SnsSubsystem records with interned codes and strings."""
+    return {
+        sys.intern(code): SnsSystem(data.get('title', ''), data.get('definition', ''), {
+            sys.intern(sub_code): SnsSubsystem(sub.get('title', ''), sub.get('definition', ''))
+            for sub_code, sub in data.get('subsystems', {}).items()
+        })
+        for code, data in sns_data.items()
+    }
+
+
+def compact_info_codes(info_codes):
+    """Parsed info code dicts as InfoCode records with interned codes and strings."""
+    return {sys.intern(code): InfoCode(data.get('type', 'other'), data.get('description', ''))
+            for code, data in info_codes.items()}
+
+
+def _encode_entry(entry):
+    return [entry.text, sorted(entry.keywords), entry.group] if entry else None
+
+
+def _decode_entry(value):
+    return CatalogueEntry(value[0], frozenset(value[1]), value[2]) if value else None
+
+
+class CatalogueCache:
+    """
+    Memoizes the LLM catalogue of a selection of SNS files plus the info codes file.
+
+    Each source file is parsed and rendered once per content hash into a fragment - its
+    parsed data and, for SNS files, one rendered entry per system - kept in memory and in
+    cache_dir, so later runs and GUI sessions skip parsing. A selection is assembled from
+    its files' fragments: adding one SNS file only renders that file. The assembled catalogue
+    (entries, rendered context strings, code sets and fingerprint) is memoized per selection
+    and must be treated as read-only by callers; sns_data and info_codes hold compact
+    CatalogueRecords rather than the parsers' dicts.
+
+    The parsers are passed in because the CLI and the GUI each have their own.
+    mode follows the result cache: 'refresh' re-parses and rewrites fragments, 'off' keeps them in memory only.
+    """
+
+    def __init__(self, parse_sns, parse_info_json, parse_info_txt, cache_dir=DEFAULT_CATALOGUE_DIRECTORY,
+                 mode='use', definition_chars=0):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Expected one of: {', '.join(CACHE_MODES)}")
+        self.parse_sns = parse_sns
+        self.parse_info_json = parse_info_json
+        self.parse_info_txt = parse_info_txt
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.definition_chars = definition_chars
+        self._hashes = {}       # (path, size, mtime_ns) -> content hash
+        self._paths = {}        # path -> fragment key of its latest contents
+        self._fragments = {}    # fragment key -> fragment
+        self._selections = {}   # tuple of fragment keys -> assembled catalogue
+        self._lock = threading.Lock()
+
+    def load(self, data_dir, sns_files):
+        """
+        Returns the catalogue dict for sns_files (names in data_dir) and data_dir's info codes
+        (info_codes.json preferred over info_codes.txt). "sources" maps every file read to
+        where its fragment came from: memory, disk or parsed; "system_counts" the systems per loaded SNS file.
+        """
+        sources, fragments = {}, []
+        info_file = next((os.path.join(data_dir, name) for name in ("info_codes.json", "info_codes.txt")
+                          if os.path.exists(os.path.join(data_dir, name))), None)
+        info = self._fragment(info_file, "info", sources) if info_file else None
+        for sns_file in sns_files:
+            file_path = os.path.join(data_dir, sns_file)
+            if not os.path.exists(file_path):
+                logging.debug(f"SNS file not found (skipping): {sns_file}")
+                continue
+            fragment = self._fragment(file_path, "sns", sources)
+            if fragment and fragment["data"]:
+                fragments.append((sns_file, fragment))
+
+        selection = (info["key"] if info else None,) + tuple(f["key"] for _, f in fragments)
+        with self._lock:
+            catalogue = self._selections.get(selection)
+        if catalogue is None:
+            catalogue = self._assemble(info, fragments)
+            with self._lock:
+                self._selections[selection] = catalogue
+        return dict(catalogue, info_codes_file=info_file, sns_files_loaded=[name for name, _ in fragments],
+                    system_counts={name: len(f["data"]) for name, f in fragments}, sources=sources)
+
+    def _assemble(self, info, fragments):
+        # Later files override earlier ones for the same system code, as with dict.update on the parsed data
+        sns_data, owners = {}, {}
+        for _, fragment in fragments:
+            sns_data.update(fragment["data"])
+            owners.update(dict.fromkeys(fragment["data"], fragment))
+        sns_entries, system_entries = [], []
+        for code in sorted(sns_data):
+            full, system = owners[code]["systems"].get(code, (None, None))
+            if full:
+                sns_entries.append(full)
+                system_entries.append(system)
+        info_codes = info["data"] if info else {}
+        info_entries = info["entries"] if info else []
+        sns_context, info_context = render_entries(sns_entries), render_entries(info_entries)
+        return {
+            "sns_data": sns_data,
+            "info_codes": info_codes,
+            "sns_entries": sns_entries,
+            "system_entries": system_entries,
+            "info_entries": info_entries,
+            "sns_context": sns_context,
+            "info_context": info_context,
+            "available_sns_codes": frozenset(sns_data),
+            "available_info_codes": frozenset(info_codes),
+            "fingerprint": fingerprint_text(sns_context, info_context),
+        }
+
+    def _file_hash(self, file_path):
+        stat = os.stat(file_path)
+        stamp = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            file_hash = self._hashes.get(stamp)
+        if file_hash is None:
+            file_hash = hash_file(file_path)
+            with self._lock:
+                # Earlier versions of an edited file are not looked up again
+                self._hashes = {s: h for s, h in self._hashes.items() if s[0] != stamp[0]}
+                self._hashes[stamp] = file_hash
+        return file_hash
+
+    def forget(self, file_path):
+        """Drops a deleted file's fragment and the memoized selections that contain it from memory."""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            self._hashes = {s: h for s, h in self._hashes.items() if s[0] != path}
+            self._discard(path)
+
+    def _discard(self, path):
+        key = self._paths.pop(path, None)
+        if key and key not in self._paths.values():
+            self._fragments.pop(key, None)
+            self._selections = {sel: c for sel, c in self._selections.items() if key not in sel}
+
+    def _fragment(self, file_path, kind, sources):
+        name = os.path.basename(file_path)
+        key = fingerprint_text(kind, name.endswith('.txt'), self._file_hash(file_path), self.definition_chars,
+                               CATALOGUE_VERSION)
+        path = os.path.abspath(file_path)
+        with self._lock:
+            # An edited file's previous fragment is dropped from memory
+            if self._paths.get(path) not in (None, key):
+                self._discard(path)
+            self._paths[path] = key
+            fragment = self._fragments.get(key)
+        if fragment is not None:
+            sources[name] = "memory"
+            return fragment
+        fragment = self._read(key) if self.mode == 'use' else None
+        sources[name] = "disk"
+        if fragment is None:
+            fragment = self._build(file_path, kind, key)
+            sources[name] = "parsed"
+            if fragment["data"]:
+                self._write(fragment)
+        fragment["data"] = compact_info_codes(fragment["data"]) if kind == "info" else compact_sns_data(fragment["data"])
+        with self._lock:
+            self._fragments[key] = fragment
+        return fragment
+
+    def _build(self, file_path, kind, key):
+        if kind == "info":
+            parse = self.parse_info_txt if file_path.endswith('.txt') else self.parse_info_json
+            data = parse(file_path) or {}
+            return {"key": key, "data": data, "entries": info_catalogue_entries(data)}
+        data = self.parse_sns(file_path) or {}
+        systems = {}
+        for code, system in data.items():
+            full = sns_catalogue_entries({code: system}, self.definition_chars)
+            if full:
+                systems[code] = (full[0], sns_catalogue_entries({code: system}, self.definition_chars, subsystems=False)[0])
+        return {"key": key, "data": data, "systems": systems}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            fragment = {"key": key, "data": stored["data"]}
+            if "entries" in stored:
+                fragment["entries"] = [_decode_entry(e) for e in stored["entries"]]
+            else:
+                fragment["systems"] = {code: tuple(_decode_entry(e) for e in pair) for code, pair in stored["systems"].items()}
+            return fragment
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+
+    def _write(self, fragment):
+        """Written via a temp file + rename like the result cache, so concurrent runs never read a partial fragment."""
+        if self.mode == 'off':
+            return
+        stored = {"data": fragment["data"]}
+        if "entries" in fragment:
+            stored["entries"] = [_encode_entry(e) for e in fragment["entries"]]
+        else:
+            stored["systems"] = {code: [_encode_entry(e) for e in pair] for code, pair in fragment["systems"].items()}
+        path = self._path(fragment["key"])
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not write catalogue cache entry {fragment['key']}: {e}")
+
+
+def folder_signature(data_dir):
+    """(name, size, mtime_ns) of every catalogue file in data_dir, sorted; empty if the folder is missing."""
+    try:
+        with os.scandir(data_dir) as entries:
+            return tuple(sorted((e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries
+                                if e.name.endswith(('.json', '.txt')) and e.is_file()))
+    except OSError:
+        return ()
+
+
+def sns_file_names(signature):
+    return [name for name, _, _ in signature if name.endswith('.json') and name != 'info_codes.json']
+
+
+class CatalogueManager:
+    """
+    Keeps the catalogue of the selected data folder and SNS files resident and current.
+
+    A background thread polls the data folder's file sizes and mtimes every poll_seconds
+    (and wakes at once when the selection changes). Added or removed SNS files are reported
+    through on_files_changed(names); when a selected file or the info codes change, only
+    those files are re-parsed through the CatalogueCache and the new catalogue is swapped in
+    as a whole and reported through on_reload(catalogue). Callbacks run on the poll thread.
+
+    snapshot() returns the current catalogue. A batch keeps using the snapshot it started
+    with - a reload swaps in a new dict and never changes one that was handed out.
+    """
+
+    def __init__(self, cache, poll_seconds=CATALOGUE_POLL_SECONDS, on_files_changed=None, on_reload=None):
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self.on_files_changed = on_files_changed
+        self.on_reload = on_reload
+        self._selection = None          # (data_dir, tuple of SNS file names)
+        self._current = None            # (selection, folder signature, catalogue)
+        self._signature = None          # last signature seen by the poll thread
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalogue-manager", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def select(self, data_dir, sns_files):
+        """Sets the data folder and SNS files to keep loaded; the reload happens in the background."""
+        with self._lock:
+            self._selection = (data_dir, tuple(sns_files))
+        self._wake.set()
+
+    def snapshot(self, data_dir=None, sns_files=None):
+        """
+        Returns the catalogue of the current selection (or of data_dir/sns_files, which become
+        the selection), loading it first if the files changed since the last reload.
+        """
+        if data_dir is not None:
+            with self._lock:
+                self._selection = (data_dir, tuple(sns_files or ()))
+        return self._refresh()[0]
+
+    def _refresh(self):
+        """Returns (catalogue, reloaded); reloads only when the selection or its folder changed."""
+        with self._load_lock:
+            with self._lock:
+                selection, current = self._selection, self._current
+            if selection is None:
+                return None, False
+            data_dir, sns_files = selection
+            signature = folder_signature(data_dir)
+            if current and current[0] == selection and current[1] == signature:
+                return dict(current[2], sources=dict.fromkeys(current[2]["sources"], "memory")), False
+            if current and current[0][0] == data_dir:
+                present = {name for name, _, _ in signature}
+                for name, _, _ in current[1]:
+                    if name not in present:
+                        self.cache.forget(os.path.join(data_dir, name))
+            catalogue = self.cache.load(data_dir, sns_files)
+            with self._lock:
+                self._current = (selection, signature, catalogue)
+            return catalogue, True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                with self._lock:
+                    data_dir = self._selection[0] if self._selection else None
+                if data_dir is not None:
+                    signature = folder_signature(data_dir)
+                    previous, self._signature = self._signature, (data_dir, signature)
+                    if previous and previous[0] == data_dir and self.on_files_changed and \
+                            sns_file_names(previous[1]) != sns_file_names(signature):
+                        self.on_files_changed(sns_file_names(signature))
+                    catalogue, reloaded = self._refresh()
+                    if reloaded and self.on_reload:
+                        self.on_reload(catalogue)
+            except Exception as e:
+                logging.warning(f"Catalogue reload failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+# --- COMPILED CATALOGUE FILE ---
+
+# A loaded catalogue written once to a flat file that other processes map read-only instead of
+# loading their own copy. Layout: magic, header length (u64), JSON header, then 8-byte aligned
+# sections - string offsets (u64), the UTF-8 string blob and row tables of string ids (u32).
+# Strings are decoded when a record or entry is read, so the file's pages are shared by all
+# processes through the page cache and each process only holds what it is currently using.
+COMPILED_MAGIC = b"DMCCAT1\n"
+NO_STRING = 0xFFFFFFFF
+# Columns per row of each table
+COMPILED_TABLES = {
+    "systems": 5,           # code, title, definition, first subsystem row, subsystem count
+    "subsystems": 3,        # code, title, definition
+    "info_codes": 3,        # code, type, description
+    "sns_entries": 3,       # text, keywords joined by spaces, group
+    "system_entries": 3,
+    "info_entries": 3,
+}
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class _StringTable:
+    """Collects strings for a compiled file; identical strings are stored once."""
+
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array('Q', [0])
+        self.blob = bytearray()
+
+    def add(self, text):
+        if text is None:
+            return NO_STRING
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.offsets) - 1
+            self.blob += text.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return string_id
+
+
+def write_compiled_catalogue(catalogue, path):
+    """Writes a catalogue dict from CatalogueCache.load to path (via a temp file + rename) for attach_compiled_catalogue()."""
+    strings, tables = _StringTable(), {name: array('I') for name in COMPILED_TABLES}
+    for code, system in catalogue["sns_data"].items():
+        subsystems = system.get('subsystems', {})
+        tables["systems"].extend([strings.add(code), strings.add(system.get('title')), strings.add(system.get('definition')),
+                                  len(tables["subsystems"]) // 3, len(subsystems)])
+        for sub_code, sub in subsystems.items():
+            tables["subsystems"].extend([strings.add(sub_code), strings.add(sub.get('title')), strings.add(sub.get('definition'))])
+    for code, info in catalogue["info_codes"].items():
+        tables["info_codes"].extend([strings.add(code), strings.add(info.get('type')), strings.add(info.get('description'))])
+    for name in ("sns_entries", "system_entries", "info_entries"):
+        for entry in catalogue[name]:
+            tables[name].extend([strings.add(entry.text), strings.add(' '.join(sorted(entry.keywords))), strings.add(entry.group)])
+
+    sections, offset = [], 0
+    for name, data in [("string_offsets", strings.offsets.tobytes()), ("strings", bytes(strings.blob))] + \
+            [(name, table.tobytes()) for name, table in tables.items()]:
+        sections.append((name, offset, data))
+        offset = _align(offset + len(data))
+    header = json.dumps({
+        "fingerprint": catalogue["fingerprint"],
+        "info_codes_file": catalogue.get("info_codes_file"),
+        "sns_files_loaded": catalogue.get("sns_files_loaded", []),
+        "system_counts": catalogue.get("system_counts", {}),
+        "byteorder": sys.byteorder,
+        "sections": {name: [offset, len(data)] for name, offset, data in sections},
+    }).encode('utf-8')
+    base = _align(len(COMPILED_MAGIC) + 8 + len(header))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(COMPILED_MAGIC + len(header).to_bytes(8, 'little') + header)
+        for _, offset, data in sections:
+            f.seek(base + offset)
+            f.write(data)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+class MappedCatalogue:
+    """A compiled catalogue file mapped read-only; see attach_compiled_catalogue()."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(COMPILED_MAGIC)]) != COMPILED_MAGIC:
+            raise ValueError(f"{path} is not a compiled catalogue")
+        header_length = int.from_bytes(view[len(COMPILED_MAGIC):len(COMPILED_MAGIC) + 8], 'little')
+        start = len(COMPILED_MAGIC) + 8
+        self.header = json.loads(bytes(view[start:start + header_length]))
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was compiled on a machine with a different byte order")
+        base = _align(start + header_length)
+        sections = {name: view[base + offset:base + offset + length] for name, (offset, length) in self.header["sections"].items()}
+        self._offsets = sections["string_offsets"].cast('Q')
+        self._blob = sections["strings"]
+        self.tables = {name: sections[name].cast('I') for name in COMPILED_TABLES}
+        self.size = len(self._mmap)
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        return str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8')
+
+    def string_length(self, string_id):
+        """UTF-8 byte length of a string, read without decoding it (never less than its length in characters)."""
+        if string_id == NO_STRING:
+            return 0
+        return self._offsets[string_id + 1] - self._offsets[string_id]
+
+    def rows(self, table):
+        return len(self.tables[table]) // COMPILED_TABLES[table]
+
+    def row(self, table, index):
+        width = COMPILED_TABLES[table]
+        return self.tables[table][index * width:(index + 1) * width]
+
+    def column(self, table, index):
+        """String ids of one column of a table, for all rows."""
+        return self.tables[table][index::COMPILED_TABLES[table]]
+
+
+class _MappedEntries(Sequence):
+    """
+    The CatalogueEntry list of a mapped catalogue; entries are decoded when read. The prompt
+    builder sizes and ranks entries through text_lengths() and keyword_lists(), which leave the
+    entry texts undecoded, so a prompt only decodes the entries it includes.
+    """
+
+    def __init__(self, mapped, table):
+        self._mapped, self._table = mapped, table
+        self._length = mapped.rows(table)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        text, words, group = (self._mapped.string(i) for i in self._mapped.row(self._table, index))
+        return CatalogueEntry(text, frozenset(words.split()), group)
+
+    def text_lengths(self):
+        return [self._mapped.string_length(i) for i in self._mapped.column(self._table, 0)]
+
+    def keyword_lists(self):
+        return [self._mapped.string(i).split() for i in self._mapped.column(self._table, 1)]
+
+
+class _MappedRecords(Mapping):
+    """code -> record of a mapped catalogue table; records are built when read and not kept."""
+
+    def __init__(self, mapped, table, make_record):
+        self._mapped, self._table, self._make_record = mapped, table, make_record
+        self._rows = {mapped.string(mapped.row(table, i)[0]): i for i in range(mapped.rows(table))}
+
+    def __getitem__(self, code):
+        return self._make_record(self._mapped, self._mapped.row(self._table, self._rows[code]))
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, code):
+        return code in self._rows
+
+
+def _mapped_system(mapped, row):
+    code, title, definition, first, count = row
+    subsystems = {}
+    for i in range(first, first + count):
+        sub_code, sub_title, sub_definition = (mapped.string(s) for s in mapped.row("subsystems", i))
+        subsystems[sub_code] = SnsSubsystem(sub_title, sub_definition)
+    return SnsSystem(mapped.string(title), mapped.string(definition), subsystems)
+
+
+def _mapped_info_code(mapped, row):
+    return InfoCode(mapped.string(row[1]), mapped.string(row[2]))
+
+
+def attach_compiled_catalogue(path):
+    """
+    Maps a file from write_compiled_catalogue() and returns a catalogue dict for it with the
+    keys of CatalogueCache.load except the rendered context strings. sns_data, info_codes and
+    the entry lists read from the shared mapping; only the code sets are built up front.
+    """
+    mapped = MappedCatalogue(path)
+    sns_data = _MappedRecords(mapped, "systems", _mapped_system)
+    info_codes = _MappedRecords(mapped, "info_codes", _mapped_info_code)
+    return {
+        "sns_data": sns_data,
+        "info_codes": info_codes,
+        "sns_entries": _MappedEntries(mapped, "sns_entries"),
+        "system_entries": _MappedEntries(mapped, "system_entries"),
+        "info_entries": _MappedEntries(mapped, "info_entries"),
+        "available_sns_codes": frozenset(sns_data),
+        "available_info_codes": frozenset(info_codes),
+        "fingerprint": mapped.header["fingerprint"],
+        "info_codes_file": mapped.header["info_codes_file"],
+        "sns_files_loaded": mapped.header["sns_files_loaded"],
+        "system_counts": mapped.header["system_counts"],
+        "sources": dict.fromkeys(mapped.header["sns_files_loaded"], "mapped"),
+        "mapped": mapped,
+    }
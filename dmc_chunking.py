@@ -0,0 +1,104 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dmc_prompt import ESTIMATOR
+
+
+# --- MAP-REDUCE CLASSIFICATION OF LONG DOCUMENTS ---
+
+# Size of one chunk and cap on the document text sent to the map prompts, in tokens as estimated
+# by the prompt builder's calibrated ESTIMATOR. Documents longer than the budget are sampled:
+# chunks are picked evenly from start to end.
+DEFAULT_CHUNK_TOKENS = 1000
+DEFAULT_MAP_TOKEN_BUDGET = 8000
+# Words per chunk summary; the summaries are what the final (reduce) prompt sees
+SUMMARY_WORDS = 40
+
+CHUNK_PROMPT = """Summarize this section of a technical document in at most {words} words for S1000D classification.
+Name the system or equipment it is about, and say whether it is a procedure, description,
+fault isolation, parts list, or general information.
+
+DOCUMENT: {title}
+SECTION {number} of {total}:
+{chunk}
+
+Summary:"""
+
+
+def split_into_chunks(text, chunk_tokens=DEFAULT_CHUNK_TOKENS):
+    """Splits text into chunks of about chunk_tokens, on paragraph boundaries where possible."""
+    limit = ESTIMATOR.chars_for(chunk_tokens)
+    chunks, current = [], ''
+    for paragraph in re.split(r'\n+', text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > limit:
+            # A single very long paragraph is cut at the last space before the limit
+            cut = paragraph.rfind(' ', 0, limit)
+            cut = cut if cut > limit // 2 else limit
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) + 1 > limit:
+            chunks.append(current)
+            current = ''
+        if paragraph:
+            current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def select_chunks(chunks, max_chunks):
+    """Returns (index, chunk) pairs for at most max_chunks chunks spread evenly over the document, first and last included."""
+    if len(chunks) <= max_chunks:
+        return list(enumerate(chunks))
+    if max_chunks <= 1:
+        return [(0, chunks[0])]
+    step = (len(chunks) - 1) / (max_chunks - 1)
+    indices = sorted({round(i * step) for i in range(max_chunks)})
+    return [(i, chunks[i]) for i in indices]
+
+
+def needs_map_reduce(body_text, excerpt_chars):
+    """True when the body is longer than the excerpt a single classification prompt includes."""
+    return len(body_text or '') > excerpt_chars
+
+
+def condense_document(headings_text, body_text, generate, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                      token_budget=DEFAULT_MAP_TOKEN_BUDGET, concurrency=2):
+    """
+    Map step: summarizes the chunks of a long document concurrently with small prompts
+    (no catalogue), via generate(prompt) -> response text. Returns (condensed_text, stats);
+    condensed_text lists the section summaries in document order and replaces the body
+    in the normal classification prompt (the reduce step). A body that fits in one chunk
+    is returned whole; condensed_text is None if every summary failed.
+    """
+    started = time.perf_counter()
+    chunks = split_into_chunks(body_text, chunk_tokens)
+    if len(chunks) <= 1:
+        return body_text, {"chunks_total": len(chunks), "chunks_summarized": 0, "map_tokens": 0, "map_ms": 0.0}
+    selected = select_chunks(chunks, max(1, token_budget // chunk_tokens))
+    title = (headings_text or '').split('\n', 1)[0][:200] or 'Untitled'
+
+    def summarize(item):
+        index, chunk = item
+        prompt = CHUNK_PROMPT.format(words=SUMMARY_WORDS, title=title, number=index + 1, total=len(chunks), chunk=chunk)
+        return index, ' '.join((generate(prompt) or '').split()[:SUMMARY_WORDS * 2])
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        summaries = [(index, text) for index, text in executor.map(summarize, selected) if text]
+
+    condensed = None
+    if summaries:
+        condensed = f"Summaries of {len(summaries)} of {len(chunks)} sections, spread over the whole document:\n"
+        condensed += '\n'.join(f"[{index + 1}/{len(chunks)}] {text}" for index, text in summaries)
+    stats = {
+        "chunks_total": len(chunks),
+        "chunks_summarized": len(summaries),
+        "map_tokens": sum(ESTIMATOR.count(chunk) for _, chunk in selected),
+        "map_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return condensed, stats
@@ -0,0 +1,336 @@
+import os
+import re
+import sys
+import json
+import time
+import glob
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+
+# --- RUN HISTORY ---
+
+DEFAULT_HISTORY_PATH = os.path.join("logs", "history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL,
+    log_format TEXT NOT NULL,
+    started TEXT,
+    model TEXT,
+    catalogue_fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    file_name TEXT NOT NULL,
+    file_hash TEXT,
+    status TEXT NOT NULL,
+    dmc TEXT,
+    output_file TEXT,
+    fallback INTEGER,
+    issue TEXT,
+    dmc_parts TEXT
+);
+CREATE INDEX IF NOT EXISTS results_file_name ON results (file_name);
+CREATE INDEX IF NOT EXISTS results_file_hash ON results (file_hash);
+CREATE INDEX IF NOT EXISTS results_dmc ON results (dmc);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+LOG_TIMESTAMP_PATTERN = re.compile(r'_(\d{8}_\d{6})\.')
+LOG_LINE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - (\w+) - (.*)$')
+DMC_PATTERN = re.compile(r'(DMC-[A-Za-z0-9]+(?:-[A-Za-z0-9]+)+)')
+
+
+def timestamp_from_filename(path):
+    """Returns the ISO start time encoded in a log file name (..._YYYYMMDD_HHMMSS.ext), or None."""
+    match = LOG_TIMESTAMP_PATTERN.search(os.path.basename(path))
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').isoformat(timespec='seconds')
+
+
+def dmc_from_filename(name):
+    """Extracts the DMC from an output file name such as DMC-...-D__001.docx or DMC-...-D_Title.docx."""
+    match = DMC_PATTERN.search(os.path.basename(name or ''))
+    return match.group(1) if match else None
+
+
+class RunHistory:
+    """
+    SQLite index of every processing run and its per-document results.
+
+    Old logs (run_*.log, summary_*.json, dmc_processing_log_*.json/.jsonl) are
+    ingested once; new runs are recorded as they go through StreamingLogWriter.
+    Results are indexed by file name, file hash and DMC, runs by start time.
+    """
+
+    def __init__(self, db_path=DEFAULT_HISTORY_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    # --- recording ---
+
+    def start_run(self, source, started, log_format, model=None, catalogue_fingerprint=None):
+        """Registers a run (source is the log file name). Returns its run_id."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (source, log_format, started, model, catalogue_fingerprint) VALUES (?, ?, ?, ?, ?)",
+                (source, log_format, started, model, catalogue_fingerprint))
+            return cursor.lastrowid
+
+    def record(self, run_id, status, entry):
+        """Adds one document result; entry uses the processing log field names."""
+        self.record_many(run_id, [(status, entry)])
+
+    def record_many(self, run_id, results):
+        rows = []
+        for status, entry in results:
+            dmc_parts = entry.get('dmc_parts')
+            fallback = entry.get('fallback')
+            rows.append((
+                run_id, entry.get('file'), entry.get('file_hash'), status,
+                entry.get('assigned_dmc') or dmc_from_filename(entry.get('output_file')),
+                entry.get('output_file'),
+                None if fallback is None else int(bool(fallback)),
+                entry.get('issue'),
+                json.dumps(dmc_parts) if dmc_parts else None))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO results (run_id, file_name, file_hash, status, dmc, output_file, fallback, issue, dmc_parts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # --- ingesting old logs ---
+
+    def known_sources(self):
+        """Log file names already in the history, without extension (a .jsonl log converted to .json is the same run)."""
+        with self._lock:
+            return {os.path.splitext(row[0])[0] for row in self.conn.execute("SELECT source FROM runs")}
+
+    def ingest_logs(self, logs_dir):
+        """Imports every log in logs_dir that is not in the history yet. Returns the number of runs added."""
+        known = self.known_sources()
+
+        def is_known(path):
+            return os.path.splitext(os.path.basename(path))[0] in known
+
+        run_logs = sorted(glob.glob(os.path.join(logs_dir, 'run_*.log')))
+        summaries = sorted(glob.glob(os.path.join(logs_dir, 'summary_*.json')))
+
+        # The old CLI wrote run_<start>.log and summary_<end>.json for the same run. The summary
+        # is the better record, so a run log followed by a summary before the next run log is skipped.
+        covered = {}
+        starts = [(timestamp_from_filename(p) or '', p) for p in run_logs]
+        for summary in summaries:
+            stamp = timestamp_from_filename(summary) or ''
+            earlier = [p for start, p in starts if start <= stamp]
+            if earlier:
+                covered[earlier[-1]] = summary
+
+        added = 0
+        for path in run_logs:
+            if is_known(path) or path in covered:
+                continue
+            self._ingest(path, 'run_log', timestamp_from_filename(path), parse_run_log(path))
+            added += 1
+        for path in summaries:
+            if is_known(path):
+                continue
+            run_log = next((log for log, summary in covered.items() if summary == path), None)
+            started = timestamp_from_filename(run_log or path)
+            self._ingest(path, 'summary', started, parse_summary(path))
+            added += 1
+        for path in sorted(glob.glob(os.path.join(logs_dir, 'dmc_processing_log_*.json*'))):
+            if is_known(path):
+                continue
+            log_format = 'jsonl' if path.endswith('.jsonl') else 'json'
+            header, results = parse_processing_log(path)
+            settings = header.get('run_settings') or {}
+            self._ingest(path, log_format, header.get('started') or timestamp_from_filename(path), results,
+                         settings.get('model'), (header.get('data_sources') or {}).get('catalogue_fingerprint'))
+            added += 1
+        return added
+
+    def _ingest(self, path, log_format, started, results, model=None, catalogue_fingerprint=None):
+        results = list(results)
+        if model is None:
+            model = next((entry['model'] for _, entry in results if entry.get('model')), None)
+        run_id = self.start_run(os.path.basename(path), started, log_format, model, catalogue_fingerprint)
+        self.record_many(run_id, results)
+
+    # --- queries ---
+
+    def lookup(self, file_name=None, file_hash=None, dmc=None, since=None, limit=50):
+        """
+        Returns matching results, newest run first, as dicts. file_name and dmc accept '*'
+        wildcards (a fixed prefix still uses the index); since is an ISO date or datetime.
+        """
+        clauses, params = [], []
+        for column, value in (('r.file_name', file_name), ('r.dmc', dmc)):
+            if value:
+                clauses.append(f"{column} GLOB ?" if '*' in value else f"{column} = ?")
+                params.append(value)
+        if file_hash:
+            clauses.append("r.file_hash = ?")
+            params.append(file_hash)
+        if since:
+            clauses.append("u.started >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT u.started, u.source, u.model, r.file_name, r.file_hash, r.status, r.dmc, r.output_file, "
+               f"r.fallback, r.issue, r.dmc_parts FROM results r JOIN runs u ON u.run_id = r.run_id {where} "
+               f"ORDER BY u.started DESC, r.rowid DESC LIMIT ?")
+        with self._lock:
+            rows = self.conn.execute(sql, params + [limit]).fetchall()
+        columns = ('started', 'source', 'model', 'file_name', 'file_hash', 'status', 'dmc', 'output_file',
+                   'fallback', 'issue', 'dmc_parts')
+        return [dict(zip(columns, row), dmc_parts=json.loads(row[-1]) if row[-1] else None) for row in rows]
+
+    def cached_parts(self, file_hash, model, catalogue_fingerprint):
+        """
+        Returns the latest LLM (non-fallback) dmc_parts recorded for this document body with the
+        same model and catalogue, or None. Lets a wiped or new result cache start warm.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT r.dmc_parts FROM results r JOIN runs u ON u.run_id = r.run_id "
+                "WHERE r.file_hash = ? AND u.model = ? AND u.catalogue_fingerprint = ? "
+                "AND r.status = 'successful' AND r.fallback = 0 AND r.dmc_parts IS NOT NULL "
+                "ORDER BY u.started DESC LIMIT 1",
+                (file_hash, model, catalogue_fingerprint)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stats(self):
+        with self._lock:
+            runs = self.conn.execute("SELECT COUNT(*), MIN(started), MAX(started) FROM runs").fetchone()
+            results = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT file_name) FROM results").fetchone()
+        return {'runs': runs[0], 'first_run': runs[1], 'last_run': runs[2], 'results': results[0], 'files': results[1]}
+
+
+# --- LOG PARSERS (one per historical schema) ---
+
+def parse_processing_log(path):
+    """dmc_processing_log_*.json (classic) or .jsonl (streaming). Returns (header, [(status, entry)])."""
+    if path.endswith('.jsonl'):
+        from dmc_log import read_records
+        header, results = {}, []
+        for record in read_records(path):
+            kind = record.pop('type', None)
+            if kind == 'run':
+                header = record
+            elif kind in ('successful', 'failed'):
+                results.append((kind, record))
+        return header, results
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    results = [('successful', entry) for entry in data.get('successful', [])]
+    results += [('failed', entry) for entry in data.get('failed', [])]
+    return data, results
+
+
+def parse_summary(path):
+    """summary_*.json from the earlier CLI: original_file/new_file with llm_derived_parts or derived_codes."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for entry in data.get('successful', []):
+        yield 'successful', {
+            'file': entry.get('original_file'),
+            'assigned_dmc': entry.get('assigned_dmc') or dmc_from_filename(entry.get('new_file')),
+            'output_file': os.path.basename(entry.get('new_file') or ''),
+            'dmc_parts': entry.get('llm_derived_parts') or entry.get('derived_codes'),
+        }
+    for entry in data.get('failed', []):
+        yield 'failed', {'file': entry.get('file') or entry.get('original_file'),
+                         'issue': entry.get('issue') or entry.get('reason')}
+
+
+def parse_run_log(path):
+    """run_*.log text logs: '--- Processing: X ---' followed by 'Successfully created: NEW' or an error."""
+    current, last_problem, model, results = None, None, None, []
+
+    def finish():
+        if current:
+            results.append(('failed', {'file': current, 'issue': last_problem or 'No output recorded', 'model': model}))
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = LOG_LINE_PATTERN.match(line.rstrip('\n'))
+            if not match:
+                continue
+            level, message = match.group(2), match.group(3)
+            if message.startswith('--- Processing'):
+                finish()
+                current = message.split(':', 1)[-1].strip(' -')
+                last_problem = None
+            elif message.startswith('Querying LLM ('):
+                model = message[len('Querying LLM ('):].split(')')[0]
+            elif message.startswith('Successfully created:') and current:
+                output = message.split(':', 1)[1].strip().replace('\\', '/')
+                results.append(('successful', {'file': current, 'assigned_dmc': dmc_from_filename(output),
+                                               'output_file': os.path.basename(output), 'model': model}))
+                current = None
+            elif level in ('ERROR', 'CRITICAL'):
+                last_problem = message
+    finish()
+    return results
+
+
+# --- QUERY CLI ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the DMC run history (ingests new logs first).")
+    parser.add_argument("--db", default=DEFAULT_HISTORY_PATH, help=f"history database (default: {DEFAULT_HISTORY_PATH})")
+    parser.add_argument("--logs-dir", default="logs", help="folder with the processing logs to ingest (default: logs)")
+    parser.add_argument("--no-ingest", action="store_true", help="query without scanning the logs folder for new files")
+    parser.add_argument("--file", help="document file name ('*' wildcards allowed)")
+    parser.add_argument("--hash", help="SHA-256 of the document, or a path to the document")
+    parser.add_argument("--dmc", help="assigned DMC ('*' wildcards allowed, e.g. 'DMC-P15-A-C2-*')")
+    parser.add_argument("--since", help="only runs started on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    history = RunHistory(args.db)
+    if not args.no_ingest and os.path.isdir(args.logs_dir):
+        started = time.perf_counter()
+        added = history.ingest_logs(args.logs_dir)
+        if added:
+            print(f"Ingested {added} log file(s) in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+
+    file_hash = args.hash
+    if file_hash and os.path.isfile(file_hash):
+        from dmc_cache import hash_file
+        file_hash = hash_file(file_hash)
+
+    if not (args.file or file_hash or args.dmc or args.since):
+        stats = history.stats()
+        print(f"{stats['runs']} runs ({stats['first_run']} .. {stats['last_run']}), "
+              f"{stats['results']} results for {stats['files']} distinct files")
+        return 0
+
+    started = time.perf_counter()
+    rows = history.lookup(args.file, file_hash, args.dmc, args.since, args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            outcome = row['dmc'] or f"FAILED: {row['issue']}"
+            print(f"{row['started'] or '?':19}  {row['file_name']}  ->  {outcome}  [{row['source']}]")
+    print(f"{len(rows)} result(s) in {elapsed_ms:.1f} ms", file=sys.stderr)
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
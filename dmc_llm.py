@@ -0,0 +1,290 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+
+# --- CANCELLATION ---
+
+class Cancelled(Exception):
+    """Raised at a checkpoint or inside an LLM request once processing has been stopped."""
+
+
+class CancelToken:
+    """
+    Stop/pause signal shared between the UI and a processing thread.
+
+    The worker calls checkpoint() between stages: it blocks while paused and raises
+    Cancelled once stopped. In-flight HTTP requests register a callback that closes
+    their connection when cancel() is called.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # wake a paused worker so it can observe the stop
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def checkpoint(self):
+        """Blocks while paused; raises Cancelled if processing was stopped."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+    def add_callback(self, callback):
+        """Registers callback to run on cancel(). Returns a function that unregisters it."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+        def unregister():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return unregister
+
+
+# --- OLLAMA CLIENT ---
+
+def ollama_generate(url, payload, timeout=180, cancel_token=None):
+    """
+    Sends a /api/generate request and returns the final response object, shaped like
+    a non-streaming reply ('response' holds the full text, plus Ollama's timing stats).
+
+    With a cancel token the reply is streamed, so a stop is noticed between generated
+    tokens; the connection is then closed, which also makes Ollama stop generating.
+    """
+    import requests
+
+    if cancel_token is None:
+        response = requests.post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    cancel_token.checkpoint()
+    with requests.post(url, json=dict(payload, stream=True), timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        unregister = cancel_token.add_callback(response.close)
+        parts, final = [], {}
+        try:
+            for line in response.iter_lines():
+                if cancel_token.cancelled:
+                    raise Cancelled()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise RuntimeError(chunk['error'])
+                parts.append(chunk.get('response', ''))
+                if chunk.get('done'):
+                    final = chunk
+                    break
+        except Cancelled:
+            raise
+        except Exception:
+            # Closing the connection from cancel() surfaces as a read error here
+            if cancel_token.cancelled:
+                raise Cancelled()
+            raise
+        finally:
+            unregister()
+    final['response'] = ''.join(parts)
+    return final
+
+
+# --- MODEL WARM-UP ---
+
+# keep_alive sent with every request of a batch. Each request renews it, so the model stays
+# loaded for the whole batch and is unloaded this long after the last document.
+BATCH_KEEP_ALIVE = "30m"
+# keep_alive restored when a batch ends (Ollama's own default)
+IDLE_KEEP_ALIVE = "5m"
+
+
+def _ms(nanoseconds):
+    return round((nanoseconds or 0) / 1e6, 1)
+
+
+class ModelWarmup:
+    """
+    Loads a model into Ollama in a background thread with an empty prompt, so the load
+    overlaps with catalogue loading and text extraction instead of delaying the first
+    document. Requests call wait() before their first generate so the load time is not
+    counted as their latency; stats holds Ollama's load_duration separately.
+    """
+
+    def __init__(self, url, model, keep_alive=BATCH_KEEP_ALIVE, timeout=300):
+        self.url = url
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.stats = None
+        self._done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            reply = ollama_generate(self.url, {"model": self.model, "prompt": "", "stream": False,
+                                               "keep_alive": self.keep_alive}, timeout=self.timeout)
+            self.stats = {"model": self.model, "load_ms": _ms(reply.get('load_duration')),
+                          "warmup_ms": round((time.perf_counter() - started) * 1000, 1), "keep_alive": self.keep_alive}
+            logging.info(f"Model {self.model} ready: load {self.stats['load_ms']:.0f} ms "
+                         f"(warm-up {self.stats['warmup_ms']:.0f} ms), kept loaded for {self.keep_alive} after each request")
+        except Exception as e:
+            self.stats = {"model": self.model, "error": str(e),
+                          "warmup_ms": round((time.perf_counter() - started) * 1000, 1)}
+            logging.warning(f"Model warm-up failed: {e}")
+        finally:
+            self._done.set()
+
+    @property
+    def succeeded(self):
+        return self._done.is_set() and 'error' not in self.stats
+
+    def wait(self, timeout=None):
+        """Blocks until the warm-up finished (or timeout). Returns its stats, None while still loading."""
+        self._done.wait(timeout)
+        return self.stats
+
+
+def release_model(url, model, keep_alive=IDLE_KEEP_ALIVE):
+    """Ends the batch pin: the model is unloaded keep_alive after now, as after any normal request."""
+    try:
+        ollama_generate(url, {"model": model, "prompt": "", "stream": False, "keep_alive": keep_alive}, timeout=30)
+    except Exception as e:
+        logging.warning(f"Could not reset keep_alive for {model}: {e}")
+
+
+# --- ADAPTIVE CONCURRENCY ---
+
+class AdaptiveConcurrency:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on in-flight Ollama requests.
+
+    Ollama reports how long it actually computed (load, prompt_eval and eval durations);
+    the rest of the wall-clock latency is time the request spent queued behind others.
+    While requests are not queueing, the limit grows by one per window of `limit`
+    successful requests. When queueing exceeds queue_tolerance x compute time, latency
+    passes latency_ceiling, or a request times out / gets a 5xx, the limit is halved.
+    Only one decrease is applied per window so a burst of slow replies counts once.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial=1, queue_tolerance=0.5, min_queue_seconds=1.0,
+                 latency_ceiling=90.0, decrease_factor=0.5):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.queue_tolerance = queue_tolerance
+        self.min_queue_seconds = min_queue_seconds
+        self.latency_ceiling = latency_ceiling
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._successes = 0
+        self._epoch = 0
+        self._started = time.monotonic()
+        self._cond = threading.Condition()
+        # (seconds since start, new limit, reason) - the concurrency curve of the run
+        self.decisions = [(0.0, self.limit, "initial")]
+
+    @contextmanager
+    def request(self):
+        """
+        Holds one in-flight slot around an Ollama call. Set `.stats` on the yielded object
+        to the decoded reply so its timings feed the controller; exceptions are classified
+        (timeouts and 5xx count as overload) and re-raised.
+        """
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            epoch = self._epoch
+        slot = _RequestSlot()
+        started = time.perf_counter()
+        try:
+            yield slot
+        except Exception as e:
+            reason = overload_reason(e)
+            with self._cond:
+                if reason:
+                    self._decrease(epoch, reason)
+            raise
+        else:
+            self._observe(epoch, time.perf_counter() - started, slot.stats or {})
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def _observe(self, epoch, latency, stats):
+        compute = sum(stats.get(k) or 0 for k in ('load_duration', 'prompt_eval_duration', 'eval_duration')) / 1e9
+        queued = max(0.0, latency - compute) if compute else 0.0
+        with self._cond:
+            if latency > self.latency_ceiling:
+                self._decrease(epoch, f"latency {latency:.1f}s over {self.latency_ceiling:.0f}s")
+            elif queued > self.min_queue_seconds and queued > self.queue_tolerance * compute:
+                self._decrease(epoch, f"queued {queued:.1f}s vs {compute:.1f}s compute")
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self._change(self.limit + 1, f"latency {latency:.1f}s, queued {queued:.1f}s")
+
+    def _decrease(self, epoch, reason):
+        # Replies to requests sent before the last change describe the old limit
+        if epoch != self._epoch or self.limit <= self.min_limit:
+            return
+        self._change(max(self.min_limit, int(self.limit * self.decrease_factor)), reason)
+
+    def _change(self, new_limit, reason):
+        logging.info(f"Concurrency {self.limit} -> {new_limit} ({reason})")
+        self.limit = new_limit
+        self._successes = 0
+        self._epoch += 1
+        self.decisions.append((round(time.monotonic() - self._started, 1), new_limit, reason))
+        self._cond.notify_all()
+
+
+class _RequestSlot:
+    stats = None
+
+
+def overload_reason(error):
+    """Returns why error indicates an overloaded server (timeout, HTTP 5xx/429), or None."""
+    import requests
+
+    if isinstance(error, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status >= 500 or status == 429:
+            return f"HTTP {status}"
+    return None
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+
+
+# --- STREAMING PROCESSING LOG ---
+
+# jsonl - one JSON record per line, written as each document completes (default)
+# json  - the same stream, converted to the classic dmc_processing_log_*.json shape at the end
+LOG_FORMATS = ('jsonl', 'json')
+
+
+class StreamingLogWriter:
+    """
+    Writes the processing log one record per document as results arrive, instead of
+    holding every entry in memory until the end of the run.
+
+    File layout (JSON Lines):
+        {"type": "run", "started": ..., "data_sources": {...}, ...}     first line
+        {"type": "successful", "file": ..., "assigned_dmc": ..., ...}   one per document
+        {"type": "failed", "file": ..., "issue": ...}
+        {"type": "summary", "successful": N, "failed": M, ...}          last line
+    Use convert_to_legacy() (or `python dmc_log.py FILE.jsonl`) for the old shape.
+    Entries are also recorded in the run history database when one is given (see dmc_history.py).
+    """
+
+    def __init__(self, log_path, data_sources, history=None, **run_info):
+        self.log_path = log_path
+        self.counts = {'successful': 0, 'failed': 0}
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+        self._file = open(log_path, 'w', encoding='utf-8')
+        started = self.started.isoformat(timespec='seconds')
+        self._write_record(dict({"type": "run", "started": started, "data_sources": data_sources}, **run_info))
+        self._history = history
+        if history is not None:
+            self._history_run = history.start_run(
+                os.path.basename(log_path), started, 'jsonl',
+                model=(run_info.get('run_settings') or {}).get('model'),
+                catalogue_fingerprint=data_sources.get('catalogue_fingerprint'))
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def _write_record(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            # One flush per document keeps the log usable if the process dies mid-run
+            self._file.flush()
+
+    def write(self, status, entry):
+        """Appends one document's log entry. status is 'successful' or 'failed'."""
+        with self._lock:
+            self.counts[status] += 1
+        self._write_record(dict({"type": status}, **entry))
+        if self._history is not None:
+            self._history.record(self._history_run, status, entry)
+
+    def close(self, **summary):
+        """Writes the closing summary record (plus any extra fields given) and closes the file."""
+        finished = datetime.now()
+        self._write_record(dict({
+            "type": "summary",
+            "finished": finished.isoformat(timespec='seconds'),
+            "duration_seconds": round((finished - self.started).total_seconds(), 1),
+            "successful": self.counts['successful'],
+            "failed": self.counts['failed'],
+        }, **summary))
+        self._file.close()
+
+
+def read_records(jsonl_path):
+    """Yields the records of a streaming log, skipping a torn last line from an interrupted run."""
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def convert_to_legacy(jsonl_path, json_path=None):
+    """
+    Converts a streaming log to the classic dmc_processing_log_*.json layout
+    ({"data_sources": ..., "successful": [...], "failed": [...]}). The file is read in
+    two passes and entries are written one at a time, so memory stays flat.
+    Returns the path written.
+    """
+    json_path = json_path or os.path.splitext(jsonl_path)[0] + '.json'
+
+    header, summary = {}, {}
+    for record in read_records(jsonl_path):
+        if record.get('type') == 'run':
+            header = record
+        elif record.get('type') == 'summary':
+            summary = record
+
+    def entries(status):
+        for record in read_records(jsonl_path):
+            if record.get('type') == status:
+                entry = dict(record)
+                del entry['type']
+                yield entry
+
+    def write_list(f, key, items, last):
+        f.write(f'    "{key}": [')
+        first = True
+        for item in items:
+            f.write('\n' if first else ',\n')
+            f.write('\n'.join('        ' + line for line in json.dumps(item, indent=4).splitlines()))
+            first = False
+        f.write('\n    ]' if not first else ']')
+        f.write('\n' if last else ',\n')
+
+    # Everything from the header/summary except the bookkeeping fields is carried over
+    extra = {k: v for k, v in header.items() if k not in ('type', 'started', 'data_sources')}
+    extra.update({k: v for k, v in summary.items() if k not in ('type', 'finished', 'duration_seconds', 'successful', 'failed')})
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        f.write('    "data_sources": ' + json.dumps(header.get('data_sources', {}), indent=4).replace('\n', '\n    ') + ',\n')
+        for key, value in extra.items():
+            f.write(f'    {json.dumps(key)}: ' + json.dumps(value, indent=4).replace('\n', '\n    ') + ',\n')
+        write_list(f, 'successful', entries('successful'), last=False)
+        write_list(f, 'failed', entries('failed'), last=True)
+        f.write('}')
+    return json_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert streaming dmc_processing_log_*.jsonl files to the classic JSON log format.")
+    parser.add_argument("jsonl_files", nargs='+', metavar="FILE.jsonl")
+    parser.add_argument("-o", "--output", help="output path (only with a single input file)")
+    args = parser.parse_args(argv)
+    if args.output and len(args.jsonl_files) > 1:
+        parser.error("--output can only be used with a single input file")
+    for jsonl_path in args.jsonl_files:
+        print(f"{jsonl_path} -> {convert_to_legacy(jsonl_path, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import re
+import errno
+import shutil
+import threading
+
+
+# --- OUTPUT NAME ALLOCATION ---
+
+DUPLICATE_SUFFIX_PATTERN = re.compile(r'^(?P<dmc>.+?)(?:__(?P<counter>\d{3,}))?$')
+
+
+def format_output_filename(dmc, counter, extension='.docx'):
+    """Builds the output filename for a DMC, appending the duplicate counter when needed."""
+    if counter:
+        return f"{dmc}__{counter:03d}{extension}"
+    return f"{dmc}{extension}"
+
+
+class OutputNameIndex:
+    """
+    In-memory index of the DMC-named files already present in an output folder.
+
+    The folder is scanned once with os.scandir; after that the next free counter
+    for each DMC is handed out from memory under a lock. Reservations are backed
+    by an O_EXCL placeholder file so that separate processes writing into the same
+    folder never clobber each other - a name taken behind our back is simply skipped.
+    """
+
+    def __init__(self, output_dir, extension='.docx'):
+        self.output_dir = output_dir
+        self.extension = extension
+        self._lock = threading.Lock()
+        self._next_counter = {}
+        self._scan()
+
+    def _scan(self):
+        if not os.path.isdir(self.output_dir):
+            return
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if not name.endswith(self.extension):
+                    continue
+                match = DUPLICATE_SUFFIX_PATTERN.match(name[:-len(self.extension)])
+                if not match:
+                    continue
+                counter = int(match.group('counter') or 0)
+                dmc = match.group('dmc')
+                if counter + 1 > self._next_counter.get(dmc, 0):
+                    self._next_counter[dmc] = counter + 1
+
+    def _take_counter(self, dmc):
+        with self._lock:
+            counter = self._next_counter.get(dmc, 0)
+            self._next_counter[dmc] = counter + 1
+            return counter
+
+    def reserve(self, dmc, create=True):
+        """
+        Reserves the next free output name for a DMC.
+        Returns (filename, output_path, counter); counter is 0 when the bare DMC name was free.
+        With create=False only the in-memory index is consulted and no placeholder is written.
+        """
+        while True:
+            counter = self._take_counter(dmc)
+            filename = format_output_filename(dmc, counter, self.extension)
+            output_path = os.path.join(self.output_dir, filename)
+            if not create:
+                return filename, output_path, counter
+            try:
+                fd = os.open(output_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                # Created by another worker or process since the scan - try the next counter
+                continue
+            os.close(fd)
+            return filename, output_path, counter
+
+    def release(self, output_path):
+        """Removes the placeholder of a reservation whose file could not be written."""
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+
+
+# --- OUTPUT MATERIALIZATION ---
+
+# copy     - full byte copy (shutil.copy2), always safe
+# hardlink - new directory entry for the input's bytes; edits to either file show in both
+# reflink  - copy-on-write clone via the FICLONE ioctl (btrfs, XFS, ...), safe and zero-copy
+# symlink  - link pointing back at the input file
+# manifest - nothing is written, the log records the input -> DMC name mapping
+# auto     - reflink when input and output share a filesystem that supports it, else copy
+OUTPUT_MODES = ('auto', 'copy', 'hardlink', 'reflink', 'symlink', 'manifest')
+DEFAULT_OUTPUT_MODE = 'auto'
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_reflink_unsupported_devices = set()
+
+
+def same_filesystem(source_path, output_dir):
+    """True if the input file and the output folder live on the same device."""
+    try:
+        return os.stat(source_path).st_dev == os.stat(output_dir).st_dev
+    except OSError:
+        return False
+
+
+def reflink_file(source_path, output_path):
+    """Clones source_path into output_path with FICLONE. Raises OSError where unsupported."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(source_path, 'rb') as src, open(output_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source_path, output_path)
+
+
+def _link_over(link_func, source, output_path):
+    # Link under a temporary name and rename over the reserved placeholder,
+    # so the output name is never free for another writer to grab.
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    link_func(source, temp_path)
+    try:
+        os.replace(temp_path, output_path)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+def materialize_output(source_path, output_path, mode=DEFAULT_OUTPUT_MODE):
+    """
+    Makes the renamed output file available at output_path using the given output mode.
+    Returns the mode actually used - for 'auto' that is the concrete mode it resolved to.
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{mode}'. Expected one of: {', '.join(OUTPUT_MODES)}")
+
+    if mode == 'manifest':
+        return 'manifest'
+
+    if mode == 'auto':
+        device = None
+        output_dir = os.path.dirname(output_path) or '.'
+        if same_filesystem(source_path, output_dir):
+            device = os.stat(output_dir).st_dev
+        if device is not None and device not in _reflink_unsupported_devices:
+            try:
+                reflink_file(source_path, output_path)
+                return 'reflink'
+            except OSError:
+                _reflink_unsupported_devices.add(device)
+        shutil.copy2(source_path, output_path)
+        return 'copy'
+
+    if mode == 'reflink':
+        reflink_file(source_path, output_path)
+    elif mode == 'hardlink':
+        _link_over(os.link, source_path, output_path)
+    elif mode == 'symlink':
+        _link_over(os.symlink, os.path.abspath(source_path), output_path)
+    else:
+        shutil.copy2(source_path, output_path)
+    return mode
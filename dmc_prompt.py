@@ -0,0 +1,255 @@
+import re
+import threading
+from collections import namedtuple
+
+
+# --- TOKEN-BUDGETED PROMPTS ---
+
+# Largest context window requested from Ollama; num_ctx is chosen per request up to this
+DEFAULT_CONTEXT_TOKENS = 8192
+NUM_CTX_STEPS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+# First-pass share of the free budget per section, filled in this priority order.
+# Whatever a section does not need is handed to the next truncated section in a second pass.
+SECTION_SHARES = (('headings', 0.10), ('body', 0.40), ('catalogue', 0.50))
+# Info codes get at most this part of the catalogue budget when both lists must be shortlisted
+INFO_CODE_SHARE = 0.3
+# Info code groups included in prompts, in display order
+INFO_CODE_TYPES = ('proced', 'descript', 'fault', 'process', 'sched')
+# Tokens kept free for tokenizer differences between the estimate and the model
+SAFETY_MARGIN = 0.05
+
+WORD_PATTERN = re.compile(r'[a-z][a-z0-9]{2,}')
+STOPWORDS = frozenset("""
+    the and for with that this from are was were been has have had not but all any can may must
+    shall should will its into onto than then there these those their which when where who how
+    what use used using also only each per other system systems general information
+""".split())
+
+CatalogueEntry = namedtuple('CatalogueEntry', 'text keywords group')
+
+
+def keywords(text):
+    return frozenset(w for w in WORD_PATTERN.findall(text.lower()) if w not in STOPWORDS)
+
+
+class TokenEstimator:
+    """
+    Character-based token estimate, calibrated against the exact prompt_eval_count
+    Ollama reports. No tokenizer package is needed and the ratio converges to the
+    configured model's tokenizer after a few requests.
+    """
+
+    def __init__(self, chars_per_token=3.5):
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+
+    def count(self, text):
+        return self.tokens_for(len(text)) if text else 0
+
+    def tokens_for(self, chars):
+        return int(chars / self.chars_per_token) + 1 if chars else 0
+
+    def chars_for(self, tokens):
+        return max(0, int(tokens * self.chars_per_token))
+
+    def calibrate(self, text, actual_tokens):
+        """Updates the ratio from a prompt and the token count the server evaluated for it."""
+        if not actual_tokens or actual_tokens < 32:
+            return
+        observed = len(text) / actual_tokens
+        # A prompt partly served from Ollama's prompt cache reports fewer evaluated tokens than it has
+        if observed > self.chars_per_token * 1.5:
+            return
+        with self._lock:
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * observed
+
+
+# Shared by all requests of a process so calibration carries over between documents
+ESTIMATOR = TokenEstimator()
+
+
+def _titled_line(code, data, definition_chars):
+    title = data.get('title', '')
+    definition = data.get('definition', '')[:definition_chars] if definition_chars else ''
+    return f"{code}: {title} - {definition}" if definition else f"{code}: {title}"
+
+
+def sns_catalogue_entries(sns_data, definition_chars=0, subsystems=True):
+    """
+    One entry per system: its line (optionally with a shortened definition) followed by its
+    subsystems, or the system line alone with subsystems=False.
+    """
+    entries = []
+    for code, data in sorted(sns_data.items()):
+        if not data.get('title', ''):
+            continue
+        lines = [_titled_line(code, data, definition_chars)]
+        for sub_code, sub_data in sorted(data.get('subsystems', {}).items()) if subsystems else ():
+            sub_title = sub_data.get('title', '')
+            if sub_title and sub_code not in ['00', '0']:  # Skip general subsystems
+                lines.append(f"  {code}-{sub_code}: {sub_title}")
+        text = '\n'.join(lines)
+        entries.append(CatalogueEntry(text, keywords(text), None))
+    return entries
+
+
+def subsystem_catalogue_entries(sns_data, system_code, definition_chars=0):
+    """The system line followed by one entry per subsystem of system_code (general subsystems included)."""
+    data = sns_data.get(system_code, {})
+    entries = [CatalogueEntry(_titled_line(system_code, data, definition_chars), frozenset(), None)]
+    for sub_code, sub_data in sorted(data.get('subsystems', {}).items()):
+        text = _titled_line(f"  {system_code}-{sub_code}", sub_data, definition_chars)
+        entries.append(CatalogueEntry(text, keywords(text), None))
+    return entries
+
+
+def info_catalogue_entries(info_codes):
+    """One entry per info code of the prompt types, grouped by type."""
+    entries = []
+    for code_type in INFO_CODE_TYPES:
+        for code, data in sorted(info_codes.items()):
+            desc = data.get('description', '')
+            if data.get('type', 'other') == code_type and desc:
+                text = f"{code}: {desc}"
+                entries.append(CatalogueEntry(text, keywords(text), code_type))
+    return entries
+
+
+def entry_lengths(entries):
+    """Text length of each entry; a sequence with text_lengths() (a mapped catalogue) answers without decoding its entries."""
+    text_lengths = getattr(entries, 'text_lengths', None)
+    return text_lengths() if text_lengths else [len(e.text) for e in entries]
+
+
+def entry_keywords(entries):
+    """Keywords of each entry; a sequence with keyword_lists() answers without decoding the entry texts."""
+    keyword_lists = getattr(entries, 'keyword_lists', None)
+    return keyword_lists() if keyword_lists else [e.keywords for e in entries]
+
+
+def render_entries(entries):
+    lines, group = [], None
+    for entry in entries:
+        if entry.group != group:
+            group = entry.group
+            lines.append(f"\n[{group.upper()}]")
+        lines.append(entry.text)
+    return '\n'.join(lines)
+
+
+def choose_num_ctx(tokens, context_tokens=DEFAULT_CONTEXT_TOKENS):
+    """Smallest standard context size that holds tokens, capped at context_tokens."""
+    for step in NUM_CTX_STEPS:
+        if step >= tokens:
+            return min(step, context_tokens)
+    return context_tokens
+
+
+class PromptBuilder:
+    """
+    Fills a prompt template up to a token budget instead of fixed character slices.
+
+    The template is a str.format string with {headings}, {body}, {body_chars},
+    {sns_context} and {info_context}. Sections are filled in priority order - headings,
+    body excerpt, then the catalogue shortlisted by keyword overlap with the document -
+    so the prompt always fits the num_ctx that is sent with it. A template without
+    {headings} still uses the headings to shortlist the catalogue, and its headings
+    share goes to the body. The entry sequences are only read in full for the entries
+    that go into the prompt (see entry_lengths and entry_keywords).
+    """
+
+    def __init__(self, template, context_tokens=DEFAULT_CONTEXT_TOKENS, output_tokens=300, estimator=ESTIMATOR):
+        self.template = template
+        self.context_tokens = context_tokens
+        self.output_tokens = output_tokens
+        self.estimator = estimator
+        shares = dict(SECTION_SHARES)
+        if '{headings}' not in template:
+            shares['body'] += shares.pop('headings')
+            shares['headings'] = 0.0
+        self.shares = tuple((name, shares[name]) for name, _ in SECTION_SHARES)
+
+    def available_tokens(self):
+        fixed = self.estimator.count(self.template.format(headings='', body='', body_chars=0, sns_context='', info_context=''))
+        return int(self.context_tokens * (1 - SAFETY_MARGIN)) - self.output_tokens - fixed
+
+    def body_limit_chars(self, headings_text=''):
+        """Characters of body text a prompt can include when the body gets its full share (used to decide on map-reduce)."""
+        available = self.available_tokens()
+        (_, headings_share), (_, body_share), _ = self.shares
+        headings = min(self.estimator.count(headings_text or ''), int(available * headings_share))
+        return self.estimator.chars_for((available - headings) * body_share / (1 - headings_share))
+
+    def body_budget(self):
+        """Tokens of body text that are never truncated, whatever the other sections need."""
+        return int(max(0, self.available_tokens()) * self.shares[1][1])
+
+    def build(self, headings_text, body_text, sns_entries, info_entries):
+        """Returns (prompt, report); report holds the token breakdown and the num_ctx to request."""
+        count = self.estimator.count
+        headings_text = headings_text or "No headings."
+        body_text = body_text or "No content."
+        available = max(0, self.available_tokens())
+        need = {
+            'headings': count(headings_text) if self.shares[0][1] else 0,
+            'body': count(body_text),
+            'catalogue': sum(self.entry_costs(sns_entries)) + sum(self.entry_costs(info_entries)),
+        }
+        alloc = {name: min(need[name], int(available * share)) for name, share in self.shares}
+        spare = available - sum(alloc.values())
+        for name, _ in self.shares:
+            extra = min(need[name] - alloc[name], spare)
+            alloc[name] += extra
+            spare -= extra
+
+        headings = headings_text[:self.estimator.chars_for(alloc['headings'])]
+        body = body_text[:self.estimator.chars_for(alloc['body'])]
+        # Headings the template does not show are not sent, so they can steer the shortlist in full
+        shortlist_headings = headings if self.shares[0][1] else headings_text
+        sns, info = self.shortlist(f"{shortlist_headings}\n{body}", shortlist_headings, sns_entries, info_entries,
+                                   alloc['catalogue'])
+
+        prompt = self.template.format(headings=headings, body=body, body_chars=len(body),
+                                      sns_context=render_entries(sns), info_context=render_entries(info))
+        prompt_tokens = count(prompt)
+        report = {
+            "prompt_tokens": prompt_tokens,
+            "headings_tokens": count(headings),
+            "body_tokens": count(body),
+            "headings_chars": len(headings),
+            "body_chars": len(body),
+            "body_truncated": len(body) < len(body_text),
+            "catalogue_tokens": sum(count(e.text) + 1 for e in sns + info),
+            "sns_systems": f"{len(sns)}/{len(sns_entries)}",
+            "info_codes": f"{len(info)}/{len(info_entries)}",
+            "num_ctx": choose_num_ctx(prompt_tokens + self.output_tokens, self.context_tokens),
+        }
+        return prompt, report
+
+    def entry_costs(self, entries):
+        """Prompt tokens of each entry, its line break included."""
+        return [self.estimator.tokens_for(length) + 1 for length in entry_lengths(entries)]
+
+    def shortlist(self, document_text, headings_text, sns_entries, info_entries, budget):
+        """Picks the catalogue entries most related to the document that fit budget, kept in catalogue order."""
+        count = self.estimator.count
+        info_costs, sns_costs = self.entry_costs(info_entries), self.entry_costs(sns_entries)
+        info_budget = min(sum(info_costs), max(int(budget * INFO_CODE_SHARE), budget - sum(sns_costs)))
+        document_words, heading_words = keywords(document_text), keywords(headings_text)
+
+        def select(entries, costs, limit):
+            if sum(costs) <= limit:
+                return list(entries)
+            # Heading matches count three times; ties keep catalogue order. Only the chosen entries are read.
+            scores = [3 * len(heading_words.intersection(words)) + len(document_words.intersection(words))
+                      for words in entry_keywords(entries)]
+            chosen, used = [], 0
+            for i in sorted(range(len(costs)), key=lambda i: (-scores[i], i)):
+                if used + costs[i] <= limit:
+                    chosen.append(i)
+                    used += costs[i]
+            return [entries[i] for i in sorted(chosen)]
+
+        info = select(info_entries, info_costs, info_budget)
+        sns = select(sns_entries, sns_costs, budget - sum(count(e.text) + 1 for e in info))
+        return sns, info
@@ -0,0 +1,186 @@
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# --- SHARED WORK QUEUE ---
+
+# Unit states: pending -> leased -> done | failed. Expired leases go back to the pool.
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    file_hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    issue TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_expires);
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of content-hash keyed work units, shared by one coordinator
+    and any number of worker processes (on other machines via a shared folder).
+
+    Each unique document body is one unit, so byte-identical files under different
+    names are classified once. Workers lease units for a limited time; a unit whose
+    worker died is handed out again once its lease expires.
+
+    The queue holds one run at a time: enqueue() replaces the file list, drops units no
+    file refers to and, when the run key (model, catalogue, prompt mode) changed, resets
+    every unit so no result of the previous configuration is reused. With the same run
+    key, finished units are kept (a restarted coordinator resumes) and failed ones retried.
+    """
+
+    def __init__(self, db_path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE transactions
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        # One connection is shared by the worker threads of a process
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+    # --- run metadata (written by the coordinator, read by workers) ---
+
+    def set_meta(self, key, value):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_meta(self, key, default=None):
+        rows = self._execute("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    # --- coordinator side ---
+
+    def enqueue(self, files, run_key):
+        """
+        Makes (filename, file_hash) pairs the files of this run. run_key identifies everything
+        besides the document that shapes a result. Returns the number of units to classify.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'run_key'").fetchone()
+            if row is None or json.loads(row[0]) != run_key:
+                # Another model, catalogue or prompt mode: earlier results do not apply
+                conn.execute("UPDATE units SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = 0, "
+                             "result = NULL, issue = NULL, updated = ?", (now,))
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run_key', ?)", (json.dumps(run_key),))
+            else:
+                conn.execute("UPDATE units SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = 0, "
+                             "issue = NULL, updated = ? WHERE state = 'failed'", (now,))
+            conn.execute("DELETE FROM files")
+            for filename, file_hash in files:
+                conn.execute("INSERT OR REPLACE INTO files (filename, file_hash) VALUES (?, ?)", (filename, file_hash))
+                conn.execute("INSERT OR IGNORE INTO units (file_hash, filename, updated) VALUES (?, ?, ?)",
+                             (file_hash, filename, now))
+            conn.execute("DELETE FROM units WHERE file_hash NOT IN (SELECT file_hash FROM files)")
+            return conn.execute("SELECT COUNT(*) FROM units WHERE state != 'done'").fetchone()[0]
+
+    def counts(self):
+        """Returns the number of units per state."""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for state, count in self._execute("SELECT state, COUNT(*) FROM units GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def is_finished(self):
+        # Leases of dead workers expire here too, so a queue without any live worker does not look busy forever
+        self.reap_expired()
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def reap_expired(self):
+        """Returns expired leases to the pool, or fails units whose lease expired max_attempts times."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE units SET state = 'failed', issue = 'Lease expired too many times (worker crashed or hung).', updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            conn.execute(
+                "UPDATE units SET state = 'pending', worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ?",
+                (now, now))
+
+    def abandon_pending(self, issue):
+        """Fails every unit still waiting for a worker. Returns the number of units failed."""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE units SET state = 'failed', issue = ?, updated = ? WHERE state = 'pending'",
+                                (issue, time.time())).rowcount
+
+    def file_results(self):
+        """Yields (filename, file_hash, state, dmc_parts, issue, worker) for the files of this run, sorted by filename."""
+        rows = self._execute(
+            "SELECT f.filename, f.file_hash, u.state, u.result, u.issue, u.worker FROM files f "
+            "JOIN units u ON u.file_hash = f.file_hash ORDER BY f.filename")
+        for filename, file_hash, state, result, issue, worker in rows:
+            yield filename, file_hash, state, json.loads(result) if result else None, issue, worker
+
+    # --- worker side ---
+
+    def lease(self, worker_id, batch_size=1):
+        """Leases up to batch_size pending (or expired) units. Returns a list of (file_hash, filename)."""
+        self.reap_expired()
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT file_hash, filename FROM units WHERE state = 'pending' AND attempts < ? "
+                "ORDER BY filename LIMIT ?",
+                (self.max_attempts, batch_size)).fetchall()
+            for file_hash, _ in rows:
+                conn.execute(
+                    "UPDATE units SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+                    "WHERE file_hash = ?",
+                    (worker_id, now + self.lease_seconds, now, file_hash))
+        return rows
+
+    def complete(self, file_hash, worker_id, dmc_parts):
+        """Reports a classified unit. Ignored if the lease was lost to another worker in the meantime."""
+        self._execute(
+            "UPDATE units SET state = 'done', result = ?, issue = NULL, updated = ? "
+            "WHERE file_hash = ? AND worker = ? AND state = 'leased'",
+            (json.dumps(dmc_parts), time.time(), file_hash, worker_id))
+
+    def fail(self, file_hash, worker_id, issue):
+        """Reports a unit that could not be classified."""
+        self._execute(
+            "UPDATE units SET state = 'failed', issue = ?, updated = ? "
+            "WHERE file_hash = ? AND worker = ? AND state = 'leased'",
+            (issue, time.time(), file_hash, worker_id))
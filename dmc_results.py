@@ -0,0 +1,78 @@
+import threading
+
+
+# --- RESULT STORE ---
+
+class ResultStore:
+    """
+    Column-oriented store of per-document results for the GUI results table.
+
+    Each field is a plain list indexed by row number, so appending a result from
+    the worker thread is cheap, and sorting or filtering only shuffles a list of
+    row indices - the rows themselves are never copied or rebuilt.
+    """
+
+    COLUMNS = ('file', 'dmc', 'confidence', 'reasoning', 'extract_ms', 'llm_ms', 'save_ms', 'total_ms', 'fallback', 'status')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.columns = {name: [] for name in self.COLUMNS}
+            self._search_keys = []
+            # Bumped on every change so views know when to re-query
+            self.version = getattr(self, 'version', 0) + 1
+
+    def __len__(self):
+        return len(self._search_keys)
+
+    def append(self, file, dmc='', confidence=None, reasoning='', timings=None, fallback=False, status='successful'):
+        """Adds one document's result. timings is a dict with extract_ms, llm_ms and save_ms (optional)."""
+        timings = timings or {}
+        try:
+            confidence = int(confidence) if confidence is not None else None
+        except (TypeError, ValueError):
+            confidence = None
+        values = {
+            'file': file,
+            'dmc': dmc,
+            'confidence': confidence,
+            'reasoning': reasoning or '',
+            'extract_ms': timings.get('extract_ms', 0),
+            'llm_ms': timings.get('llm_ms', 0),
+            'save_ms': timings.get('save_ms', 0),
+            'total_ms': sum(timings.get(k, 0) for k in ('extract_ms', 'llm_ms', 'save_ms')),
+            'fallback': fallback,
+            'status': status,
+        }
+        with self._lock:
+            for name in self.COLUMNS:
+                self.columns[name].append(values[name])
+            self._search_keys.append(f"{file}\n{dmc}\n{reasoning or ''}".lower())
+            self.version += 1
+
+    def row(self, index):
+        """Returns the row at index as a dict."""
+        return {name: self.columns[name][index] for name in self.COLUMNS}
+
+    def query(self, filter_text='', sort_column=None, descending=False):
+        """
+        Returns the row indices matching filter_text (case-insensitive substring of
+        file, DMC or reasoning), ordered by sort_column, or in arrival order.
+        """
+        with self._lock:
+            count = len(self._search_keys)
+            needle = filter_text.strip().lower()
+            if needle:
+                keys = self._search_keys
+                indices = [i for i in range(count) if needle in keys[i]]
+            else:
+                indices = list(range(count))
+            if sort_column:
+                column = self.columns[sort_column]
+                # None (e.g. no confidence from the fallback) sorts before any value
+                indices.sort(key=lambda i: (column[i] is not None, column[i] if column[i] is not None else 0),
+                             reverse=descending)
+        return indices
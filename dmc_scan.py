@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from dmc_cache import hash_file
+
+
+# --- INCREMENTAL INPUT SCANNING ---
+
+DEFAULT_SCAN_STATE_PATH = os.path.join("logs", "scan_state.json")
+# Bump when the state file layout changes; older files are then ignored (everything counts as new)
+SCAN_STATE_VERSION = 1
+DOCUMENT_SUFFIX = '.docx'
+# save() holds '<state file>.lock' while it merges; a lock older than this is left over from a crashed run
+SCAN_LOCK_STALE_SECONDS = 30
+SCAN_LOCK_POLL_SECONDS = 0.05
+
+
+def iter_documents(root, recursive=False, suffix=DOCUMENT_SUFFIX):
+    """
+    Yields (name, stat) for every file under root ending in suffix. name is the path relative
+    to root with '/' separators, so it joins onto root on any platform. Uses os.scandir, whose
+    entries carry the file type (and on Windows the size and mtime) from the directory listing
+    itself. Symlinked folders are not followed; unreadable subfolders are skipped with a warning.
+    """
+    pending = [('', root)]
+    while pending:
+        prefix, folder = pending.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(suffix):
+                        yield prefix + entry.name, entry.stat()
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        pending.append((prefix + entry.name + '/', entry.path))
+        except OSError as e:
+            if folder == root:
+                raise
+            logging.warning(f"Skipping unreadable folder '{folder}': {e}")
+
+
+def list_documents(root, recursive=False, suffix=DOCUMENT_SUFFIX):
+    """Sorted names (relative to root) of the documents in root."""
+    return sorted(name for name, _ in iter_documents(root, recursive, suffix))
+
+
+@contextmanager
+def state_file_lock(lock_path):
+    """Holds an O_EXCL lock file for as long as the block runs, taking over stale ones."""
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > SCAN_LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue  # released meanwhile
+            time.sleep(SCAN_LOCK_POLL_SECONDS)
+    os.close(fd)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+class DocumentScanner:
+    """
+    Finds the documents in an input folder that are new or changed since they were last
+    processed successfully.
+
+    The state file records (size, mtime, SHA-256) per processed document, per input folder.
+    A document whose size and mtime match its record is skipped without being opened, so a
+    rerun over an unchanged tree costs one directory walk. When only the mtime moved (copied
+    or touched, same bytes) the document is hashed once, its record updated and it is still
+    skipped. Documents are recorded with mark_done() after they were processed, so failed and
+    unfinished ones are found again on the next run; save() persists the records and drops
+    those of documents no longer in the folder. save() re-reads the state file under a lock
+    file and merges only this run's changes, so concurrent runs over the same folder (one per
+    --shard) keep each other's records.
+    """
+
+    def __init__(self, state_path, root, recursive=False, suffix=DOCUMENT_SUFFIX):
+        self.state_path = state_path
+        self.root = root
+        self.recursive = recursive
+        self.suffix = suffix
+        self.key = os.path.normcase(os.path.abspath(root))
+        self.lock = threading.Lock()
+        self.folders = self._read()
+        self.records = self.folders.get(self.key, {})
+        # Records this run added or refreshed, and documents it found removed; what save() merges
+        self.updated = {}
+        self.removed = set()
+        self.seen = None
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+    def _read(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("version") == SCAN_STATE_VERSION:
+                return state["folders"]
+            logging.info(f"Scan state '{self.state_path}' is from another version; rescanning everything")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logging.warning(f"Could not read scan state '{self.state_path}': {e}; rescanning everything")
+        return {}
+
+    def scan(self):
+        """Returns the sorted names of the new and changed documents. Raises OSError if root is unreadable."""
+        pending = []
+        counts = dict.fromkeys(self.counts, 0)
+        seen = {}
+        for name, stat in iter_documents(self.root, self.recursive, self.suffix):
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            record = self.records.get(name)
+            seen[name] = [size, mtime_ns, None]
+            if record is None:
+                counts["new"] += 1
+                pending.append(name)
+                continue
+            if record[0] == size and record[1] == mtime_ns:
+                seen[name][2] = record[2]
+                counts["unchanged"] += 1
+                continue
+            try:
+                file_hash = hash_file(os.path.join(self.root, name))
+            except OSError:
+                file_hash = None
+            seen[name][2] = file_hash
+            if file_hash is not None and file_hash == record[2]:
+                with self.lock:
+                    self.records[name] = self.updated[name] = [size, mtime_ns, file_hash]
+                counts["unchanged"] += 1
+            else:
+                counts["changed"] += 1
+                pending.append(name)
+        self.removed = {name for name in self.records if name not in seen}
+        counts["removed"] = len(self.removed)
+        self.seen, self.counts = seen, counts
+        return sorted(pending)
+
+    def mark_done(self, name, file_hash=None):
+        """Records a processed document as of the last scan(). Safe to call from worker threads."""
+        observed = (self.seen or {}).get(name)
+        if observed is None:
+            return
+        file_hash = file_hash or observed[2]
+        if file_hash is None:
+            try:
+                file_hash = hash_file(os.path.join(self.root, name))
+            except OSError:
+                return
+        with self.lock:
+            self.records[name] = self.updated[name] = [observed[0], observed[1], file_hash]
+
+    def save(self):
+        """
+        Merges this run's records into the state file (atomically, under the lock file) and drops
+        the records of documents that scan() found removed.
+        """
+        with self.lock:
+            updated, removed = dict(self.updated), set(self.removed)
+        directory = os.path.dirname(self.state_path)
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with state_file_lock(f"{self.state_path}.lock"):
+                # Other runs may have saved since this one read the file
+                self.folders = self._read()
+                records = self.folders.get(self.key, {})
+                records.update(updated)
+                self.folders[self.key] = {name: record for name, record in records.items() if name not in removed}
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": SCAN_STATE_VERSION, "folders": self.folders}, f, separators=(',', ':'))
+                os.replace(temp_path, self.state_path)
+        except OSError as e:
+            logging.warning(f"Could not write scan state '{self.state_path}': {e}")
+            return
+        with self.lock:
+            self.records = self.folders[self.key]
+
+    def summary(self):
+        return ", ".join(f"{count} {label}" for label, count in self.counts.items())
@@ -0,0 +1,146 @@
+import os
+import math
+import heapq
+import fnmatch
+import zipfile
+import threading
+import statistics
+import time
+
+
+# --- DOCUMENT SCHEDULING ---
+
+# sjf  - shortest job first: small documents are classified before large manuals
+# fifo - input (file name) order
+SCHEDULE_POLICIES = ('sjf', 'fifo')
+DEFAULT_SCHEDULE_POLICY = 'sjf'
+# Every AGING_SECONDS a waiting document gains one priority level, so large documents are
+# not starved when new small ones keep arriving
+DEFAULT_AGING_SECONDS = 60.0
+# Per-document priority sidecar: "<document>.docx.priority" containing an integer
+PRIORITY_SIDECAR_SUFFIX = '.priority'
+
+
+def estimate_cost(filepath):
+    """
+    Estimated processing cost of a .docx: the uncompressed size of its main text part
+    (word/document.xml), read from the zip directory without extracting anything.
+    Embedded images do not count. Falls back to the file size.
+    """
+    try:
+        with zipfile.ZipFile(filepath) as archive:
+            return archive.getinfo('word/document.xml').file_size
+    except (OSError, KeyError, zipfile.BadZipFile):
+        try:
+            return os.path.getsize(filepath)
+        except OSError:
+            return 0
+
+
+def document_priority(filepath, patterns=None):
+    """
+    Explicit priority of a document (higher runs earlier, default 0): the integer in a
+    "<file>.priority" sidecar if present, otherwise the highest matching entry of
+    patterns, a dict of file name glob -> priority (e.g. {"*URGENT*": 5}).
+    """
+    try:
+        with open(filepath + PRIORITY_SIDECAR_SUFFIX, 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        pass
+    name = os.path.basename(filepath)
+    matches = [priority for pattern, priority in (patterns or {}).items() if fnmatch.fnmatch(name, pattern)]
+    return max(matches) if matches else 0
+
+
+class Job:
+    __slots__ = ('filename', 'filepath', 'cost', 'priority', 'enqueued', 'started', 'finished')
+
+    def __init__(self, filename, filepath, cost, priority, enqueued):
+        self.filename = filename
+        self.filepath = filepath
+        self.cost = cost
+        self.priority = priority
+        self.enqueued = enqueued
+        self.started = None
+        self.finished = None
+
+    @property
+    def queue_wait(self):
+        return (self.started or time.monotonic()) - self.enqueued
+
+    @property
+    def turnaround(self):
+        return (self.finished or time.monotonic()) - self.enqueued
+
+
+class DocumentScheduler:
+    """
+    Thread-safe priority queue of documents to classify.
+
+    Rank (lower runs first) = size - priority - time waited / aging_seconds, where size is
+    log2(cost) scaled into [0, 1). Explicit priority therefore always wins, documents of
+    equal priority run smallest first, and every aging_seconds of waiting is worth one
+    priority level. The aging term grows equally for every waiting job, so the rank is
+    stored once as size - priority + enqueue time / aging_seconds. With the fifo policy
+    size is ignored and arrival order breaks ties.
+    """
+
+    def __init__(self, policy=DEFAULT_SCHEDULE_POLICY, aging_seconds=DEFAULT_AGING_SECONDS, priority_patterns=None):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Unknown schedule policy '{policy}'. Expected one of: {', '.join(SCHEDULE_POLICIES)}")
+        self.policy = policy
+        self.aging_seconds = aging_seconds
+        self.priority_patterns = priority_patterns or {}
+        self.jobs = []
+        self._heap = []
+        self._sequence = 0
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, filename, filepath):
+        """Queues one document; its cost and priority are read now."""
+        cost = estimate_cost(filepath) if self.policy == 'sjf' else 0
+        job = Job(filename, filepath, cost, document_priority(filepath, self.priority_patterns), time.monotonic())
+        size_rank = min(math.log2(cost + 1) / 40, 0.999) if self.policy == 'sjf' else 0.0
+        age_rank = (job.enqueued - self._origin) / self.aging_seconds if self.aging_seconds else 0.0
+        with self._lock:
+            heapq.heappush(self._heap, (size_rank - job.priority + age_rank, self._sequence, job))
+            self._sequence += 1
+            self.jobs.append(job)
+        return job
+
+    def add_all(self, filenames, directory):
+        for filename in filenames:
+            self.add(filename, os.path.join(directory, filename))
+
+    def __len__(self):
+        return len(self._heap)
+
+    def take(self):
+        """Returns the next job to run (marked as started), or None when the queue is empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            job = heapq.heappop(self._heap)[2]
+        job.started = time.monotonic()
+        return job
+
+    def finish(self, job):
+        job.finished = time.monotonic()
+
+    def report(self):
+        """Median and maximum queue wait / turnaround in seconds over the finished jobs."""
+        finished = [job for job in self.jobs if job.finished is not None]
+        if not finished:
+            return {}
+        waits = [job.queue_wait for job in finished]
+        turnarounds = [job.turnaround for job in finished]
+        return {
+            "policy": self.policy,
+            "documents": len(finished),
+            "median_queue_wait_s": round(statistics.median(waits), 2),
+            "max_queue_wait_s": round(max(waits), 2),
+            "median_turnaround_s": round(statistics.median(turnarounds), 2),
+            "max_turnaround_s": round(max(turnarounds), 2),
+        }
@@ -0,0 +1,51 @@
+# --- STRUCTURED OUTPUT ---
+
+# schema - a JSON Schema is sent in Ollama's "format" field; generation is constrained to it,
+#          so the answer always parses and system/info codes can only be loaded ones
+# json   - plain "format": "json" with the response repaired and validated afterwards
+#          (for Ollama versions before 0.5, which do not accept a schema)
+OUTPUT_FORMATS = ('schema', 'json')
+DEFAULT_OUTPUT_FORMAT = 'schema'
+
+REASONING_MAX_CHARS = 300
+
+
+def dmc_parts_schema(sns_codes, info_codes, confidence=False, reasoning=False, subsystems=True):
+    """
+    JSON Schema for one dmc_parts answer. systemCode and infoCode are enums of the loaded
+    codes (free strings if none are loaded); confidence and reasoning are optional fields.
+    With subsystems=False only systemCode and infoCode are asked for (two-stage mode).
+    """
+    properties = {
+        "systemCode": {"type": "string", "enum": sorted(sns_codes)} if sns_codes else {"type": "string"},
+        "subSystemCode": {"type": "string", "maxLength": 2},
+        "subSubSystemCode": {"type": "string", "maxLength": 1},
+        "infoCode": {"type": "string", "enum": sorted(info_codes)} if info_codes else {"type": "string"},
+        "disassyCode": {"type": "string", "maxLength": 2},
+        "disassyCodeVariant": {"type": "string", "maxLength": 3},
+    }
+    if not subsystems:
+        properties = {key: properties[key] for key in ("systemCode", "infoCode")}
+    if confidence:
+        properties["confidence"] = {"type": "integer", "minimum": 0, "maximum": 100}
+    if reasoning:
+        properties["reasoning"] = {"type": "string", "maxLength": REASONING_MAX_CHARS}
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def batch_schema(item_schema, doc_ids):
+    """JSON Schema for a multi-document answer: {"results": [item + "id"]}, one item per document id."""
+    item = dict(item_schema, properties=dict({"id": {"type": "string", "enum": list(doc_ids)}}, **item_schema["properties"]))
+    item["required"] = ["id"] + item_schema["required"]
+    return {
+        "type": "object",
+        "properties": {"results": {"type": "array", "items": item, "minItems": len(doc_ids), "maxItems": len(doc_ids)}},
+        "required": ["results"],
+        "additionalProperties": False,
+    }
+
+
+def choice_schema(field, values):
+    """JSON Schema for {field: one of values}."""
+    return {"type": "object", "properties": {field: {"type": "string", "enum": list(values)}},
+            "required": [field], "additionalProperties": False}
@@ -85,12 +85,38 @@ Version 2.0 (March 26, 2020)
 
 from __future__ import print_function
 import os
+import mmap
 import struct
 import marshal
 import zlib
 import sys
+import collections
+import multiprocessing
 from uuid import uuid4 as uniquename
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:     # Python 2 without the futures backport: extract serially
+    ThreadPoolExecutor = None
+
+
+class _DeferredCall:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+    def result(self):
+        return self.fn(*self.args)
+
+
+class _SerialExecutor:
+    # Stand-in for ThreadPoolExecutor: each task runs when its result is asked for
+    def submit(self, fn, *args):
+        return _DeferredCall(fn, args)
+
+    def shutdown(self, wait=True):
+        pass
+
 
 class CTOCEntry:
     def __init__(self, position, cmprsdDataSize, uncmprsdDataSize, cmprsFlag, typeCmprsData, name):
@@ -107,16 +133,23 @@ class PyInstArchive:
     PYINST21_COOKIE_SIZE = 24 + 64      # For pyinstaller 2.1+
     MAGIC = b'MEI\014\013\012\013\016'  # Magic number which identifies pyinstaller
 
-    def __init__(self, path):
+    def __init__(self, path, workers=None):
         self.filePath = path
         self.pycMagic = b'\0' * 4
         self.barePycList = [] # List of pyc's whose headers have to be fixed
+        # Entries are decompressed and written by a thread pool (zlib releases the GIL);
+        # at most `window` of them are read ahead or waiting to be written at any time
+        self.workers = workers or multiprocessing.cpu_count()
+        self.window = self.workers * 4
+        self.pendingWrites = collections.deque()
 
 
     def open(self):
         try:
             self.fPtr = open(self.filePath, 'rb')
             self.fileSize = os.stat(self.filePath).st_size
+            # The whole executable is memory-mapped; entries are sliced out of the map
+            self.fileMap = mmap.mmap(self.fPtr.fileno(), 0, access=mmap.ACCESS_READ) if self.fileSize else b''
         except:
             print('[!] Error: Could not open {0}'.format(self.filePath))
             return False
@@ -124,6 +157,10 @@ class PyInstArchive:
 
 
     def close(self):
+        try:
+            self.fileMap.close()
+        except:
+            pass
         try:
             self.fPtr.close()
         except:
@@ -133,42 +170,20 @@ class PyInstArchive:
     def checkFile(self):
         print('[+] Processing {0}'.format(self.filePath))
 
-        searchChunkSize = 8192
-        endPos = self.fileSize
-        self.cookiePos = -1
-
-        if endPos < len(self.MAGIC):
+        if self.fileSize < len(self.MAGIC):
             print('[!] Error : File is too short or truncated')
             return False
 
-        while True:
-            startPos = endPos - searchChunkSize if endPos >= searchChunkSize else 0
-            chunkSize = endPos - startPos
-
-            if chunkSize < len(self.MAGIC):
-                break
-
-            self.fPtr.seek(startPos, os.SEEK_SET)
-            data = self.fPtr.read(chunkSize)
-
-            offs = data.rfind(self.MAGIC)
-
-            if offs != -1:
-                self.cookiePos = startPos + offs
-                break
-
-            endPos = startPos + len(self.MAGIC) - 1
-
-            if startPos == 0:
-                break
+        # The cookie is near the end of the file; rfind on the map searches backwards from there
+        self.cookiePos = self.fileMap.rfind(self.MAGIC)
 
         if self.cookiePos == -1:
             print('[!] Error : Missing cookie, unsupported pyinstaller version or not a pyinstaller archive')
             return False
 
-        self.fPtr.seek(self.cookiePos + self.PYINST20_COOKIE_SIZE, os.SEEK_SET)
+        pylibPos = self.cookiePos + self.PYINST20_COOKIE_SIZE
 
-        if b'python' in self.fPtr.read(64).lower():
+        if b'python' in self.fileMap[pylibPos:pylibPos + 64].lower():
             print('[+] Pyinstaller version: 2.1+')
             self.pyinstVer = 21     # pyinstaller 2.1+
         else:
@@ -181,18 +196,14 @@ class PyInstArchive:
     def getCArchiveInfo(self):
         try:
             if self.pyinstVer == 20:
-                self.fPtr.seek(self.cookiePos, os.SEEK_SET)
-
                 # Read CArchive cookie
                 (magic, lengthofPackage, toc, tocLen, pyver) = \
-                struct.unpack('!8siiii', self.fPtr.read(self.PYINST20_COOKIE_SIZE))
+                struct.unpack_from('!8siiii', self.fileMap, self.cookiePos)
 
             elif self.pyinstVer == 21:
-                self.fPtr.seek(self.cookiePos, os.SEEK_SET)
-
                 # Read CArchive cookie
                 (magic, lengthofPackage, toc, tocLen, pyver, pylibname) = \
-                struct.unpack('!8sIIii64s', self.fPtr.read(self.PYINST21_COOKIE_SIZE))
+                struct.unpack_from('!8sIIii64s', self.fileMap, self.cookiePos)
 
         except:
             print('[!] Error : The file is not a pyinstaller archive')
@@ -215,21 +226,19 @@ class PyInstArchive:
 
 
     def parseTOC(self):
-        # Go to the table of contents
-        self.fPtr.seek(self.tableOfContentsPos, os.SEEK_SET)
-
         self.tocList = []
         parsedLen = 0
 
         # Parse table of contents
         while parsedLen < self.tableOfContentsSize:
-            (entrySize, ) = struct.unpack('!i', self.fPtr.read(4))
+            entryStart = self.tableOfContentsPos + parsedLen
+            (entrySize, ) = struct.unpack_from('!i', self.fileMap, entryStart)
             nameLen = struct.calcsize('!iIIIBc')
 
             (entryPos, cmprsdDataSize, uncmprsdDataSize, cmprsFlag, typeCmprsData, name) = \
-            struct.unpack( \
+            struct.unpack_from( \
                 '!IIIBc{0}s'.format(entrySize - nameLen), \
-                self.fPtr.read(entrySize - 4))
+                self.fileMap, entryStart + 4)
 
             try:
                 name = name.decode("utf-8").rstrip("\0")
@@ -260,12 +269,58 @@ class PyInstArchive:
         print('[+] Found {0} files in CArchive'.format(len(self.tocList)))
 
 
-    def _writeRawData(self, filepath, data):
+    def _submit(self, fn, *args):
+        # Runs fn(*args) in the pool, waiting for the oldest tasks while more than `window` are queued
+        self.pendingWrites.append(self.executor.submit(fn, *args))
+        while len(self.pendingWrites) > self.window:
+            self.pendingWrites.popleft().result()
+
+
+    def _drain(self):
+        # Waits for every submitted task; errors raised by a task are raised here
+        while self.pendingWrites:
+            self.pendingWrites.popleft().result()
+
+
+    def _readAhead(self, fn, items):
+        # Yields (item, fn(item)) in order while the pool works up to `window` items ahead
+        pending = collections.deque()
+        for item in items:
+            pending.append((item, self.executor.submit(fn, item)))
+            if len(pending) > self.window:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+    def _readEntry(self, entry):
+        data = self.fileMap[entry.position:entry.position + entry.cmprsdDataSize]
+
+        if entry.cmprsFlag == 1:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                return None
+            # Malware may tamper with the uncompressed size
+            # Comment out the assertion in such a case
+            assert len(data) == entry.uncmprsdDataSize # Sanity Check
+
+        return data
+
+
+    def _rawDataPath(self, filepath):
+        # Where _writeRawData writes filepath. Its directory is created here, on the extracting
+        # thread, so pool threads writing into the same new directory do not race to create it
         nm = filepath.replace('\\', os.path.sep).replace('/', os.path.sep).replace('..', '__')
         nmDir = os.path.dirname(nm)
         if nmDir != '' and not os.path.exists(nmDir): # Check if path exists, create if not
             os.makedirs(nmDir)
+        return nm
 
+
+    def _writeRawData(self, nm, data):
         with open(nm, 'wb') as f:
             f.write(data)
 
@@ -279,19 +334,23 @@ class PyInstArchive:
 
         os.chdir(extractionDir)
 
-        for entry in self.tocList:
-            self.fPtr.seek(entry.position, os.SEEK_SET)
-            data = self.fPtr.read(entry.cmprsdDataSize)
-
-            if entry.cmprsFlag == 1:
-                try:
-                    data = zlib.decompress(data)
-                except zlib.error:
-                    print('[!] Error : Failed to decompress {0}'.format(entry.name))
-                    continue
-                # Malware may tamper with the uncompressed size
-                # Comment out the assertion in such a case
-                assert len(data) == entry.uncmprsdDataSize # Sanity Check
+        self.executor = ThreadPoolExecutor(self.workers) if ThreadPoolExecutor and self.workers > 1 else _SerialExecutor()
+        try:
+            self._extractEntries()
+            # Fix bare pyc's if any
+            self._drain()
+            self._fixBarePycs()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+    def _extractEntries(self):
+        # Entries are decompressed ahead in the pool; what to write (and the pyc magic to write
+        # with) is decided here in TOC order, then the writes go back to the pool
+        for entry, data in self._readAhead(self._readEntry, self.tocList):
+            if data is None:
+                print('[!] Error : Failed to decompress {0}'.format(entry.name))
+                continue
 
             if entry.typeCmprsData == b'd' or entry.typeCmprsData == b'o':
                 # d -> ARCHIVE_ITEM_DEPENDENCY
@@ -313,7 +372,7 @@ class PyInstArchive:
                 if self.pycMagic == b'\0' * 4:
                     # if we don't have the pyc header yet, fix them in a later pass
                     self.barePycList.append(entry.name + '.pyc')
-                self._writePyc(entry.name + '.pyc', data)
+                self._submit(self._writePyc, entry.name + '.pyc', data, self.pycMagic)
 
             elif entry.typeCmprsData == b'M' or entry.typeCmprsData == b'm':
                 # M -> ARCHIVE_ITEM_PYPACKAGE
@@ -326,7 +385,7 @@ class PyInstArchive:
                     # < pyinstaller 5.3
                     if self.pycMagic == b'\0' * 4: 
                         self.pycMagic = data[0:4]
-                    self._writeRawData(entry.name + '.pyc', data)
+                    self._submit(self._writeRawData, self._rawDataPath(entry.name + '.pyc'), data)
 
                 else:
                     # >= pyinstaller 5.3
@@ -334,16 +393,15 @@ class PyInstArchive:
                         # if we don't have the pyc header yet, fix them in a later pass
                         self.barePycList.append(entry.name + '.pyc')
 
-                    self._writePyc(entry.name + '.pyc', data)
-
-            else:
-                self._writeRawData(entry.name, data)
+                    self._submit(self._writePyc, entry.name + '.pyc', data, self.pycMagic)
 
-                if entry.typeCmprsData == b'z' or entry.typeCmprsData == b'Z':
-                    self._extractPyz(entry.name)
+            elif entry.typeCmprsData == b'z' or entry.typeCmprsData == b'Z':
+                # The PYZ is read back from disk, so it is written before extracting it
+                self._writeRawData(self._rawDataPath(entry.name), data)
+                self._extractPyz(entry.name)
 
-        # Fix bare pyc's if any
-        self._fixBarePycs()
+            else:
+                self._submit(self._writeRawData, self._rawDataPath(entry.name), data)
 
 
     def _fixBarePycs(self):
@@ -353,9 +411,9 @@ class PyInstArchive:
                 pycFile.write(self.pycMagic)
 
 
-    def _writePyc(self, filename, data):
+    def _writePyc(self, filename, data, pycMagic=None):
         with open(filename, 'wb') as pycFile:
-            pycFile.write(self.pycMagic)            # pyc magic
+            pycFile.write(pycMagic or self.pycMagic)            # pyc magic
 
             if self.pymaj >= 3 and self.pymin >= 7:                # PEP 552 -- Deterministic pycs
                 pycFile.write(b'\0' * 4)        # Bitfield
@@ -376,72 +434,85 @@ class PyInstArchive:
             os.mkdir(dirName)
 
         with open(name, 'rb') as f:
-            pyzMagic = f.read(4)
-            assert pyzMagic == b'PYZ\0' # Sanity Check
+            pyzMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self._extractPyzEntries(name, dirName, pyzMap)
+            finally:
+                # Tasks still slicing the map have to finish before it is closed
+                self._drain()
+                pyzMap.close()
+
 
-            pyzPycMagic = f.read(4) # Python magic value
+    def _extractPyzEntries(self, name, dirName, pyzMap):
+        pyzMagic = pyzMap[0:4]
+        assert pyzMagic == b'PYZ\0' # Sanity Check
 
-            if self.pycMagic == b'\0' * 4:
-                self.pycMagic = pyzPycMagic
+        pyzPycMagic = pyzMap[4:8] # Python magic value
 
-            elif self.pycMagic != pyzPycMagic:
-                self.pycMagic = pyzPycMagic
-                print('[!] Warning: pyc magic of files inside PYZ archive are different from those in CArchive')
+        if self.pycMagic == b'\0' * 4:
+            self.pycMagic = pyzPycMagic
 
-            # Skip PYZ extraction if not running under the same python version
-            if self.pymaj != sys.version_info.major or self.pymin != sys.version_info.minor:
-                print('[!] Warning: This script is running in a different Python version than the one used to build the executable.')
-                print('[!] Please run this script in Python {0}.{1} to prevent extraction errors during unmarshalling'.format(self.pymaj, self.pymin))
-                print('[!] Skipping pyz extraction')
-                return
+        elif self.pycMagic != pyzPycMagic:
+            self.pycMagic = pyzPycMagic
+            print('[!] Warning: pyc magic of files inside PYZ archive are different from those in CArchive')
 
-            (tocPosition, ) = struct.unpack('!i', f.read(4))
-            f.seek(tocPosition, os.SEEK_SET)
+        # Skip PYZ extraction if not running under the same python version
+        if self.pymaj != sys.version_info.major or self.pymin != sys.version_info.minor:
+            print('[!] Warning: This script is running in a different Python version than the one used to build the executable.')
+            print('[!] Please run this script in Python {0}.{1} to prevent extraction errors during unmarshalling'.format(self.pymaj, self.pymin))
+            print('[!] Skipping pyz extraction')
+            return
+
+        (tocPosition, ) = struct.unpack_from('!i', pyzMap, 8)
+
+        try:
+            toc = marshal.loads(pyzMap[tocPosition:])
+        except:
+            print('[!] Unmarshalling FAILED. Cannot extract {0}. Extracting remaining files.'.format(name))
+            return
+
+        print('[+] Found {0} files in PYZ archive'.format(len(toc)))
+
+        # From pyinstaller 3.1+ toc is a list of tuples
+        if type(toc) == list:
+            toc = dict(toc)
+
+        for key in toc.keys():
+            (ispkg, pos, length) = toc[key]
+            fileName = key
 
             try:
-                toc = marshal.load(f)
+                # for Python > 3.3 some keys are bytes object some are str object
+                fileName = fileName.decode('utf-8')
             except:
-                print('[!] Unmarshalling FAILED. Cannot extract {0}. Extracting remaining files.'.format(name))
-                return
+                pass
 
-            print('[+] Found {0} files in PYZ archive'.format(len(toc)))
+            # Prevent writing outside dirName
+            fileName = fileName.replace('..', '__').replace('.', os.path.sep)
 
-            # From pyinstaller 3.1+ toc is a list of tuples
-            if type(toc) == list:
-                toc = dict(toc)
+            if ispkg == 1:
+                filePath = os.path.join(dirName, fileName, '__init__.pyc')
 
-            for key in toc.keys():
-                (ispkg, pos, length) = toc[key]
-                f.seek(pos, os.SEEK_SET)
-                fileName = key
+            else:
+                filePath = os.path.join(dirName, fileName + '.pyc')
 
-                try:
-                    # for Python > 3.3 some keys are bytes object some are str object
-                    fileName = fileName.decode('utf-8')
-                except:
-                    pass
+            fileDir = os.path.dirname(filePath)
+            if not os.path.exists(fileDir):
+                os.makedirs(fileDir)
 
-                # Prevent writing outside dirName
-                fileName = fileName.replace('..', '__').replace('.', os.path.sep)
+            self._submit(self._extractPyzEntry, filePath, pyzMap, pos, length, self.pycMagic)
 
-                if ispkg == 1:
-                    filePath = os.path.join(dirName, fileName, '__init__.pyc')
 
-                else:
-                    filePath = os.path.join(dirName, fileName + '.pyc')
-
-                fileDir = os.path.dirname(filePath)
-                if not os.path.exists(fileDir):
-                    os.makedirs(fileDir)
-
-                try:
-                    data = f.read(length)
-                    data = zlib.decompress(data)
-                except:
-                    print('[!] Error: Failed to decompress {0}, probably encrypted. Extracting as is.'.format(filePath))
-                    open(filePath + '.encrypted', 'wb').write(data)
-                else:
-                    self._writePyc(filePath, data)
+    def _extractPyzEntry(self, filePath, pyzMap, pos, length, pycMagic):
+        data = pyzMap[pos:pos + length]
+        try:
+            data = zlib.decompress(data)
+        except:
+            print('[!] Error: Failed to decompress {0}, probably encrypted. Extracting as is.'.format(filePath))
+            with open(filePath + '.encrypted', 'wb') as f:
+                f.write(data)
+        else:
+            self._writePyc(filePath, data, pycMagic)
 
 
 def main():
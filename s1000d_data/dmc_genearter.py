@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import logging
 import shutil
@@ -7,6 +8,9 @@ from pathlib import Path
 import requests
 import re
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dmc_output import materialize_output  # noqa: E402
+
 # Required libraries - install with: pip install requests beautifulsoup4 python-docx lxml
 try:
     from bs4 import BeautifulSoup
@@ -21,6 +25,10 @@ except ImportError as e:
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "llama3.2:latest"
 LLM_REQUEST_TIMEOUT = 300
+# How outputs are written (see dmc_output.py): 'auto' clones with reflink where the filesystem
+# supports it and copies otherwise. 'hardlink' is opt-in only - the output and the archived
+# original would share their bytes, so saving an output in place would change the original too.
+OUTPUT_MODE = "auto"
 
 # --- DIRECTORIES ---
 INPUT_DOCS_DIR = Path("documents_to_process")
@@ -216,8 +224,8 @@ def main():
         new_filename = f"{final_dmc}{filepath.suffix}"
         
         try:
-            shutil.copy2(filepath, OUTPUT_DIR / new_filename)
-            logging.info(f"Successfully created: {new_filename}")
+            mode = materialize_output(str(filepath), str(OUTPUT_DIR / new_filename), OUTPUT_MODE)
+            logging.info(f"Successfully created ({mode}): {new_filename}")
             shutil.move(filepath, PROCESSED_DIR / filepath.name)
             log_summary["successful"].append({
                 "original_file": filepath.name, "new_file": new_filename, "llm_analysis": descriptions, "derived_codes": final_codes